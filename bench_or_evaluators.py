@@ -0,0 +1,70 @@
+import argparse
+import time
+
+import numpy as np
+from ortools.constraint_solver import pywrapcp, routing_enums_pb2
+
+from pdptw_instance import PDPTWInstance
+
+# Same shape as pdptw_or.py: depot 0, pickups 1..P, deliveries P+1..2P
+VEHICLE_CAPACITY = 4
+NUM_VEHICLES = 6
+
+
+def random_instance(pairs, seed):
+    """Seeded pdptw_or.py-style random instance (demands paired consistently)."""
+    rng = np.random.default_rng(seed)
+    n = 2 * pairs + 1
+    distances = rng.integers(100, 1000, size=(n, n), dtype=np.int32)
+    np.fill_diagonal(distances, 0)
+    quantities = rng.integers(1, VEHICLE_CAPACITY + 1, size=pairs)
+    pickups = np.arange(1, pairs + 1)
+    return PDPTWInstance(distances, pairs={(p, p + pairs): q for p, q in zip(pickups.tolist(), quantities.tolist())})
+
+
+def run(instance, evaluators, time_limit):
+    """Solves once with guided local search and returns search statistics."""
+    manager, routing = instance.to_ortools(NUM_VEHICLES, VEHICLE_CAPACITY, evaluators=evaluators)
+
+    solutions = []
+    routing.AddAtSolutionCallback(lambda: solutions.append(routing.CostVar().Max()))
+
+    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
+    search_parameters.first_solution_strategy = routing_enums_pb2.FirstSolutionStrategy.AUTOMATIC
+    search_parameters.local_search_metaheuristic = routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
+    search_parameters.time_limit.seconds = time_limit
+
+    start_time = time.perf_counter()
+    solution = routing.SolveWithParameters(search_parameters)
+    elapsed = time.perf_counter() - start_time
+
+    branches = routing.solver().Branches()
+    return {
+        "objective": solution.ObjectiveValue() if solution else None,
+        "branches": branches,
+        "branches_per_sec": branches / elapsed,
+        "solutions": len(solutions),
+        "seconds": elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare Python callbacks against native matrix evaluators in OR-Tools.")
+    parser.add_argument("--pairs", type=int, nargs="+", default=[10, 20, 30, 40, 50, 60, 70])
+    parser.add_argument("--time-limit", type=int, default=10, help="seconds per solve")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'pairs':>5} {'mode':>8} {'branches/s':>12} {'solutions':>9} {'objective':>10}")
+    for pairs in args.pairs:
+        instance = random_instance(pairs, args.seed + pairs)
+        rates = {}
+        for evaluators in ("callback", "matrix"):
+            stats = run(instance, evaluators, args.time_limit)
+            rates[evaluators] = stats["branches_per_sec"]
+            print(f"{pairs:>5} {evaluators:>8} {stats['branches_per_sec']:>12.0f} {stats['solutions']:>9} {str(stats['objective']):>10}")
+        print(f"{pairs:>5} {'speedup':>8} {rates['matrix'] / rates['callback']:>11.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+import argparse
+import contextlib
+import io
+import json
+import logging
+import multiprocessing
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from pdptw_generate import generate_instance, paired_windows, random_matrix
+from pdptw_instance import PDPTWInstance
+
+FAMILIES = ("random", "uniform", "zoned", "clustered")
+SOLVERS = ("vrpy", "vrpy-cspy", "vrpy-sparse", "ortools", "zones", "alns", "clusters")
+START_OF_DAY = 8 * 60 * 60
+END_OF_DAY = 18 * 60 * 60
+
+
+# Instance families, seeded versions of the data the scripts generate
+
+def random_family(pairs, rng):
+    """pdptw_r.py: symmetric distances, pickup windows before delivery windows."""
+    distances = random_matrix(rng, 2 * pairs + 1, 10, 1000, symmetric=True)
+    quantities = rng.integers(1, 5, size=pairs)
+    lower, upper = paired_windows(rng, pairs, start=(0, 10), delay=(1, 5), width=(5, 10))
+    instance = PDPTWInstance(distances, lower=np.r_[0, lower], upper=np.r_[0, upper], pairs=_pairs(pairs, quantities))
+    return instance, {"load_capacity": 5, "time_windows": True}
+
+
+def uniform_family(pairs, rng):
+    """pdptw_r_uniform.py: asymmetric distances, windows generated but not enforced."""
+    distances = random_matrix(rng, 2 * pairs + 1, 10, 1000)
+    quantities = rng.integers(1, 6, size=pairs)
+    lower, upper = paired_windows(rng, pairs, start=(0, 10), delay=(1, 5), width=(5, 10))
+    instance = PDPTWInstance(distances, lower=np.r_[0, lower], upper=np.r_[0, upper], pairs=_pairs(pairs, quantities))
+    return instance, {"load_capacity": 5, "time_windows": False}
+
+
+def clustered_family(pairs, rng):
+    """Li & Lim lc-style: clustered Euclidean customers, travel-time feasible windows."""
+    return generate_instance(pairs, "clustered", seed=rng), {"load_capacity": 5, "time_windows": True}
+
+
+def zoned_family(pairs, rng):
+    """pdptw_zone.py: windows of 20-60 minutes between 8:00 and 18:00 (in seconds)."""
+    n = 2 * pairs + 1
+    distances = random_matrix(rng, n, 10, 1000)
+    quantities = rng.integers(1, 6, size=pairs)
+    lower = rng.integers(START_OF_DAY, END_OF_DAY - 3600 + 1, size=n)
+    upper = np.minimum(lower + rng.integers(1200, 3601, size=n), END_OF_DAY)
+    lower[0], upper[0] = 0, 0
+    instance = PDPTWInstance(distances, lower=lower, upper=upper, pairs=_pairs(pairs, quantities))
+    return instance, {"load_capacity": 5, "time_windows": False}
+
+
+def _pairs(pairs, quantities):
+    return {(2 * i + 1, 2 * i + 2): int(q) for i, q in enumerate(quantities)}
+
+
+def make_instance(family, pairs, seed):
+    rng = np.random.default_rng([seed, pairs, FAMILIES.index(family)])
+    builders = {"random": random_family, "uniform": uniform_family, "zoned": zoned_family,
+                "clustered": clustered_family}
+    return builders[family](pairs, rng)
+
+
+# Solvers, each returns the objective value (None if no solution)
+
+def _enforced(instance, options):
+    """Drops the time windows of families that generate them without enforcing them."""
+    if options["time_windows"]:
+        return instance
+    return PDPTWInstance(instance.distances, instance.travel_times, instance.demands, pairs=instance.pairs)
+
+
+def solve_vrpy(instance, options, time_limit, cspy=False):
+    from vrpy import VehicleRoutingProblem
+    from pdptw_prune import prune_arcs
+
+    instance = _enforced(instance, options)
+    G = instance.to_vrpy_graph()
+    prune_arcs(G, instance, load_capacity=options["load_capacity"])
+    prob = VehicleRoutingProblem(G, load_capacity=options["load_capacity"], num_stops=6, pickup_delivery=True)
+    prob.time_windows = options["time_windows"]
+    prob.solve(cspy=cspy, time_limit=time_limit)
+    return prob.best_value
+
+
+def solve_vrpy_sparse(instance, options, time_limit, k=10):
+    from pdptw_prune import solve_candidate_graph
+
+    prob, _ = solve_candidate_graph(_enforced(instance, options), k, load_capacity=options["load_capacity"],
+                                    num_stops=6, time_windows=options["time_windows"], time_limit=time_limit)
+    return prob.best_value
+
+
+def solve_ortools(instance, options, time_limit):
+    from ortools.constraint_solver import pywrapcp, routing_enums_pb2
+
+    instance = _enforced(instance, options)
+    manager, routing = instance.to_ortools(instance.num_pairs, options["load_capacity"])
+    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
+    search_parameters.first_solution_strategy = routing_enums_pb2.FirstSolutionStrategy.PARALLEL_CHEAPEST_INSERTION
+    search_parameters.local_search_metaheuristic = routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
+    search_parameters.time_limit.seconds = time_limit
+    solution = routing.SolveWithParameters(search_parameters)
+    return solution.ObjectiveValue() if solution else None
+
+
+def solve_alns(instance, options, time_limit):
+    from pdptw_alns import ALNS
+
+    instance = _enforced(instance, options)
+    prob = ALNS(instance, load_capacity=options["load_capacity"], num_stops=6, seed=0)
+    prob.solve(time_limit=time_limit)
+    return None if prob.unrouted else prob.best_value
+
+
+def solve_clusters(instance, options, time_limit):
+    from pdptw_cluster import solve_clustered
+
+    best = solve_clustered(_enforced(instance, options), "ortools", time_limit,
+                           load_capacity=options["load_capacity"], num_stops=6)
+    return None if best is None else best.objective
+
+
+def solve_zones(instance, options, time_limit):
+    from pdptw_zone import solve_hour_zones
+
+    hour_results = solve_hour_zones(instance, num_hours=10, max_workers=1)
+    values = [best_value for _, best_value, routes in hour_results if routes]
+    return sum(values) if values else None
+
+
+def _run_solver(solver, instance, options, time_limit):
+    if solver == "vrpy":
+        return solve_vrpy(instance, options, time_limit)
+    if solver == "vrpy-cspy":
+        return solve_vrpy(instance, options, time_limit, cspy=True)
+    if solver == "vrpy-sparse":
+        return solve_vrpy_sparse(instance, options, time_limit)
+    if solver == "ortools":
+        return solve_ortools(instance, options, time_limit)
+    if solver == "zones":
+        return solve_zones(instance, options, time_limit)
+    if solver == "alns":
+        return solve_alns(instance, options, time_limit)
+    if solver == "clusters":
+        return solve_clusters(instance, options, time_limit)
+    raise ValueError(f"Unknown solver {solver!r}")
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def _child(conn, family, pairs, seed, solver, time_limit):
+    record = {"wall_time": None, "objective": None}
+    try:
+        # The solvers print and log a lot, keep the benchmark output readable
+        logging.disable(logging.WARNING)
+        with contextlib.redirect_stdout(io.StringIO()):
+            instance, options = make_instance(family, pairs, seed)
+            start_time = time.perf_counter()
+            objective = _run_solver(solver, instance, options, time_limit)
+            record["wall_time"] = time.perf_counter() - start_time
+        record["objective"] = None if objective is None else float(objective)
+        record["status"] = "ok" if objective is not None else "no solution"
+    except Exception as e:
+        record["status"] = f"error: {type(e).__name__}: {e}"
+    record["peak_rss_mb"] = _peak_rss_mb()
+    conn.send(record)
+    conn.close()
+
+
+def run_one(family, pairs, seed, solver, time_limit, hard_limit):
+    """Runs one solve in a fresh process so that peak RSS belongs to that solve alone."""
+    context = multiprocessing.get_context("spawn")
+    parent_conn, child_conn = context.Pipe(duplex=False)
+    process = context.Process(target=_child, args=(child_conn, family, pairs, seed, solver, time_limit))
+    start_time = time.perf_counter()
+    process.start()
+    child_conn.close()
+
+    record = {"family": family, "pairs": pairs, "seed": seed, "solver": solver}
+    if parent_conn.poll(hard_limit):
+        record.update(parent_conn.recv())
+    else:
+        record.update(status="timeout", wall_time=time.perf_counter() - start_time, objective=None, peak_rss_mb=None)
+        process.kill()
+    process.join()
+    return record
+
+
+def _metadata(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": multiprocessing.cpu_count(),
+        "time_limit": args.time_limit,
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def _key(record):
+    return (record["family"], record["pairs"], record["seed"], record["solver"])
+
+
+def compare(runs, baseline_runs, tolerance):
+    """Prints each run against the baseline and returns the list of regressions."""
+    baseline = {_key(record): record for record in baseline_runs}
+    regressions = []
+    print(f"\n{'family':>8} {'pairs':>5} {'solver':>9} {'time':>9} {'base':>9} {'ratio':>6} {'objective':>10} {'base':>10}")
+    for record in runs:
+        base = baseline.get(_key(record))
+        if base is None:
+            continue
+        problems = []
+        if base["status"] == "ok" and record["status"] != "ok":
+            problems.append(f"status {record['status']}")
+        if record["status"] == "ok" and base["status"] == "ok":
+            # Ignore sub-second noise on tiny instances
+            if record["wall_time"] > base["wall_time"] * (1 + tolerance) and record["wall_time"] - base["wall_time"] > 0.5:
+                problems.append("slower")
+            if record["objective"] > base["objective"] * (1 + tolerance):
+                problems.append("worse objective")
+        ratio = record["wall_time"] / base["wall_time"] if record.get("wall_time") and base.get("wall_time") else float("nan")
+        print(f"{record['family']:>8} {record['pairs']:>5} {record['solver']:>9} "
+              f"{record.get('wall_time') or 0:>9.2f} {base.get('wall_time') or 0:>9.2f} {ratio:>6.2f} "
+              f"{str(record['objective']):>10} {str(base['objective']):>10} {' '.join(problems)}")
+        if problems:
+            regressions.append((record, problems))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seeded scaling benchmark for the PDPTW solve pipeline.")
+    parser.add_argument("--families", nargs="+", choices=FAMILIES, default=list(FAMILIES))
+    parser.add_argument("--pairs", type=int, nargs="+", default=[10, 20, 50, 100, 200])
+    parser.add_argument("--solvers", nargs="+", choices=SOLVERS, default=list(SOLVERS))
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0])
+    parser.add_argument("--time-limit", type=int, default=60, help="solver time limit in seconds")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown / objective increase")
+    args = parser.parse_args()
+
+    # vrpy only checks its time limit between iterations, give it room before killing
+    hard_limit = 3 * args.time_limit + 30
+    runs = []
+    for family in args.families:
+        for pairs in args.pairs:
+            for seed in args.seeds:
+                for solver in args.solvers:
+                    if solver == "zones" and family != "zoned":
+                        continue  # Hour zones need day-time windows
+                    record = run_one(family, pairs, seed, solver, args.time_limit, hard_limit)
+                    runs.append(record)
+                    print(f"{family:>8} {pairs:>5} {solver:>9} {record['status']:>12} "
+                          f"{record.get('wall_time') or 0:>9.2f}s {record.get('peak_rss_mb') or 0:>8.1f}MB "
+                          f"{record['objective']}", flush=True)
+
+    with open(args.output, "w") as f:
+        json.dump({"meta": _metadata(args), "runs": runs}, f, indent=1)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline_runs = json.load(f)["runs"]
+        regressions = compare(runs, baseline_runs, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.baseline}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,4 @@
-from networkx import DiGraph, relabel_nodes, set_node_attributes
-from numpy import array
-import networkx  as nx
+from pdptw_instance import PDPTWInstance
 
 # Distance matrix
 DISTANCES = [
@@ -29,24 +27,14 @@ DISTANCES = [
 DEMAND = {1: 1, 2: 2, 3: 3, 4: -3, 5: 1, 6: -1, 7: 2, 8: -2, 9: -1, 10: -2, 11: -3, 12: -1, 13: 1, 14: 4, 15: 3, 16: -4}
 
 
-# The matrix is transformed into a DiGraph
-A = array(DISTANCES, dtype=[("cost", int)])
-G = nx.from_numpy_array(A, create_using=nx.DiGraph())
-
-# The demands are stored as node attributes
-set_node_attributes(G, values=DEMAND, name="demand")
-
-# The depot is relabeled as Source and Sink
-G = relabel_nodes(G, {0: "Source", 17: "Sink"})
+pickups_deliveries = {(1, 6): 1, (2, 10): 2, (4, 3): 3, (5, 9): 1, (7, 8): 2, (15, 11): 3, (13, 12): 1, (16, 14): 4}
 
+# The matrix, demands and pairs are stored as int32 arrays
+# (pickups are accounted for positively, deliveries negatively)
+instance = PDPTWInstance.from_source_sink(DISTANCES, demands=DEMAND, pairs=pickups_deliveries)
 
-pickups_deliveries = {(1, 6): 1, (2, 10): 2, (4, 3): 3, (5, 9): 1, (7, 8): 2, (15, 11): 3, (13, 12): 1, (16, 14): 4}
-for (u, v) in pickups_deliveries:
-    G.nodes[u]["request"] = v
-    # Pickups are accounted for positively
-    G.nodes[u]["demand"] = pickups_deliveries[(u, v)]
-    # Deliveries are accounted for negatively
-    G.nodes[v]["demand"] = -pickups_deliveries[(u, v)]
+# The instance is transformed into a DiGraph, the depot is split into Source and Sink
+G = instance.to_vrpy_graph()
 
 
 from vrpy import VehicleRoutingProblem
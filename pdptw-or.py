@@ -51,31 +51,25 @@ pickups_deliveries = {(6,1): 1, (2, 10): 2, (4, 3): 3, (9, 5): 1, (7, 8): 2, (15
 
 # Create routing index manager
 start_depots = [0, 0, 0]  # All vehicles start at node 0 (source)
-end_depots = [1, 1, 1]    # All vehicles end at node 1 (sink)
-# manager = RoutingIndexManager(len(DISTANCES), 3, start_depots, end_depots)
+end_depots = [17, 17, 17]  # All vehicles end at node 17 (sink row of DISTANCES)
 from ortools.constraint_solver import pywrapcp, routing_enums_pb2
 from ortools.constraint_solver.pywrapcp import RoutingModel, RoutingIndexManager
 
 # Create routing index manager with separate start and end depots for each vehicle
-manager = RoutingIndexManager(len(DISTANCES), 3, [0, 0, 0], [1, 1, 1])
+manager = RoutingIndexManager(len(DISTANCES), 3, start_depots, end_depots)
 
 # Create Routing Model
 routing = RoutingModel(manager)
 
-# Define cost of each arc
-def distance_callback(from_index, to_index):
-    """Returns the distance between the two nodes."""
-    from_node = manager.IndexToNode(from_index)
-    to_node = manager.IndexToNode(to_index)
-    return DISTANCES[from_node][to_node]
-
-transit_callback_index = routing.RegisterTransitCallback(distance_callback)
+# Define cost of each arc as a native transit matrix (indexed by node), so the
+# search never calls back into Python
+transit_callback_index = routing.RegisterTransitMatrix(DISTANCES)
 
 # Set the cost of travel between nodes
 routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
 
-# Add Capacity constraint
-demand_evaluator_index = routing.RegisterUnaryTransitCallback(lambda idx: DEMAND[manager.IndexToNode(idx)])
+# Add Capacity constraint (demand vector indexed by node, depots carry no load)
+demand_evaluator_index = routing.RegisterUnaryTransitVector([DEMAND.get(node, 0) for node in range(len(DISTANCES))])
 routing.AddDimensionWithVehicleCapacity(
     demand_evaluator_index,
     0,  # null capacity slack
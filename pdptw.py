@@ -1,7 +1,8 @@
-from networkx import DiGraph, relabel_nodes, set_node_attributes
-from numpy import array
-import networkx  as nx
-from vrpy import VehicleRoutingProblem
+import sys
+from pdptw_instance import PDPTWInstance
+from pdptw_io import load_instance
+from pdptw_cache import cached_solve
+from pdptw_telemetry import Telemetry
 
 # Distance matrix
 DISTANCES = [
@@ -30,25 +31,8 @@ DISTANCES = [
 DEMAND = {1: 1, 2: 2, 3: 3, 4: -3, 5: 1, 6: -1, 7: 2, 8: -2, 9: -1, 10: -2, 11: -3, 12: -1, 13: 1, 14: -4, 15: 3, 16: 4}
 
 
-# The matrix is transformed into a DiGraph
-A = array(DISTANCES, dtype=[("cost", int)])
-G = nx.from_numpy_array(A, create_using=nx.DiGraph())
-
-# The demands are stored as node attributes
-set_node_attributes(G, values=DEMAND, name="demand")
-
-# The depot is relabeled as Source and Sink
-G = relabel_nodes(G, {0: "Source", 17: "Sink"})
-
-
 # pickups_deliveries = {(1, 6): 1, (2, 10): 2, (4, 3): 3, (5, 9): 1, (7, 8): 2, (15, 11): 3, (13, 12): 1, (16, 14): 4}
 pickups_deliveries = {(6,1): 1, (2, 10): 2, (4, 3): 3, (9, 5): 1, (7, 8): 2, (15, 11): 3, (12, 13): 1, (14, 16): 4}
-for (u, v) in pickups_deliveries:
-    G.nodes[u]["request"] = v
-    # Pickups are accounted for positively
-    G.nodes[u]["demand"] = pickups_deliveries[(u, v)]
-    # Deliveries are accounted for negatively
-    G.nodes[v]["demand"] = -pickups_deliveries[(u, v)]
 
 # Time windows (key: node, value: lower/upper bound)
 TIME_WINDOWS_LOWER = {0: 0, 1: 7, 2: 10, 3: 16, 4: 10, 5: 0, 6: 5, 7: 0, 8: 5, 9: 0, 10: 10, 11: 10, 12: 0, 13: 5, 14: 7, 15: 10, 16: 11,}
@@ -56,25 +40,43 @@ TIME_WINDOWS_UPPER = {1: 12, 2: 15, 3: 18, 4: 13, 5: 5, 6: 10, 7: 4, 8: 10, 9: 3
 
 # switch for time (6,1) (9,5)  (14,16) (12,13)
 
-# Set time windows
-set_node_attributes(G, values=TIME_WINDOWS_LOWER, name="lower")
-set_node_attributes(G, values=TIME_WINDOWS_UPPER, name="upper")
+# The matrix, demands, time windows and pairs are stored as int32 arrays
+# (pickups are accounted for positively, deliveries negatively)
+instance = PDPTWInstance.from_source_sink(
+    DISTANCES, demands=DEMAND, lower=TIME_WINDOWS_LOWER, upper=TIME_WINDOWS_UPPER, pairs=pickups_deliveries)
+LOAD_CAPACITY = 4
 
-# Set a time limit (in seconds) for the solver to find the best solution
-time_limit = 10  # Let's limit it to 10 seconds for this example
+# Or read a Li & Lim / CSV file given on the command line
+if len(sys.argv) > 1:
+    instance, fleet = load_instance(sys.argv[1])
+    LOAD_CAPACITY = fleet.get("capacity", LOAD_CAPACITY)
 
-# # Create the problem instance
-prob = VehicleRoutingProblem(G, load_capacity=4, num_stops=6, pickup_delivery=True)
-
-
-# Enable logging to console to show intermediate results and progress
-prob.time_windows = True
-prob.solve(cspy=False, ) #, log_to_console=True time_limit=time_limit
-
-# # Print the current best solution and its value
-print("Best Value:", prob.best_value)
-print("Best Routes:", prob.best_routes)
-print("Node Loads:", prob.node_load)
+# Set a time limit (in seconds) for the solver to find the best solution
+time_limit = 30  # vrpy needs about 15 seconds for its first round here
+
+if __name__ == "__main__":
+    # vrpy runs in a separate process that is stopped at the deadline, every
+    # better solution is printed as soon as it is found. Re-running the same
+    # problem with the same options answers from .solution_cache at once
+    telemetry = Telemetry()
+
+    def on_solution(incumbent):
+        telemetry.on_solution(incumbent)
+        print(f"{incumbent.elapsed:.1f}s {incumbent.solver}: {incumbent.objective}")
+
+    best = cached_solve(instance, "vrpy", time_limit, load_capacity=LOAD_CAPACITY, num_stops=6,
+                        on_solution=on_solution, on_iteration=telemetry.on_iteration)
+
+    # # Print the current best solution and its value
+    print("Best Value:", best.objective)
+    print("Best Routes:", best.routes)
+
+    # Convergence: column generation iterations (master LP objective, columns,
+    # pricing time) and the improving solutions, see pdptw_telemetry
+    for iteration in telemetry.iterations:
+        print(f"  {iteration.elapsed:.1f}s iteration {iteration.iteration}: master {iteration.master_objective:.1f}, "
+              f"{iteration.columns} columns, pricing {iteration.pricing_time:.2f}s")
+    print("Convergence:", telemetry.metrics(horizon=time_limit))
 # 限制時間 ==>
 # INFO:vrpy.master_solve_pulp:total cost = 8468.0
 # Best Value: 8468
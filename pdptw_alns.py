@@ -0,0 +1,263 @@
+import math
+import time
+
+import numpy as np
+
+from pdptw_construct import INF, insert_pairs, route_feasible, single_route_costs
+from pdptw_instance import DEPOT
+from pdptw_validate import routes_from_vrpy
+
+
+class ALNS:
+    """Adaptive large neighbourhood search for PDPTW (Ropke & Pisinger style).
+
+    Each iteration removes q pairs with one removal operator (random, Shaw
+    related, worst), puts them back with one repair operator (greedy, regret-2,
+    regret-3 insertion from pdptw_construct) and accepts the result with
+    simulated annealing. Operators are picked by roulette wheel over weights
+    that adapt to how often they lead to new best, improving or accepted
+    solutions. The temperature cools with the elapsed share of the time
+    budget, so every run ends cold no matter how long it was given.
+
+    Mirrors the vrpy interface: ``solve(time_limit=...)`` then read
+    ``best_value``, ``best_routes`` ({vehicle: ['Source', ..., 'Sink']}) and
+    ``node_load``.
+    """
+
+    REMOVALS = ("random", "shaw", "worst")
+    REPAIRS = ("greedy", "regret2", "regret3")
+    # Scores for a new best, an improvement and an accepted worse solution
+    SIGMA = (33, 9, 13)
+    SEGMENT = 100
+    REACTION = 0.1
+
+    def __init__(self, instance, load_capacity=None, num_stops=None, num_vehicles=None, time_windows=None,
+                 seed=None):
+        self.instance = instance
+        self.load_capacity = load_capacity
+        self.num_stops = num_stops
+        self.num_vehicles = num_vehicles
+        self.time_windows = instance.has_time_windows if time_windows is None else time_windows
+        self.rng = np.random.default_rng(seed)
+
+        self._dist = instance.distances.astype(np.int64)
+        self._pair_of = np.full(instance.num_nodes, -1, dtype=np.int64)
+        self._pair_of[instance.pairs[:, 0]] = np.arange(instance.num_pairs)
+        self._pair_of[instance.pairs[:, 1]] = np.arange(instance.num_pairs)
+        self._alone = single_route_costs(instance, load_capacity, self.time_windows)
+        finite = self._alone[self._alone < INF]
+        # An unserved pair costs more than any way of serving it
+        self.unrouted_penalty = 2 * int(finite.max() if finite.size else self._dist.max() * 3) + 1
+
+        self.best_value = None
+        self.best_routes = {}
+        self.best_solution = []
+        self.node_load = {}
+        self.unrouted = []
+        self.iterations = 0
+
+    # Solution bookkeeping
+
+    def _route_cost(self, stops):
+        nodes = [DEPOT] + list(stops) + [DEPOT]
+        return int(self._dist[nodes[:-1], nodes[1:]].sum())
+
+    def _objective(self, routes, unplaced):
+        return sum(self._route_cost(stops) for stops in routes) + self.unrouted_penalty * len(unplaced)
+
+    def _routed_pairs(self, routes):
+        if not routes:
+            return np.empty(0, dtype=np.int64)
+        routed = np.unique(self._pair_of[[row for stops in routes for row in stops]])
+        # Rows outside every pair (possible in given initial routes) map to -1
+        return routed[routed >= 0]
+
+    def _without(self, routes, removed_rows):
+        # Taking a pair out can break the rest of its route when pickup and
+        # delivery demands do not balance; such a route is emptied as well.
+        # Returns the routes left and the pairs of the emptied ones
+        kept, emptied = [], []
+        for stops in routes:
+            rest = [row for row in stops if row not in removed_rows]
+            if len(rest) == len(stops) or route_feasible(rest, self.instance, self.load_capacity, self.time_windows):
+                if rest:
+                    kept.append(rest)
+            else:
+                emptied.append(self._routed_pairs([rest]))
+        return kept, np.concatenate(emptied) if emptied else np.empty(0, dtype=np.int64)
+
+    def _repair(self, routes, pending, regret):
+        return insert_pairs(self.instance, routes, pending, self.load_capacity, self.num_stops,
+                            self.num_vehicles, regret, self.time_windows, alone=self._alone)
+
+    # Removal operators, each returns pair indices
+
+    def _random_removal(self, routes, q):
+        routed = self._routed_pairs(routes)
+        return self.rng.choice(routed, size=min(q, len(routed)), replace=False)
+
+    def _shaw_removal(self, routes, q, determinism=6):
+        routed = self._routed_pairs(routes)
+        pairs = self.instance.pairs
+        p, d = pairs[:, 0], pairs[:, 1]
+        dist = self._dist
+        scale_d = max(float(dist.max()), 1.0)
+        lower = self.instance.lower if self.instance.has_time_windows else None
+        scale_t = max(float(self.instance.upper.max()), 1.0) if lower is not None else 1.0
+        demand = self.instance.demands
+        scale_q = max(float(np.abs(demand).max()), 1.0)
+
+        if not len(routed):
+            return routed
+        removed = [self.rng.choice(routed)]
+        remaining = np.setdiff1d(routed, removed)
+        while len(removed) < q and len(remaining):
+            seed = removed[self.rng.integers(len(removed))]
+            # Related pairs: close pickups and deliveries, similar windows and loads
+            related = (dist[p[seed], p[remaining]] + dist[d[seed], d[remaining]]) / scale_d
+            if lower is not None:
+                related = related + (np.abs(lower[p[seed]] - lower[p[remaining]])
+                                     + np.abs(lower[d[seed]] - lower[d[remaining]])) / scale_t
+            related = related + np.abs(demand[p[seed]] - demand[p[remaining]]) / scale_q
+            order = np.argsort(related, kind="stable")
+            pick = order[int(self.rng.random() ** determinism * len(order))]
+            removed.append(remaining[pick])
+            remaining = np.delete(remaining, pick)
+        return np.array(removed)
+
+    def _worst_removal(self, routes, q, determinism=3):
+        n = self.instance.num_nodes
+        prev = np.full(n, DEPOT, dtype=np.int64)
+        succ = np.full(n, DEPOT, dtype=np.int64)
+        for stops in routes:
+            nodes = [DEPOT] + stops + [DEPOT]
+            prev[stops] = nodes[:-2]
+            succ[stops] = nodes[2:]
+        routed = self._routed_pairs(routes)
+        p, d = self.instance.pairs[routed, 0], self.instance.pairs[routed, 1]
+        dist = self._dist
+        saving = (dist[prev[p], p] + dist[p, succ[p]] - dist[prev[p], succ[p]]
+                  + dist[prev[d], d] + dist[d, succ[d]] - dist[prev[d], succ[d]])
+        adjacent = succ[p] == d
+        saving[adjacent] = (dist[prev[p], p] + dist[p, d] + dist[d, succ[d]] - dist[prev[p], succ[d]])[adjacent]
+        order = np.argsort(-saving, kind="stable")
+        chosen = []
+        while len(chosen) < min(q, len(order)):
+            pick = int(self.rng.random() ** determinism * len(order))
+            chosen.append(routed[order[pick]])
+            order = np.delete(order, pick)
+        return np.array(chosen, dtype=np.int64)
+
+    # Search
+
+    def _initial(self, initial_routes):
+        if initial_routes is None:
+            return self._repair([], np.arange(self.instance.num_pairs), 2)
+        if isinstance(initial_routes, dict):
+            initial_routes = routes_from_vrpy(initial_routes, self.instance)
+        routes = [list(stops) for stops in initial_routes if stops]
+        for stops in routes:
+            if not route_feasible(stops, self.instance, self.load_capacity, self.time_windows):
+                raise ValueError(f"Initial route {stops} is infeasible")
+        missing = np.setdiff1d(np.arange(self.instance.num_pairs), self._routed_pairs(routes))
+        return self._repair(routes, missing, 2)
+
+    def _pick(self, weights):
+        return int(self.rng.choice(len(weights), p=weights / weights.sum()))
+
+    def solve(self, time_limit=60, max_iterations=None, initial_routes=None, max_removal=None, on_improvement=None):
+        """Runs until time_limit seconds have passed (or max_iterations).
+
+        initial_routes may be vrpy ``best_routes`` or lists of instance rows,
+        missing pairs are inserted first. Without it the start is a regret-2
+        construction. on_improvement(value, best_routes) is called for the
+        start and for every new best solution that serves all pairs.
+        """
+        deadline = time.perf_counter() + time_limit
+        start_time = time.perf_counter()
+        P = self.instance.num_pairs
+
+        routes, unplaced = self._initial(initial_routes)
+        current = best = self._objective(routes, unplaced)
+        best_routes, best_unplaced = routes, unplaced
+        if on_improvement is not None and not unplaced:
+            on_improvement(best, self._labelled(routes))
+        if P == 0:
+            self._store(best_routes, best_unplaced, best)
+            return
+
+        low = min(4, P)
+        high = max(low, min(max_removal or 60, int(0.25 * P)))
+        start_temperature = max(0.05 * current / math.log(2), 1.0)
+        end_temperature = start_temperature * 2e-3
+
+        removal_weights = np.ones(len(self.REMOVALS))
+        repair_weights = np.ones(len(self.REPAIRS))
+        removal_scores = np.zeros(len(self.REMOVALS))
+        repair_scores = np.zeros(len(self.REPAIRS))
+        removal_uses = np.zeros(len(self.REMOVALS))
+        repair_uses = np.zeros(len(self.REPAIRS))
+
+        iteration = 0
+        while time.perf_counter() < deadline and (max_iterations is None or iteration < max_iterations):
+            iteration += 1
+            q = int(self.rng.integers(low, high + 1))
+            removal, repair = self._pick(removal_weights), self._pick(repair_weights)
+            removed = (self._random_removal, self._shaw_removal, self._worst_removal)[removal](routes, q)
+            rows = set(self.instance.pairs[removed].ravel().tolist())
+            kept, emptied = self._without(routes, rows)
+            pending = np.union1d(np.union1d(removed, unplaced), emptied).astype(np.int64)
+            candidate, candidate_unplaced = self._repair(kept, pending, repair + 1)
+            value = self._objective(candidate, candidate_unplaced)
+
+            progress = min((time.perf_counter() - start_time) / time_limit, 1.0)
+            temperature = start_temperature * (end_temperature / start_temperature) ** progress
+            score = 0
+            if value < best:
+                best, best_routes, best_unplaced = value, candidate, candidate_unplaced
+                score = self.SIGMA[0]
+                if on_improvement is not None and not candidate_unplaced:
+                    on_improvement(value, self._labelled(candidate))
+            if value < current:
+                score = score or self.SIGMA[1]
+            if value < current or self.rng.random() < math.exp(-(value - current) / temperature):
+                if value >= current:
+                    score = score or self.SIGMA[2]
+                routes, unplaced, current = candidate, candidate_unplaced, value
+
+            removal_scores[removal] += score
+            repair_scores[repair] += score
+            removal_uses[removal] += 1
+            repair_uses[repair] += 1
+            if iteration % self.SEGMENT == 0:
+                for weights, scores, uses in ((removal_weights, removal_scores, removal_uses),
+                                              (repair_weights, repair_scores, repair_uses)):
+                    used = uses > 0
+                    weights[used] = (1 - self.REACTION) * weights[used] + self.REACTION * scores[used] / uses[used]
+                    weights[:] = np.maximum(weights, 0.05)
+                    scores[:] = 0
+                    uses[:] = 0
+
+        self.iterations = iteration
+        self._store(best_routes, best_unplaced, best)
+
+    def _labelled(self, routes):
+        label = self.instance.node_ids.tolist()
+        return {vehicle: ["Source"] + [label[row] for row in stops] + ["Sink"]
+                for vehicle, stops in enumerate(routes, start=1)}
+
+    def _store(self, routes, unplaced, value):
+        label = self.instance.node_ids.tolist()
+        demands = self.instance.demands.tolist()
+        self.best_solution = routes
+        self.unrouted = [tuple(pair) for pair in self.instance.pairs[unplaced].tolist()]
+        self.best_value = value - self.unrouted_penalty * len(unplaced)
+        self.best_routes = self._labelled(routes)
+        self.node_load = {}
+        for vehicle, stops in enumerate(routes, start=1):
+            load, loads = 0, {"Source": 0}
+            for row in stops:
+                load += demands[row]
+                loads[label[row]] = load
+            loads["Sink"] = load
+            self.node_load[vehicle] = loads
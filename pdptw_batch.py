@@ -0,0 +1,255 @@
+import argparse
+import collections
+import contextlib
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from multiprocessing.connection import wait
+
+from pdptw_solve import SOLVERS
+
+BATCH_SOLVERS = SOLVERS + ("clusters", "portfolio")
+# Statuses that count as done when resuming without --retry-failed, a job
+# with any other status is run again
+DONE = ("ok", "no solution")
+# How often running jobs are checked against their memory limit, in seconds
+WATCH_INTERVAL = 0.2
+
+Job = collections.namedtuple("Job", "id spec")
+
+
+def job_id(spec):
+    """The "id" of a manifest entry, or a hash of the entry when it has none."""
+    if "id" in spec:
+        return str(spec["id"])
+    return hashlib.sha1(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def read_manifest(path, defaults=None):
+    """Jobs of a JSON lines manifest, each line merged over defaults.
+
+    A line holds "instance" (a file for ``pdptw_io.load_instance``, with an
+    optional "format") or "generate" (keyword arguments of
+    ``pdptw_generate.generate_instance``), and optionally "id", "solver",
+    "time_limit" (seconds), "hard_limit" (seconds before the job is killed),
+    "memory_limit_mb" and "options" (``pdptw_solve.solve`` keywords such as
+    load_capacity, num_stops, time_windows, seed).
+    """
+    jobs = []
+    with open(path) as f:
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            spec = dict(defaults or {}, **json.loads(line))
+            if ("instance" in spec) == ("generate" in spec):
+                raise ValueError(f"{path}:{number}: give exactly one of 'instance' and 'generate'")
+            if spec.get("solver", "ortools") not in BATCH_SOLVERS:
+                raise ValueError(f"{path}:{number}: unknown solver {spec['solver']!r}, expected one of {BATCH_SOLVERS}")
+            jobs.append(Job(job_id(spec), spec))
+    ids = [job.id for job in jobs]
+    if len(set(ids)) != len(ids):
+        raise ValueError(f"{path}: job ids must be unique")
+    return jobs
+
+
+def finished_ids(output, retry_failed=False):
+    """Ids of the jobs already in an output file (only the successful ones with retry_failed)."""
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # the line being written when the run was interrupted
+            if not retry_failed or record.get("status") in DONE:
+                done.add(record["id"])
+    return done
+
+
+def _load(spec):
+    if "generate" in spec:
+        from pdptw_generate import generate_instance
+
+        return generate_instance(**spec["generate"]), {}
+    from pdptw_io import load_instance
+
+    return load_instance(spec["instance"], spec.get("format"))
+
+
+def _solve(spec):
+    instance, fleet = _load(spec)
+    options = dict(spec.get("options", {}))
+    # A file's fleet fills in what the job leaves open
+    options.setdefault("load_capacity", fleet.get("capacity"))
+    options.setdefault("num_vehicles", fleet.get("num_vehicles"))
+    solver, time_limit = spec.get("solver", "ortools"), spec.get("time_limit", 60)
+    if solver == "clusters":
+        from pdptw_cluster import solve_clustered
+
+        options.pop("num_vehicles")
+        return solve_clustered(instance, "ortools", time_limit, **options)
+    if solver == "portfolio":
+        from pdptw_portfolio import solve_portfolio
+
+        options.pop("seed", None)
+        return solve_portfolio(instance, time_limit, **options)
+    from pdptw_solve import solve
+
+    return solve(instance, solver, time_limit, **options)
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def _rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return None  # no /proc, memory limits are not enforced
+
+
+def _child(conn, spec):
+    record = {"objective": None, "routes": None, "solver": None, "elapsed": None}
+    try:
+        logging.disable(logging.WARNING)
+        with contextlib.redirect_stdout(io.StringIO()):
+            start_time = time.perf_counter()
+            best = _solve(spec)
+            record["wall_time"] = time.perf_counter() - start_time
+        if best is not None:
+            record.update(objective=best.objective, routes=best.routes, solver=best.solver, elapsed=best.elapsed)
+        record["status"] = "ok" if best is not None else "no solution"
+    except Exception as e:
+        record["status"] = f"error: {type(e).__name__}: {e}"
+    record["peak_rss_mb"] = _peak_rss_mb()
+    conn.send(record)
+    conn.close()
+
+
+class _Running:
+    def __init__(self, job, context):
+        self.job = job
+        time_limit = job.spec.get("time_limit", 60)
+        # vrpy only checks its time limit between iterations, give it room before killing
+        self.hard_limit = job.spec.get("hard_limit", 3 * time_limit + 30)
+        self.memory_limit_mb = job.spec.get("memory_limit_mb")
+        self.conn, child_conn = context.Pipe(duplex=False)
+        self.process = context.Process(target=_child, args=(child_conn, job.spec))
+        self.start_time = time.perf_counter()
+        self.process.start()
+        child_conn.close()
+
+    def check(self):
+        """The record of a finished job, or None while it runs (killing it past its limits)."""
+        elapsed = time.perf_counter() - self.start_time
+        record = None
+        if self.conn.poll():
+            try:
+                record = self.conn.recv()
+            except EOFError:
+                pass
+        if record is None and not self.process.is_alive():
+            record = {"status": f"error: worker exited with code {self.process.exitcode}"}
+        if record is None and elapsed > self.hard_limit:
+            record = {"status": "timeout"}
+        if record is None and self.memory_limit_mb is not None:
+            rss = _rss_mb(self.process.pid)
+            if rss is not None and rss > self.memory_limit_mb:
+                record = {"status": "memory", "peak_rss_mb": rss}
+        if record is None:
+            return None
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+        record = dict({"objective": None, "routes": None, "solver": None, "elapsed": None,
+                       "wall_time": elapsed, "peak_rss_mb": None}, **record)
+        return dict(id=self.job.id, **record)
+
+
+def run_batch(manifest, output, max_workers=None, retry_failed=False, defaults=None, on_result=None):
+    """Runs every job of a manifest not yet in output, max_workers at a time.
+
+    Each job runs in its own spawned process and is killed once it passes its
+    hard_limit or its memory_limit_mb (resident memory, checked every
+    WATCH_INTERVAL seconds; a vrpy solve's own child process is not
+    counted). Results are appended to output as JSON lines the moment a job
+    ends, so an interrupted batch picks up where it stopped when run again.
+    on_result(record) is called with each line. Returns the number of jobs run.
+    """
+    jobs = read_manifest(manifest, defaults)
+    done = finished_ids(output, retry_failed)
+    pending = collections.deque(job for job in jobs if job.id not in done)
+    max_workers = max_workers or os.cpu_count() or 1
+    context = multiprocessing.get_context("spawn")
+    running = []
+    count = 0
+    if os.path.exists(output) and os.path.getsize(output):
+        with open(output, "rb+") as f:
+            # A line cut off by an interruption must not run into the next one
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+    with open(output, "a") as f:
+        try:
+            while pending or running:
+                while pending and len(running) < max_workers:
+                    running.append(_Running(pending.popleft(), context))
+                wait([job.conn for job in running] + [job.process.sentinel for job in running],
+                     timeout=WATCH_INTERVAL)
+                still_running = []
+                for job in running:
+                    record = job.check()
+                    if record is None:
+                        still_running.append(job)
+                        continue
+                    f.write(json.dumps(record) + "\n")
+                    f.flush()
+                    count += 1
+                    if on_result is not None:
+                        on_result(record)
+                running = still_running
+        finally:
+            # Interrupted: the unfinished jobs have no line and run again next time
+            for job in running:
+                job.process.kill()
+                job.process.join()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs a manifest of PDPTW solves across a process pool.")
+    parser.add_argument("manifest", help="JSON lines, one job per line (see read_manifest)")
+    parser.add_argument("output", help="JSON lines results, appended to and used to resume")
+    parser.add_argument("--workers", type=int, default=None, help="jobs at a time (default: CPU count)")
+    parser.add_argument("--solver", choices=BATCH_SOLVERS, help="default solver")
+    parser.add_argument("--time-limit", type=float, help="default solver time limit in seconds")
+    parser.add_argument("--memory-limit", type=float, help="default memory limit per job in MB")
+    parser.add_argument("--retry-failed", action="store_true", help="run jobs that timed out or failed again")
+    args = parser.parse_args()
+
+    defaults = {"solver": args.solver, "time_limit": args.time_limit, "memory_limit_mb": args.memory_limit}
+    defaults = {key: value for key, value in defaults.items() if value is not None}
+
+    def report(record):
+        print(f"{record['id']:>14} {record['status']:>12} {record['wall_time'] or 0:>9.2f}s "
+              f"{record['peak_rss_mb'] or 0:>8.1f}MB {record['objective']}", flush=True)
+
+    count = run_batch(args.manifest, args.output, args.workers, args.retry_failed, defaults, report)
+    print(f"{count} job(s) run, results in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
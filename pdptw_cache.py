@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from pdptw_solve import Incumbent, solve
+
+# Solved plans are stored here as one JSON file per key
+DEFAULT_CACHE_DIR = ".solution_cache"
+DEFAULT_MAX_BYTES = 64 * 2 ** 20
+CACHE_VERSION = 1
+
+# Every array that changes the answer; coordinates only matter through the matrices
+_ARRAYS = ("distances", "travel_times", "demands", "lower", "upper", "service_times", "pairs", "node_ids")
+
+
+def _canonical(value):
+    # Tuples, numpy scalars and arrays hash like the equal lists and ints
+    if isinstance(value, dict):
+        return {str(key): _canonical(item) for key, item in sorted(value.items(), key=lambda item: str(item[0]))}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def solution_key(instance, **parameters):
+    """Hash of the instance arrays and every parameter that changes the answer.
+
+    The arrays are hashed by value (dtype and shape included), so the same
+    problem built twice, or a memory-mapped copy of it, gets the same key.
+    parameters are the solver name and options, e.g. load_capacity or
+    num_stops; None values count as left out.
+    """
+    digest = hashlib.sha1(f"{CACHE_VERSION}".encode())
+    for name in _ARRAYS:
+        array = getattr(instance, name)
+        if array is None:
+            digest.update(f"{name} None".encode())
+            continue
+        array = np.ascontiguousarray(array)
+        digest.update(f"{name} {array.dtype.str} {array.shape}".encode())
+        digest.update(array.tobytes())
+    parameters = {key: value for key, value in parameters.items() if value is not None}
+    digest.update(json.dumps(_canonical(parameters), sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+class SolutionCache:
+    """Solved plans on disk, keyed by ``solution_key``, least recently used evicted first.
+
+    Each entry is a small JSON file, its modification time is the last time it
+    was read or written. After every write the oldest entries are deleted
+    until the directory holds at most max_bytes.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        """The value stored under key, or None."""
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        if entry.get("version") != CACHE_VERSION:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry["value"]
+
+    def put(self, key, value):
+        """Stores a JSON-serialisable value under key (replaced atomically), then evicts."""
+        os.makedirs(self.directory, exist_ok=True)
+        handle, staging = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(handle, "w") as f:
+                json.dump({"version": CACHE_VERSION, "value": _canonical(value)}, f)
+            os.replace(staging, self._path(key))
+        finally:
+            if os.path.exists(staging):
+                os.remove(staging)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith(".json"):
+                    os.remove(os.path.join(self.directory, name))
+
+
+def _routes_from_json(routes):
+    # JSON turns the vehicle numbers into strings
+    return {int(vehicle): route for vehicle, route in routes.items()}
+
+
+def cached_solve(instance, solver="ortools", time_limit=60, cache=None, on_solution=None, on_iteration=None,
+                 **options):
+    """``pdptw_solve.solve`` through a ``SolutionCache``.
+
+    The key covers the instance, solver, time_limit and options (seed
+    included), so a hit is the answer the same call gave before. It comes
+    back at once, with the elapsed time of the original solve, and is also
+    passed to on_solution (on_iteration sees nothing). Answers with nothing
+    found are not stored.
+    """
+    cache = SolutionCache() if cache is None else cache
+    key = solution_key(instance, solver=solver, time_limit=time_limit, **options)
+    stored = cache.get(key)
+    if stored is not None:
+        best = Incumbent(stored["objective"], _routes_from_json(stored["routes"]), stored["elapsed"], stored["solver"])
+        if on_solution is not None:
+            on_solution(best)
+        return best
+    best = solve(instance, solver, time_limit, on_solution=on_solution, on_iteration=on_iteration, **options)
+    if best is not None:
+        cache.put(key, best._asdict())
+    return best
@@ -0,0 +1,168 @@
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from pdptw_construct import insert_pairs, single_route_costs, to_vrpy_routes
+from pdptw_solve import Incumbent, solve, total_distance
+from pdptw_validate import routes_from_vrpy
+
+
+def pair_dissimilarity(instance, time_weight=1.0, time_windows=None):
+    """(P, P) dissimilarity of the request pairs in space and time.
+
+    Space is the distance between the two pickups plus the distance between
+    the two deliveries (both directions averaged, the matrices may be
+    asymmetric), time is the gap between the pickup window centres plus the
+    gap between the delivery window centres. Each part is divided by its mean
+    so time_weight is the weight of time relative to space.
+    """
+    if time_windows is None:
+        time_windows = instance.has_time_windows
+    p = instance.pairs[:, 0].astype(np.int64)
+    d = instance.pairs[:, 1].astype(np.int64)
+    dist = instance.distances
+    space = (dist[np.ix_(p, p)] + dist[np.ix_(p, p)].T + dist[np.ix_(d, d)] + dist[np.ix_(d, d)].T) / 2.0
+    out = space / max(space.mean(), 1e-9)
+    if time_windows and instance.has_time_windows:
+        centre = (instance.lower.astype(np.float64) + instance.upper) / 2
+        gap = np.abs(centre[p][:, None] - centre[p][None, :]) + np.abs(centre[d][:, None] - centre[d][None, :])
+        out += time_weight * gap / max(gap.mean(), 1e-9)
+    return out
+
+
+def _assign(dissimilarity, medoids, capacity):
+    # Closest (pair, medoid) combinations first, a medoid takes at most capacity pairs
+    labels = np.full(len(dissimilarity), -1, dtype=np.int64)
+    sizes = np.zeros(len(medoids), dtype=np.int64)
+    cost = dissimilarity[:, medoids]
+    for flat in np.argsort(cost, axis=None, kind="stable"):
+        pair, cluster = divmod(int(flat), len(medoids))
+        if labels[pair] < 0 and sizes[cluster] < capacity:
+            labels[pair] = cluster
+            sizes[cluster] += 1
+    return labels
+
+
+def cluster_pairs(instance, max_pairs=10, time_weight=1.0, time_windows=None, seed=0, max_rounds=20,
+                  dissimilarity=None):
+    """Splits the pairs into clusters of at most max_pairs with capacitated k-medoids.
+
+    Uses ``pair_dissimilarity``, so it works on any distance matrix and needs
+    no coordinates. Starts from k-medoids++ seeds and alternates assignment
+    and medoid updates until the clusters stop changing.
+    dissimilarity may pass a precomputed ``pair_dissimilarity``.
+    Returns the cluster label of every pair.
+    """
+    P = instance.num_pairs
+    if P == 0:
+        return np.empty(0, dtype=np.int64)
+    k = math.ceil(P / max_pairs)
+    rng = np.random.default_rng(seed)
+    if dissimilarity is None:
+        dissimilarity = pair_dissimilarity(instance, time_weight, time_windows)
+
+    medoids = [int(rng.integers(P))]
+    for _ in range(1, k):
+        closest = dissimilarity[:, medoids].min(axis=1)
+        weights = closest ** 2
+        medoids.append(int(rng.choice(P, p=weights / weights.sum())) if weights.sum() > 0 else int(rng.integers(P)))
+    medoids = np.array(medoids)
+
+    labels = _assign(dissimilarity, medoids, max_pairs)
+    for _ in range(max_rounds):
+        for c in range(k):
+            members = np.flatnonzero(labels == c)
+            within = dissimilarity[np.ix_(members, members)].sum(axis=1)
+            medoids[c] = members[np.argmin(within)]
+        new_labels = _assign(dissimilarity, medoids, max_pairs)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+    return labels
+
+
+def _solve_cluster(job):
+    sub_instance, solver, time_limit, options = job
+    best = solve(sub_instance, solver, time_limit, **options)
+    return None if best is None else best.routes
+
+
+def _boundary_pairs(labels, dissimilarity, neighbours=3):
+    # Pairs with one of their closest other pairs in another cluster
+    others = np.argsort(dissimilarity + np.diag(np.full(len(labels), np.inf)), axis=1)[:, :neighbours]
+    return np.flatnonzero((labels[others] != labels[:, None]).any(axis=1))
+
+
+def solve_clustered(instance, solver="ortools", time_limit=60, max_pairs=10, repair_share=0.25, load_capacity=None,
+                    num_stops=None, time_windows=None, time_weight=1.0, max_workers=None, seed=0):
+    """Clusters the pairs in space and time, solves each cluster on its own and repairs the joined plan.
+
+    Each cluster of at most max_pairs pairs is solved with ``pdptw_solve.solve``
+    (solver "ortools", "vrpy" or "alns") in a process pool (max_workers=1
+    solves them here, one after the other). The cluster routes are then put
+    together: pairs no cluster solve served are inserted by regret, the pairs
+    on cluster boundaries are taken out and re-inserted across all routes,
+    and ALNS improves the result for the rest of time_limit. The cluster
+    solves share (1 - repair_share) of time_limit, split by how many rounds
+    of clusters the pool has to go through.
+
+    Returns an ``Incumbent`` (None if some pair cannot be served at all).
+    """
+    start_time = time.perf_counter()
+    if time_windows is None:
+        time_windows = instance.has_time_windows
+    dissimilarity = pair_dissimilarity(instance, time_weight, time_windows)
+    labels = cluster_pairs(instance, max_pairs, seed=seed, dissimilarity=dissimilarity)
+    clusters = [np.flatnonzero(labels == c) for c in range(labels.max() + 1)] if len(labels) else []
+    options = {"load_capacity": load_capacity, "num_stops": num_stops, "time_windows": time_windows, "seed": seed}
+    workers = max_workers or os.cpu_count() or 1
+    rounds = max(math.ceil(len(clusters) / workers), 1)
+    cluster_time_limit = (1 - repair_share) * (time_limit - (time.perf_counter() - start_time)) / rounds
+    jobs = [(instance.subset(instance.pairs[members]), solver, cluster_time_limit, options) for members in clusters]
+
+    if max_workers == 1 or len(jobs) <= 1:
+        cluster_routes = [_solve_cluster(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            cluster_routes = list(pool.map(_solve_cluster, jobs))
+
+    # Merge: the cluster routes side by side, in rows of the full instance
+    routes = []
+    for best_routes in cluster_routes:
+        if best_routes is not None:
+            routes += routes_from_vrpy(best_routes, instance)
+    pair_of = np.full(instance.num_nodes, -1, dtype=np.int64)
+    pair_of[instance.pairs[:, 0]] = np.arange(instance.num_pairs)
+    served = np.zeros(instance.num_pairs, dtype=bool)
+    served[pair_of[[row for route in routes for row in route]]] = True
+
+    alone = single_route_costs(instance, load_capacity, time_windows)
+    routes, unplaced = insert_pairs(instance, routes, np.flatnonzero(~served), load_capacity, num_stops,
+                                    regret=2, time_windows=time_windows, alone=alone)
+    if unplaced:
+        return None
+
+    # Repair across cluster boundaries: re-insert the boundary pairs into any route
+    boundary = _boundary_pairs(labels, dissimilarity)
+    rows = set(instance.pairs[boundary].ravel().tolist())
+    kept = [stops for stops in ([row for row in route if row not in rows] for route in routes) if stops]
+    candidate, unplaced = insert_pairs(instance, kept, boundary, load_capacity, num_stops, regret=2,
+                                       time_windows=time_windows, alone=alone)
+    if not unplaced and total_distance(instance, candidate) < total_distance(instance, routes):
+        routes = candidate
+
+    objective = total_distance(instance, routes)
+    best_routes = dict(enumerate(to_vrpy_routes(routes, instance, singles=False), start=1))
+    name = f"clusters/{solver}"
+    repair_time_limit = time_limit - (time.perf_counter() - start_time)
+    if repair_share > 0 and repair_time_limit > 0:
+        from pdptw_alns import ALNS
+
+        prob = ALNS(instance, load_capacity=load_capacity, num_stops=num_stops, time_windows=time_windows, seed=seed)
+        prob.solve(time_limit=repair_time_limit, initial_routes=routes)
+        if not prob.unrouted and prob.best_value < objective:
+            objective, best_routes = prob.best_value, prob.best_routes
+    return Incumbent(int(objective), best_routes, time.perf_counter() - start_time, name)
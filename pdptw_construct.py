@@ -0,0 +1,256 @@
+import time
+
+import numpy as np
+
+from pdptw_instance import DEPOT
+from pdptw_profile import profiled
+from pdptw_route import INF, Route, schedule_bounds, service_durations, take, travel_durations
+
+
+def route_feasible(stops, instance, load_capacity=None, time_windows=True):
+    """Exact load and time window check of one route (rows, without the depot)."""
+    demands = instance.demands
+    load = 0
+    for row in stops:
+        load += int(demands[row])
+        if load < 0 or (load_capacity is not None and load > load_capacity):
+            return False
+    if time_windows and instance.has_time_windows:
+        earliest, latest = schedule_bounds(np.array([DEPOT] + list(stops) + [DEPOT]), instance)
+        return bool((earliest <= latest).all())
+    return True
+
+
+def insertion_costs(route, pickups, deliveries, instance, load_capacity=None, num_stops=None):
+    """Cost increase of inserting each pair at every (i, j) position of one route.
+
+    The pickup goes after position i and the delivery after position j >= i
+    (positions count from the leading depot). Returns a (P, m, m) int64 array
+    with INF where the insertion breaks the load limits, the stop limit or
+    the time windows. Time windows are checked exactly for each node on its own,
+    the joint effect of both insertions is verified afterwards by
+    ``Route.can_insert``.
+    """
+    nodes = route.nodes
+    m = len(nodes) - 1  # number of arcs, i.e. insertion slots
+    dist = instance.distances
+    a, b = nodes[:-1], nodes[1:]
+    p, d = pickups[:, None], deliveries[:, None]
+
+    # Detour of each single node in each slot: (P, m)
+    removed = take(dist, a, b)[None, :]
+    to_p = take(dist, a[None, :], p)
+    detour_p = to_p + take(dist, p, b[None, :]) - removed
+    detour_d = take(dist, a[None, :], d) + take(dist, d, b[None, :]) - removed
+    cost = detour_p[:, :, None] + detour_d[:, None, :]
+    # Same slot: a -> p -> d -> b
+    same = to_p + take(dist, p, d) + take(dist, d, b[None, :]) - removed
+    slots = np.arange(m)
+    cost[:, slots, slots] = same
+    cost[:, slots[:, None] > slots[None, :]] = INF
+
+    if num_stops is not None and len(route.stops) + 2 > num_stops:
+        cost[:] = INF
+        return cost
+
+    # Loads: the pickup demand is added over slots i..j, the pair's net demand
+    # at the delivery and at every stop after it; all must stay in [0, load_capacity]
+    load = route.load[:m]
+    peak = np.full((m, m), -INF, dtype=np.int64)
+    trough = np.full((m, m), INF, dtype=np.int64)
+    for i in range(m):
+        peak[i, i:] = np.maximum.accumulate(load[i:])
+        trough[i, i:] = np.minimum.accumulate(load[i:])
+    after = load[1:][::-1]  # stops after slot j, i.e. positions j + 1 .. m - 1
+    peak_after = np.r_[np.maximum.accumulate(after)[::-1], -INF] if m > 1 else np.full(1, -INF)
+    trough_after = np.r_[np.minimum.accumulate(after)[::-1], INF] if m > 1 else np.full(1, INF)
+    quantity = take(instance.demands, pickups)[:, None]
+    net = quantity + take(instance.demands, deliveries)[:, None]
+    at_delivery = np.minimum(load[None, :] + net, trough_after[None, :] + net)  # (P, m) by j
+    bad = (trough[None, :, :] + quantity[:, :, None] < 0) | (at_delivery < 0)[:, None, :]
+    if load_capacity is not None:
+        highest = np.maximum(load[None, :] + net, peak_after[None, :] + net)
+        bad |= (peak[None, :, :] + quantity[:, :, None] > load_capacity) | (highest > load_capacity)[:, None, :]
+    cost[bad] = INF
+
+    if route.earliest is not None:
+        lower, upper = instance.lower, instance.upper
+        leave = route.earliest[:-1] + service_durations(instance, a)
+        latest_next = route.latest[1:][None, :]
+
+        def start_at(u):
+            # (P, m) service start of u inserted in each slot
+            return np.maximum(leave[None, :] + travel_durations(instance, a[None, :], u), take(lower, u))
+
+        def fits(u, start):
+            on_time = start <= take(upper, u)
+            next_ok = start + service_durations(instance, u) + travel_durations(instance, u, b[None, :]) <= latest_next
+            return on_time & next_ok
+
+        start_p, start_d = start_at(p), start_at(d)
+        adjacent = cost[:, slots, slots]
+        cost[~(fits(p, start_p)[:, :, None] & fits(d, start_d)[:, None, :])] = INF
+        # Same slot, exactly: a -> p -> d -> b
+        start_pd = np.maximum(start_p + service_durations(instance, p) + travel_durations(instance, p, d),
+                              take(lower, d))
+        ok_same = (start_p <= take(upper, p)) & (start_pd <= take(upper, d)) & \
+            (start_pd + service_durations(instance, d) + travel_durations(instance, d, b[None, :]) <= latest_next)
+        cost[:, slots, slots] = np.where(ok_same, adjacent, INF)
+    return cost
+
+
+def _insert(stops, pickup, delivery, i, j):
+    stops = list(stops)
+    stops.insert(j, delivery)
+    stops.insert(i, pickup)
+    return stops
+
+
+def single_route_costs(instance, load_capacity=None, time_windows=None):
+    """Cost of serving each pair with its own route, INF where that route is infeasible."""
+    if time_windows is None:
+        time_windows = instance.has_time_windows
+    pickups, deliveries = instance.pairs[:, 0].astype(np.int64), instance.pairs[:, 1].astype(np.int64)
+    dist = instance.distances
+    alone = take(dist, DEPOT, pickups) + take(dist, pickups, deliveries) + take(dist, deliveries, DEPOT)
+    for k in range(len(alone)):
+        if not route_feasible([pickups[k], deliveries[k]], instance, load_capacity, time_windows):
+            alone[k] = INF
+    return alone
+
+
+def insert_pairs(instance, routes, pending, load_capacity=None, num_stops=None, num_vehicles=None, regret=2,
+                 time_windows=None, alone=None, deadline=None):
+    """Inserts the pairs ``pending`` (indices into instance.pairs) into existing routes with regret-k.
+
+    Each step evaluates every pending pair in every slot combination of
+    every route as arrays (only the route changed by the last step is
+    re-evaluated), then inserts the pair with the largest regret: the
+    difference between its best insertion and its k-1 next best routes
+    (regret=1 is cheapest insertion). A new route is one more option as long
+    as num_vehicles allows it. alone may pass precomputed
+    ``single_route_costs``. Once ``time.perf_counter()`` passes deadline no
+    more pairs are inserted, the rest count as unplaced.
+
+    Returns (routes, unplaced): the new routes and the pair indices left out.
+    """
+    if time_windows is None:
+        time_windows = instance.has_time_windows
+    if alone is None:
+        alone = single_route_costs(instance, load_capacity, time_windows)
+    pending = np.asarray(pending, dtype=np.int64)
+    pickups = instance.pairs[pending, 0].astype(np.int64)
+    deliveries = instance.pairs[pending, 1].astype(np.int64)
+    alone = alone[pending]
+    P = len(pending)
+
+    def evaluate(route):
+        costs = insertion_costs(route, pickups, deliveries, instance, load_capacity, num_stops)
+        return costs.reshape(P, -1).min(axis=1) if costs.size else np.full(P, INF)
+
+    routes = [Route(stops, instance, time_windows) for stops in routes]
+    best = np.empty((P, len(routes)), dtype=np.int64)  # best insertion cost per (pair, route)
+    for r, route in enumerate(routes):
+        best[:, r] = evaluate(route)
+    unrouted = np.ones(P, dtype=bool)
+
+    while unrouted.any():
+        if deadline is not None and time.perf_counter() >= deadline:
+            break
+        can_open = num_vehicles is None or len(routes) < num_vehicles
+        options = np.concatenate((best, (alone if can_open else np.full(P, INF))[:, None]), axis=1)
+        options[~unrouted] = INF
+        ranked = np.sort(options, axis=1)
+        first = ranked[:, 0]
+        candidates = unrouted & (first < INF)
+        if not candidates.any():
+            break
+        if regret > 1 and ranked.shape[1] > 1:
+            k = min(regret, ranked.shape[1])
+            gaps = np.minimum(ranked[:, 1:k], INF) - first[:, None]
+            score = gaps.sum(axis=1).astype(np.float64)
+        else:
+            score = -first.astype(np.float64)
+        score[~candidates] = -np.inf
+        # Largest regret first, cheapest insertion on ties
+        order = np.lexsort((first, -score))
+        k = order[0]
+
+        placed = False
+        for r in np.argsort(options[k], kind="stable"):
+            if options[k, r] >= INF:
+                break
+            if r == len(routes):
+                routes.append(Route([pickups[k], deliveries[k]], instance, time_windows))
+                best = np.concatenate((best, np.full((P, 1), INF)), axis=1)
+                placed = True
+            else:
+                route = routes[r]
+                costs = insertion_costs(route, pickups[k:k + 1], deliveries[k:k + 1], instance,
+                                        load_capacity, num_stops)[0]
+                for flat in np.argsort(costs, axis=None, kind="stable"):
+                    i, j = map(int, np.unravel_index(flat, costs.shape))
+                    if costs[i, j] >= INF:
+                        break
+                    if route.can_insert(pickups[k], deliveries[k], i, j, load_capacity, num_stops):
+                        stops = _insert(route.stops, pickups[k], deliveries[k], i, j)
+                        routes[r] = Route(stops, instance, time_windows)
+                        placed = True
+                        break
+                if not placed:
+                    best[k, r] = INF
+                    continue
+            break
+        if not placed:
+            continue
+        unrouted[k] = False
+        best[:, r] = evaluate(routes[r])
+
+    return [route.stops for route in routes], pending[unrouted].tolist()
+
+
+@profiled("construct")
+def construct(instance, load_capacity=None, num_stops=None, num_vehicles=None, regret=2, time_windows=None,
+              deadline=None):
+    """Builds routes from scratch with ``insert_pairs`` (regret=1 is cheapest insertion).
+
+    Returns (routes, unrouted): routes as lists of instance rows without the
+    depot, and the (pickup, delivery) pairs that could not be placed (or
+    were not reached by the deadline, a ``time.perf_counter()`` value).
+    """
+    routes, unplaced = insert_pairs(instance, [], np.arange(instance.num_pairs), load_capacity, num_stops,
+                                    num_vehicles, regret, time_windows, deadline=deadline)
+    return routes, [tuple(pair) for pair in instance.pairs[unplaced].tolist()]
+
+
+def to_vrpy_routes(routes, instance, unrouted=(), singles=True):
+    """Routes as vrpy ``initial_routes``.
+
+    With singles=True every pair also gets its own Source-pickup-delivery-Sink
+    route (what vrpy would start from), otherwise only the unrouted pairs do.
+    Column generation prices better with both: the constructed routes give a
+    good first upper bound, the single routes keep the master problem flexible.
+    """
+    label = instance.node_ids.tolist()
+    out = [["Source"] + [label[row] for row in route] + ["Sink"] for route in routes]
+    alone = instance.pairs.tolist() if singles else unrouted
+    for pickup, delivery in alone:
+        route = ["Source", label[pickup], label[delivery], "Sink"]
+        if route not in out:
+            out.append(route)
+    return out
+
+
+def ortools_initial_assignment(routes, manager, routing, search_parameters=None):
+    """Turns routes into an OR-Tools assignment to pass to SolveFromAssignmentWithParameters.
+
+    The model is closed here (with search_parameters when given), so the
+    dimensions and constraints have to be in place before calling this.
+    """
+    if search_parameters is not None:
+        routing.CloseModelWithParameters(search_parameters)
+    vehicle_routes = [list(map(int, route)) for route in routes]
+    if len(vehicle_routes) > routing.vehicles():
+        raise ValueError(f"{len(vehicle_routes)} routes for {routing.vehicles()} vehicles")
+    vehicle_routes += [[] for _ in range(routing.vehicles() - len(vehicle_routes))]
+    return routing.ReadAssignmentFromRoutes(vehicle_routes, True)
@@ -0,0 +1,163 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from pdptw_construct import insert_pairs, single_route_costs, to_vrpy_routes
+from pdptw_generate import generate_instance
+from pdptw_solve import total_distance
+from pdptw_validate import routes_from_vrpy
+
+
+def _reoptimize(sub_instance, best_routes, load_capacity, num_stops, num_vehicles, time_windows, time_limit, seed):
+    from pdptw_alns import ALNS
+
+    prob = ALNS(sub_instance, load_capacity=load_capacity, num_stops=num_stops, num_vehicles=num_vehicles,
+                time_windows=time_windows, seed=seed)
+    prob.solve(time_limit=time_limit, initial_routes=best_routes)
+    return None if prob.unrouted else prob.best_routes
+
+
+class DispatchService:
+    """Live PDPTW dispatching: requests are inserted on arrival, ALNS improves the plan in the background.
+
+    The instance holds every location the service may see, a request is a
+    pair index into instance.pairs. ``submit`` inserts it into the current
+    routes right away with regret insertion (only the insertion cost arrays
+    of the current routes are evaluated, nothing is re-solved) and answers
+    whether it could be served. While running, a background task hands a
+    snapshot of the plan to ALNS in a worker process for reoptimize_time
+    seconds. The requests that arrived in the meantime are inserted into its
+    result, which replaces the live plan when it is cheaper.
+
+    Use it as ``async with DispatchService(...) as service:``. The worker is
+    a spawned process, so scripts need an ``if __name__ == '__main__':`` guard.
+    """
+
+    def __init__(self, instance, load_capacity=None, num_stops=None, num_vehicles=None, time_windows=None,
+                 reoptimize_time=1.0, seed=0):
+        self.instance = instance
+        self.load_capacity = load_capacity
+        self.num_stops = num_stops
+        self.num_vehicles = num_vehicles
+        self.time_windows = instance.has_time_windows if time_windows is None else time_windows
+        self.reoptimize_time = reoptimize_time
+        self.seed = seed
+        self._alone = single_route_costs(instance, load_capacity, self.time_windows)
+
+        self.routes = []
+        self.active = set()
+        self.rejected = []
+        self.latencies = []
+        self.swaps = 0
+        self._version = 0
+        self._executor = None
+        self._task = None
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    def start(self):
+        self._executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        self._task = asyncio.get_running_loop().create_task(self._reoptimize_loop())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def cost(self):
+        return total_distance(self.instance, self.routes)
+
+    def plan(self):
+        """The current routes as vrpy ``best_routes``."""
+        return dict(enumerate(to_vrpy_routes(self.routes, self.instance, singles=False), start=1))
+
+    def _insert(self, routes, pairs):
+        return insert_pairs(self.instance, routes, pairs, self.load_capacity, self.num_stops, self.num_vehicles,
+                            regret=2, time_windows=self.time_windows, alone=self._alone)
+
+    async def submit(self, pair):
+        """Inserts request ``pair`` into the live plan. Returns False if no vehicle can take it.
+
+        A pair already in the plan is left as it is (and answers True). The
+        insertion runs on the event loop without yielding, which is quick
+        for the plans of a dispatching day but blocks other tasks for as long
+        as it takes on plans of several thousand stops.
+        """
+        if int(pair) in self.active:
+            return True
+        start_time = time.perf_counter()
+        routes, unplaced = self._insert(self.routes, [pair])
+        accepted = not unplaced
+        if accepted:
+            self.routes = routes
+            self.active.add(int(pair))
+            self._version += 1
+        else:
+            self.rejected.append(int(pair))
+        self.latencies.append(time.perf_counter() - start_time)
+        return accepted
+
+    async def _reoptimize_loop(self):
+        loop = asyncio.get_running_loop()
+        optimized = 0
+        while True:
+            if self._version == optimized or not self.active:
+                await asyncio.sleep(0.05)
+                continue
+            version = self._version
+            snapshot = sorted(self.active)
+            sub_instance = self.instance.subset(self.instance.pairs[snapshot])
+            best_routes = self.plan()
+            result = await loop.run_in_executor(
+                self._executor, _reoptimize, sub_instance, best_routes, self.load_capacity, self.num_stops,
+                self.num_vehicles, self.time_windows, self.reoptimize_time, self.seed + version)
+            optimized = version
+            if result is None:
+                continue
+            routes = routes_from_vrpy(result, self.instance)
+            # Requests that came in while ALNS was running
+            arrived = sorted(self.active.difference(snapshot))
+            if arrived:
+                routes, unplaced = self._insert(routes, arrived)
+                if unplaced:
+                    continue
+            if total_distance(self.instance, routes) < self.cost():
+                self.routes = routes
+                self.swaps += 1
+
+
+async def simulated_feed(num_pairs, rate=10.0, seed=None):
+    """Yields the pair indices 0..num_pairs-1 in random order, as a Poisson stream of ``rate`` requests per second."""
+    rng = np.random.default_rng(seed)
+    for pair in rng.permutation(num_pairs).tolist():
+        await asyncio.sleep(rng.exponential(1 / rate))
+        yield pair
+
+
+async def simulate(instance, rate=10.0, settle=2.0, seed=0, **options):
+    """Feeds every pair of the instance to a DispatchService and lets it re-optimize for settle seconds."""
+    async with DispatchService(instance, seed=seed, **options) as service:
+        async for pair in simulated_feed(instance.num_pairs, rate, seed):
+            await service.submit(pair)
+        await asyncio.sleep(settle)
+    return service
+
+
+if __name__ == "__main__":
+    instance = generate_instance(100, "clustered", seed=0)
+    service = asyncio.run(simulate(instance, rate=20.0, load_capacity=10, num_stops=8, reoptimize_time=1.0))
+    latencies = np.array(service.latencies) * 1000
+    print(f"Served {len(service.active)} requests, rejected {len(service.rejected)}")
+    print(f"Insertion latency: median {np.median(latencies):.2f} ms, p99 {np.percentile(latencies, 99):.2f} ms")
+    print(f"Plan swaps from re-optimization: {service.swaps}, final distance {service.cost()}")
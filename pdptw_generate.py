@@ -0,0 +1,164 @@
+import numpy as np
+
+from pdptw_instance import DEPOT, PDPTWInstance
+from pdptw_matrix import coordinate_matrices
+from pdptw_profile import profiled
+
+# Li & Lim style geometric families: customers placed uniformly at random (lr),
+# in clusters (lc), or half and half (lrc). Pickups are nodes 1, 3, 5, ... and the
+# delivery of pickup i is node i + 1.
+FAMILIES = ("random", "clustered", "mixed")
+
+
+def as_generator(seed=None):
+    """Accepts a seed, a SeedSequence or an existing numpy Generator."""
+    if isinstance(seed, np.random.Generator):
+        return seed
+    return np.random.default_rng(seed)
+
+
+def metric_closure(distances):
+    """Shortest-path distances (Floyd-Warshall), so the matrix obeys the triangle inequality.
+
+    Works on a single (n, n) matrix or a (count, n, n) stack; every relaxation
+    step is one array operation over all instances.
+    """
+    out = np.array(distances, dtype=np.int64)
+    n = out.shape[-1]
+    for k in range(n):
+        np.minimum(out, out[..., :, k:k + 1] + out[..., k:k + 1, :], out=out)
+    return out.astype(np.int32)
+
+
+def random_matrix(rng, n, low=10, high=1000, symmetric=False, metric=False, count=None):
+    """Random integer distances in [low, high] with a zero diagonal.
+
+    symmetric=True mirrors the upper triangle, metric=True applies metric_closure.
+    count=None returns one (n, n) matrix, otherwise a (count, n, n) stack.
+    """
+    shape = (n, n) if count is None else (count, n, n)
+    out = rng.integers(low, high + 1, size=shape, dtype=np.int64)
+    if symmetric:
+        out = np.triu(out, 1)
+        out = out + np.swapaxes(out, -1, -2)
+    else:
+        out[..., np.arange(n), np.arange(n)] = 0
+    if metric:
+        return metric_closure(out)
+    return out.astype(np.int32)
+
+
+def coordinates(rng, count, n, family="random", size=100, num_clusters=8, spread=None):
+    """(count, n, 2) points on a size x size grid, the depot sits in the middle."""
+    if family not in FAMILIES:
+        raise ValueError(f"Unknown family {family!r}, expected one of {FAMILIES}")
+    points = rng.uniform(0, size, size=(count, n, 2))
+    if family != "random":
+        spread = size / 20 if spread is None else spread
+        centres = rng.uniform(0, size, size=(count, num_clusters, 2))
+        member = rng.integers(0, num_clusters, size=(count, n))
+        clustered = np.take_along_axis(centres, member[..., None], axis=1)
+        clustered = np.clip(clustered + rng.normal(0, spread, size=(count, n, 2)), 0, size)
+        if family == "clustered":
+            points = clustered
+        else:
+            # One of every two requests is clustered, both ends of a pair together
+            request = np.arange(n) // 2 + np.arange(n) % 2
+            points = np.where((request % 2 == 0)[None, :, None], clustered, points)
+    points[:, DEPOT] = size / 2
+    return points
+
+
+def euclidean_matrix(points):
+    """Euclidean distances rounded up to int32.
+
+    Rounding up keeps the triangle inequality: ceil(a) + ceil(b) >= a + b >= c
+    and the left side is an integer, so it is >= ceil(c) too.
+    """
+    diff = points[..., :, None, :] - points[..., None, :, :]
+    return np.ceil(np.sqrt((diff ** 2).sum(axis=-1)) - 1e-9).astype(np.int32)
+
+
+def paired_windows(rng, num_pairs, start=(0, 10), delay=(1, 5), width=(5, 10), min_delay=0, count=None):
+    """Time windows for nodes 1..2P where every delivery opens after its pickup.
+
+    The pickup window opens in [start[0], start[1]] and stays open for
+    width[0]..width[1]. The delivery window opens delay[0]..delay[1] (but at
+    least min_delay) after the pickup window, and has its own width. Bounds may
+    be arrays broadcast over the pairs. Returns (lower, upper) of shape (2P,),
+    or (count, 2P) with count.
+    """
+    shape = (num_pairs,) if count is None else (count, num_pairs)
+    pickup_lower = rng.integers(start[0], np.asarray(start[1]) + 1, size=shape)
+    delivery_lower = pickup_lower + np.maximum(rng.integers(delay[0], delay[1] + 1, size=shape), min_delay)
+    lower = np.empty(shape[:-1] + (2 * num_pairs,), dtype=np.int64)
+    upper = np.empty_like(lower)
+    lower[..., 0::2] = pickup_lower
+    lower[..., 1::2] = delivery_lower
+    upper[..., 0::2] = pickup_lower + rng.integers(width[0], width[1] + 1, size=shape)
+    upper[..., 1::2] = delivery_lower + rng.integers(width[0], width[1] + 1, size=shape)
+    return lower, upper
+
+
+@profiled("instance generation")
+def generate_instances(count, num_pairs, family="random", seed=None, size=100, horizon=1000,
+                       window_width=(30, 90), max_demand=5, matrix_cache_dir=None):
+    """Generates ``count`` Li & Lim style PDPTW instances in one batch.
+
+    Travel times equal the (rounded up, so metric) Euclidean distances. Each
+    request has a pickup quantity in 1..max_demand and the matching negative
+    delivery. Windows are built so that Source -> pickup -> delivery -> Sink
+    on its own is feasible within [0, horizon]: the pickup window opens once
+    the pickup is reachable from the depot, and the delivery window opens once
+    the delivery is reachable from the pickup's window.
+
+    With matrix_cache_dir (e.g. ``pdptw_matrix.DEFAULT_CACHE_DIR``) each
+    distance matrix is built in chunks by ``pdptw_matrix.coordinate_matrices``,
+    cached there under a hash of the coordinates and memory-mapped, so the
+    same seed at a large size is not recomputed on the next run.
+    """
+    rng = as_generator(seed)
+    n = 2 * num_pairs + 1
+    pickups = np.arange(1, n, 2)
+    deliveries = pickups + 1
+
+    points = coordinates(rng, count, n, family, size=size)
+    if matrix_cache_dir is None:
+        distances = euclidean_matrix(points)
+    else:
+        distances = [coordinate_matrices(p, dtype=np.int32, cache_dir=matrix_cache_dir)[0] for p in points]
+    quantities = rng.integers(1, max_demand + 1, size=(count, num_pairs))
+
+    def gather(rows, columns):
+        # (count, ...) entries of every instance's matrix, as int64
+        return np.stack([d[rows, columns] for d in distances]).astype(np.int64)
+
+    to_pickup = gather(DEPOT, pickups)
+    pickup_to_delivery = gather(pickups, deliveries)
+    to_depot = gather(deliveries, DEPOT)
+    # Latest pickup opening that still leaves time to deliver and return
+    latest = horizon - window_width[1] - pickup_to_delivery - to_depot
+    if (latest < to_pickup).any():
+        raise ValueError(f"horizon={horizon} is too short for a {size}x{size} grid")
+    customer_lower, customer_upper = paired_windows(
+        rng, num_pairs, start=(to_pickup, latest), delay=(0, window_width[0]), width=window_width,
+        min_delay=pickup_to_delivery, count=count)
+
+    lower = np.zeros((count, n), dtype=np.int64)
+    upper = np.full((count, n), horizon, dtype=np.int64)
+    lower[:, 1:] = customer_lower
+    upper[:, 1:] = np.minimum(customer_upper, horizon - gather(slice(1, None), DEPOT))
+    demands = np.zeros((count, n), dtype=np.int32)
+    demands[:, pickups] = quantities
+    demands[:, deliveries] = -quantities
+    pairs = np.stack((pickups, deliveries), axis=1)
+
+    return [
+        PDPTWInstance(distances[k], distances[k], demands[k], lower[k], upper[k], pairs)
+        for k in range(count)
+    ]
+
+
+def generate_instance(num_pairs, family="random", seed=None, **kwargs):
+    """Single-instance shortcut for ``generate_instances``."""
+    return generate_instances(1, num_pairs, family=family, seed=seed, **kwargs)[0]
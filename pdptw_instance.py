@@ -0,0 +1,292 @@
+import numpy as np
+import networkx as nx
+
+from pdptw_profile import profiled
+
+# Node 0 is always the depot. vrpy sees it split into "Source" (outgoing arcs)
+# and "Sink" (incoming arcs, cost taken from column 0), OR-Tools sees it as the
+# single start/end depot.
+DEPOT = 0
+
+
+def _as_int32(values, n, default=0):
+    """Turns a node-keyed dict or a sequence into a contiguous int32 vector."""
+    if values is None:
+        return None
+    if isinstance(values, dict):
+        out = np.full(n, default, dtype=np.int32)
+        if values:
+            keys = np.fromiter(values.keys(), dtype=np.int64, count=len(values))
+            out[keys] = np.fromiter(values.values(), dtype=np.int64, count=len(values))
+        return out
+    out = np.ascontiguousarray(values, dtype=np.int32)
+    if out.shape != (n,):
+        raise ValueError(f"Expected {n} node values, got shape {out.shape}")
+    return out
+
+
+def _as_matrix(values, n=None):
+    """Turns a list of lists (or array) into a contiguous square int32 matrix."""
+    if values is None:
+        return None
+    out = np.ascontiguousarray(values, dtype=np.int32)
+    if out.ndim != 2 or out.shape[0] != out.shape[1]:
+        raise ValueError(f"Expected a square matrix, got shape {out.shape}")
+    if n is not None and out.shape[0] != n:
+        raise ValueError(f"Expected a {n}x{n} matrix, got shape {out.shape}")
+    return out
+
+
+class PDPTWInstance:
+    """Pickup and delivery instance stored as contiguous int32 arrays.
+
+    distances, travel_times: (n, n) matrices, node 0 is the depot
+    demands, lower, upper:   (n,) vectors, depot entries are ignored by the solvers
+    service_times:           (n,) vector, time spent at a node before leaving it
+    pairs:                   (P, 2) array of (pickup, delivery) nodes
+    coordinates:             (n, 2) float64 positions, only when the source has them
+
+    ``pairs`` may also be given as the ``{(pickup, delivery): quantity}`` dict the
+    scripts use, in which case the pickup demand is set to +quantity and the
+    delivery demand to -quantity.
+
+    node_ids maps each row to the node label used in vrpy graphs and routes. It is
+    the identity unless the instance was cut out of a larger one with ``subset``.
+    """
+
+    def __init__(self, distances, travel_times=None, demands=None, lower=None, upper=None, pairs=None,
+                 node_ids=None, service_times=None, coordinates=None):
+        self.distances = _as_matrix(distances)
+        n = self.distances.shape[0]
+        self.travel_times = _as_matrix(travel_times, n)
+        self.demands = _as_int32(demands, n)
+        if self.demands is None:
+            self.demands = np.zeros(n, dtype=np.int32)
+        self.lower = _as_int32(lower, n)
+        self.upper = _as_int32(upper, n)
+        if (self.lower is None) != (self.upper is None):
+            raise ValueError("lower and upper time windows must be given together")
+
+        if pairs is None:
+            pairs = np.empty((0, 2), dtype=np.int32)
+        elif isinstance(pairs, dict):
+            quantities = np.fromiter(pairs.values(), dtype=np.int32, count=len(pairs))
+            pairs = np.array(list(pairs.keys()), dtype=np.int32).reshape(-1, 2)
+            self.demands = self.demands.copy()
+            self.demands[pairs[:, 0]] = quantities
+            self.demands[pairs[:, 1]] = -quantities
+        self.pairs = np.ascontiguousarray(pairs, dtype=np.int32).reshape(-1, 2)
+        if self.pairs.size and (self.pairs.min() <= DEPOT or self.pairs.max() >= n):
+            raise ValueError("Pickup/delivery nodes must be customers in 1..n-1")
+        self.node_ids = np.arange(n, dtype=np.int32) if node_ids is None else _as_int32(node_ids, n)
+        self.service_times = _as_int32(service_times, n)
+        self.coordinates = None if coordinates is None else np.asarray(coordinates, dtype=np.float64).reshape(n, 2)
+
+    @classmethod
+    def from_source_sink(cls, distances, travel_times=None, **kwargs):
+        """Builds an instance from the scripts' matrices with a trailing Sink row.
+
+        The hard-coded and random matrices in this repo have the Source as row 0
+        and a separate Sink as the last row/column. The Sink column becomes the
+        depot column, so node ids 1..n-2 are unchanged.
+        """
+        def collapse(matrix):
+            if matrix is None:
+                return None
+            matrix = np.asarray(matrix)
+            out = np.array(matrix[:-1, :-1], dtype=np.int32)
+            out[:, DEPOT] = matrix[:-1, -1]
+            out[DEPOT, DEPOT] = 0
+            return out
+
+        return cls(collapse(distances), collapse(travel_times), **kwargs)
+
+    def subset(self, pairs):
+        """Cuts out the sub-instance serving only ``pairs`` (rows of ``self.pairs``).
+
+        Every matrix is sliced with a single fancy-indexing operation over
+        [depot, pickup_1, delivery_1, ...]. The sub-instance keeps the original
+        node ids, so its vrpy graph and routes use the same labels as the full one.
+        """
+        pairs = np.asarray(pairs, dtype=np.int32).reshape(-1, 2)
+        rows = np.concatenate(([DEPOT], pairs.ravel()))
+        grid = np.ix_(rows, rows)
+
+        def take(vector):
+            return None if vector is None else vector[rows]
+
+        return PDPTWInstance(
+            self.distances[grid],
+            None if self.travel_times is None else self.travel_times[grid],
+            demands=take(self.demands),
+            lower=take(self.lower),
+            upper=take(self.upper),
+            pairs=np.arange(1, len(rows), dtype=np.int32).reshape(-1, 2),
+            node_ids=take(self.node_ids),
+            service_times=take(self.service_times),
+            coordinates=take(self.coordinates),
+        )
+
+    @property
+    def num_nodes(self):
+        return self.distances.shape[0]
+
+    @property
+    def num_pairs(self):
+        return self.pairs.shape[0]
+
+    @property
+    def has_time_windows(self):
+        return self.lower is not None
+
+    @property
+    def nbytes(self):
+        arrays = (self.distances, self.travel_times, self.demands, self.lower, self.upper, self.pairs, self.node_ids,
+                  self.service_times, self.coordinates)
+        return sum(a.nbytes for a in arrays if a is not None)
+
+    @profiled("vrpy graph")
+    def to_vrpy_graph(self, arcs=None):
+        """Builds the vrpy DiGraph (Source/Sink relabelled) in one pass over the arrays.
+
+        arcs may be a boolean (n, n) mask of the customer arcs to create (see
+        ``pdptw_prune.candidate_arc_mask``), instead of the complete digraph.
+        Source and Sink arcs are always created, vrpy needs a round trip to
+        every node.
+        """
+        n = self.num_nodes
+        customers = range(1, n)
+        label = ["Source"] + self.node_ids[1:].tolist()
+
+        G = nx.DiGraph()
+        G.add_node("Source")
+        G.add_nodes_from(label[1:])
+        G.add_node("Sink")
+
+        # .tolist() hands out Python ints row by row, pulp does not accept numpy scalars
+        cost_rows = self.distances.tolist()
+        time_rows = self.travel_times.tolist() if self.travel_times is not None else None
+        for i in range(n):
+            costs = cost_rows[i]
+            tail = label[i]
+            if arcs is None or i == DEPOT:
+                heads = [j for j in customers if j != i]
+            else:
+                heads = (np.flatnonzero(arcs[i, 1:]) + 1).tolist()
+            if time_rows is None:
+                G.add_edges_from((tail, label[j], {"cost": costs[j]}) for j in heads)
+            else:
+                times = time_rows[i]
+                G.add_edges_from((tail, label[j], {"cost": costs[j], "time": times[j]}) for j in heads)
+            if i != DEPOT:
+                edge = {"cost": costs[DEPOT]}
+                if time_rows is not None:
+                    edge["time"] = time_rows[i][DEPOT]
+                G.add_edge(tail, "Sink", **edge)
+
+        demands = self.demands.tolist()
+        for j in customers:
+            G.nodes[label[j]]["demand"] = demands[j]
+        if self.has_time_windows:
+            lower, upper = self.lower.tolist(), self.upper.tolist()
+            for j in customers:
+                G.nodes[label[j]]["lower"] = lower[j]
+                G.nodes[label[j]]["upper"] = upper[j]
+            for depot in ("Source", "Sink"):
+                G.nodes[depot]["lower"] = lower[DEPOT]
+                G.nodes[depot]["upper"] = upper[DEPOT]
+        if self.service_times is not None:
+            service_times = self.service_times.tolist()
+            for j in customers:
+                G.nodes[label[j]]["service_time"] = service_times[j]
+        for pickup, delivery in self.pairs.tolist():
+            G.nodes[label[pickup]]["request"] = label[delivery]
+        return G
+
+    @profiled("ortools/model")
+    def to_ortools(self, num_vehicles, vehicle_capacity, evaluators="matrix"):
+        """Builds the OR-Tools RoutingIndexManager and RoutingModel for this instance.
+
+        Arc cost is the distance matrix, loads go into a "Capacity" dimension and,
+        when the instance has time windows, travel times into a "Time" dimension.
+
+        evaluators="matrix" registers the arrays as native transit matrices/vectors,
+        so the search never calls back into Python. evaluators="callback" registers
+        Python closures over the arrays instead (kept for benchmarking).
+        """
+        from ortools.constraint_solver import pywrapcp
+
+        if evaluators not in ("matrix", "callback"):
+            raise ValueError(f"Unknown evaluators {evaluators!r}, expected 'matrix' or 'callback'")
+
+        manager = pywrapcp.RoutingIndexManager(self.num_nodes, num_vehicles, DEPOT)
+        routing = pywrapcp.RoutingModel(manager)
+
+        travel_times = None
+        if self.has_time_windows:
+            travel_times = self.travel_times if self.travel_times is not None else np.zeros_like(self.distances)
+            if self.service_times is not None:
+                # The Time transit of i -> j covers serving i and then driving to j
+                travel_times = travel_times + self.service_times[:, None]
+
+        if evaluators == "matrix":
+            transit_callback_index = routing.RegisterTransitMatrix(self.distances.tolist())
+            demand_callback_index = routing.RegisterUnaryTransitVector(self.demands.tolist())
+            if travel_times is not None:
+                time_callback_index = routing.RegisterTransitMatrix(travel_times.tolist())
+        else:
+            transit_callback_index, demand_callback_index, time_callback_index = \
+                self._register_callbacks(manager, routing, travel_times)
+
+        routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
+        routing.AddDimensionWithVehicleCapacity(
+            demand_callback_index,
+            0,  # null capacity slack
+            [vehicle_capacity] * num_vehicles,
+            True,  # start cumul to zero
+            "Capacity")
+
+        if travel_times is not None:
+            self._add_time_dimension(manager, routing, time_callback_index)
+
+        self._add_pickups_deliveries(manager, routing)
+        return manager, routing
+
+    def _register_callbacks(self, manager, routing, travel_times):
+        # The callbacks index the int32 arrays directly, no list-of-lists copy
+        distances = self.distances
+        demands = self.demands
+
+        def distance_callback(from_index, to_index):
+            return int(distances[manager.IndexToNode(from_index), manager.IndexToNode(to_index)])
+
+        def demand_callback(from_index):
+            return int(demands[manager.IndexToNode(from_index)])
+
+        def time_callback(from_index, to_index):
+            return int(travel_times[manager.IndexToNode(from_index), manager.IndexToNode(to_index)])
+
+        time_callback_index = None
+        if travel_times is not None:
+            time_callback_index = routing.RegisterTransitCallback(time_callback)
+        return (routing.RegisterTransitCallback(distance_callback),
+                routing.RegisterUnaryTransitCallback(demand_callback),
+                time_callback_index)
+
+    def _add_time_dimension(self, manager, routing, time_callback_index):
+        horizon = int(max(self.upper.max(), 1))
+        routing.AddDimension(time_callback_index, horizon, horizon, False, "Time")
+        time_dimension = routing.GetDimensionOrDie("Time")
+        for node in range(1, self.num_nodes):
+            time_dimension.CumulVar(manager.NodeToIndex(node)).SetRange(int(self.lower[node]), int(self.upper[node]))
+
+    def _add_pickups_deliveries(self, manager, routing):
+        solver = routing.solver()
+        time_dimension = routing.GetDimensionOrDie("Time") if self.has_time_windows else None
+        for pickup, delivery in self.pairs.tolist():
+            pickup_index = manager.NodeToIndex(pickup)
+            delivery_index = manager.NodeToIndex(delivery)
+            routing.AddPickupAndDelivery(pickup_index, delivery_index)
+            solver.Add(routing.VehicleVar(pickup_index) == routing.VehicleVar(delivery_index))
+            if time_dimension is not None:
+                solver.Add(time_dimension.CumulVar(pickup_index) <= time_dimension.CumulVar(delivery_index))
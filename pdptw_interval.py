@@ -0,0 +1,69 @@
+import numpy as np
+
+
+class PairIntervalIndex:
+    """Static index over pickup/delivery pairs keyed by their time windows.
+
+    A pair overlaps a window [start, end] when both its pickup and its delivery
+    windows do, i.e. when max(lowers) <= end and min(uppers) >= start. Pairs are
+    sorted by max(lowers) once, and a sparse table over min(uppers) answers
+    range-argmax in O(1), so each query costs O(log n + k) for k reported pairs.
+    """
+
+    def __init__(self, pairs, lower, upper):
+        pairs = np.asarray(pairs, dtype=np.int32).reshape(-1, 2)
+        lower = np.asarray(lower)
+        upper = np.asarray(upper)
+        start = np.maximum(lower[pairs[:, 0]], lower[pairs[:, 1]])
+        end = np.minimum(upper[pairs[:, 0]], upper[pairs[:, 1]])
+
+        order = np.argsort(start, kind="stable")
+        self.pairs = pairs[order]
+        self._start = start[order]
+        self._end = end[order]
+
+        # _argmax[j][i] is the position of the largest end in [i, i + 2**j)
+        self._argmax = [np.arange(len(order))]
+        width = 1
+        while 2 * width <= len(order):
+            prev = self._argmax[-1]
+            left, right = prev[:-width], prev[width:]
+            self._argmax.append(np.where(self._end[left] >= self._end[right], left, right))
+            width *= 2
+        # Queries walk the tables one element at a time, plain lists are faster there
+        self._argmax = [level.tolist() for level in self._argmax]
+        self._end = self._end.tolist()
+
+    @classmethod
+    def from_instance(cls, instance):
+        return cls(instance.pairs, instance.lower, instance.upper)
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def _range_argmax(self, lo, hi):
+        level = (hi - lo).bit_length() - 1
+        table = self._argmax[level]
+        left, right = table[lo], table[hi - (1 << level)]
+        return left if self._end[left] >= self._end[right] else right
+
+    def query_positions(self, start, end):
+        """Positions (into ``self.pairs``) of the pairs overlapping [start, end]."""
+        hi = int(np.searchsorted(self._start, end, side="right"))
+        found = []
+        stack = [(0, hi)] if hi else []
+        while stack:
+            lo, hi = stack.pop()
+            best = self._range_argmax(lo, hi)
+            if self._end[best] < start:
+                continue
+            found.append(best)
+            if lo < best:
+                stack.append((lo, best))
+            if best + 1 < hi:
+                stack.append((best + 1, hi))
+        return found
+
+    def query(self, start, end):
+        """(pickup, delivery) pairs whose windows both overlap [start, end]."""
+        return [tuple(pair) for pair in self.pairs[self.query_positions(start, end)].tolist()]
@@ -0,0 +1,239 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from pdptw_instance import PDPTWInstance
+from pdptw_matrix import distance_matrix
+
+# Parsed instances are stored here as .npy files, one directory per source file
+DEFAULT_CACHE_DIR = ".instance_cache"
+CACHE_VERSION = 1
+_MATRICES = ("distances", "travel_times")
+_VECTORS = ("demands", "lower", "upper", "pairs", "node_ids", "service_times", "coordinates")
+
+
+def _coordinate_matrix(coordinates, scale):
+    # Rounded up after scaling, so the matrix keeps the triangle inequality
+    return distance_matrix(coordinates, scale=scale, dtype=np.int32)
+
+
+def _check_ids(path, ids, what):
+    # ids sorted; rows are matched to the matrices by position
+    if not np.array_equal(ids, np.arange(len(ids))):
+        raise ValueError(f"{path}: {what} ids must be 0..{len(ids) - 1}, each once")
+
+
+def _checked_pairs(path, pickups, deliveries, n):
+    # Every delivery must be another existing node, delivered for one pickup only
+    if not np.array_equal(deliveries, np.round(deliveries)):
+        raise ValueError(f"{path}: delivery references must be node ids")
+    deliveries = deliveries.astype(np.int64)
+    missing = pickups[(deliveries < 1) | (deliveries >= n)]
+    if len(missing):
+        raise ValueError(f"{path}: pickups {missing.tolist()} name deliveries outside 1..{n - 1}")
+    if len(np.unique(deliveries)) != len(deliveries) or np.isin(deliveries, pickups).any():
+        raise ValueError(f"{path}: a delivery is shared by several pickups or is itself a pickup")
+    return np.stack((pickups, deliveries), axis=1)
+
+
+def _scaled(values, scale):
+    return np.rint(np.asarray(values, dtype=np.float64) * scale).astype(np.int64)
+
+
+def read_li_lim(path, scale=1):
+    """Reads a Li & Lim PDPTW file.
+
+    First line "vehicles capacity speed", then one line per task:
+    "id x y demand ready due service pickup delivery", task 0 is the depot.
+    A pickup has pickup=0 and names its delivery, a delivery names its pickup.
+    Distances and travel times are the Euclidean distances times ``scale``
+    (rounded up), windows and service times are scaled the same way.
+    Returns (instance, fleet) where fleet holds num_vehicles and capacity.
+    """
+    with open(path) as f:
+        header = f.readline().split()
+    rows = np.loadtxt(path, skiprows=1, ndmin=2)
+    rows = rows[np.argsort(rows[:, 0], kind="stable")]
+    _check_ids(path, rows[:, 0], "task")
+
+    coordinates = rows[:, 1:3]
+    distances = _coordinate_matrix(coordinates, scale)
+    is_pickup = (rows[:, 7] == 0) & (rows[:, 8] > 0)
+    pickups = np.flatnonzero(is_pickup)
+    pairs = _checked_pairs(path, pickups, rows[pickups, 8], len(rows))
+
+    instance = PDPTWInstance(
+        distances, distances, demands=rows[:, 3], lower=_scaled(rows[:, 4], scale), upper=_scaled(rows[:, 5], scale),
+        pairs=pairs, service_times=_scaled(rows[:, 6], scale), coordinates=coordinates)
+    fleet = {"num_vehicles": int(header[0]), "capacity": int(header[1])}
+    return instance, fleet
+
+
+def read_solomon(path, scale=1):
+    """Reads a Solomon VRPTW file (NAME, VEHICLE NUMBER/CAPACITY, then the CUSTOMER table).
+
+    Customer 0 is the depot. Same scaling as ``read_li_lim``, there are no pairs.
+    """
+    fleet = {}
+    customers = []
+    with open(path) as f:
+        lines = [line.split() for line in f]
+    for i, fields in enumerate(lines):
+        if fields[:2] == ["NUMBER", "CAPACITY"]:
+            number, capacity = lines[i + 1][:2]
+            fleet = {"num_vehicles": int(number), "capacity": int(capacity)}
+        elif len(fields) == 7:
+            try:
+                customers.append([float(value) for value in fields])
+            except ValueError:
+                continue  # column titles
+    if not customers:
+        raise ValueError(f"{path}: no customer table found")
+    rows = np.array(customers)
+    rows = rows[np.argsort(rows[:, 0], kind="stable")]
+    _check_ids(path, rows[:, 0], "customer")
+
+    coordinates = rows[:, 1:3]
+    distances = _coordinate_matrix(coordinates, scale)
+    instance = PDPTWInstance(
+        distances, distances, demands=rows[:, 3], lower=_scaled(rows[:, 4], scale), upper=_scaled(rows[:, 5], scale),
+        service_times=_scaled(rows[:, 6], scale), coordinates=coordinates)
+    return instance, fleet
+
+
+def read_csv(nodes_path, distances_path=None, travel_times_path=None, scale=1):
+    """Reads our CSV exports.
+
+    nodes_path has a header row and one row per node, the depot first. Columns:
+    node, demand, and optionally x, y, lower, upper, service_time and delivery
+    (the delivery node of a pickup, 0 or empty otherwise). distances_path and
+    travel_times_path are plain n x n comma separated matrices. Without a
+    distance matrix the distances are Euclidean over x, y times ``scale``.
+    Node ids must be 0..n-1 and each delivery an existing node of one
+    pickup, else ValueError, as for ``read_li_lim``.
+    """
+    table = np.genfromtxt(nodes_path, delimiter=",", names=True, dtype=np.float64, filling_values=0)
+    table = np.atleast_1d(table)
+    columns = table.dtype.names
+    table = table[np.argsort(table["node"], kind="stable")]
+    _check_ids(nodes_path, table["node"], "node")
+    n = len(table)
+
+    coordinates = None
+    if "x" in columns and "y" in columns:
+        coordinates = np.stack((table["x"], table["y"]), axis=1)
+    if distances_path is not None:
+        distances = np.loadtxt(distances_path, delimiter=",", dtype=np.int64, ndmin=2)
+        if distances.shape != (n, n):
+            raise ValueError(f"{distances_path}: expected a {n}x{n} matrix for {n} nodes, got {distances.shape}")
+    elif coordinates is not None:
+        distances = _coordinate_matrix(coordinates, scale)
+    else:
+        raise ValueError(f"{nodes_path}: needs x, y columns or a distance matrix")
+    travel_times = None
+    if travel_times_path is not None:
+        travel_times = np.loadtxt(travel_times_path, delimiter=",", dtype=np.int64, ndmin=2)
+        if travel_times.shape != (n, n):
+            raise ValueError(
+                f"{travel_times_path}: expected a {n}x{n} matrix for {n} nodes, got {travel_times.shape}")
+
+    def column(name):
+        return table[name].astype(np.int64) if name in columns else None
+
+    pairs = None
+    if "delivery" in columns:
+        pickups = np.flatnonzero(table["delivery"] > 0)
+        pairs = _checked_pairs(nodes_path, pickups, table["delivery"][pickups], n)
+    instance = PDPTWInstance(
+        distances, travel_times, demands=column("demand"), lower=column("lower"), upper=column("upper"),
+        pairs=pairs, service_times=column("service_time"), coordinates=coordinates)
+    return instance, {}
+
+
+def detect_format(path):
+    """'csv' by extension, otherwise 'li_lim' when the first line is three numbers, else 'solomon'."""
+    if path.lower().endswith(".csv"):
+        return "csv"
+    with open(path) as f:
+        fields = f.readline().split()
+    try:
+        [float(value) for value in fields]
+    except ValueError:
+        return "solomon"
+    return "li_lim" if len(fields) == 3 else "solomon"
+
+
+READERS = {"li_lim": read_li_lim, "solomon": read_solomon, "csv": read_csv}
+
+
+def save_cache(instance, fleet, directory):
+    """Writes every array of the instance as .npy into ``directory`` (replaced atomically)."""
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=parent)
+    stored = []
+    for name in _MATRICES + _VECTORS:
+        array = getattr(instance, name)
+        if array is not None:
+            np.save(os.path.join(staging, f"{name}.npy"), np.ascontiguousarray(array))
+            stored.append(name)
+    with open(os.path.join(staging, "meta.json"), "w") as f:
+        json.dump({"version": CACHE_VERSION, "arrays": stored, "fleet": fleet}, f)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(staging, directory)
+
+
+def load_cache(directory, mmap_mode="r"):
+    """Reads an instance written by ``save_cache``, the matrices stay memory-mapped.
+
+    Returns (instance, fleet), or None when the directory holds no valid cache.
+    """
+    try:
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("version") != CACHE_VERSION:
+        return None
+    arrays = {}
+    for name in meta["arrays"]:
+        arrays[name] = np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode if name in _MATRICES else None)
+    distances = arrays.pop("distances")
+    travel_times = arrays.pop("travel_times", None)
+    return PDPTWInstance(distances, travel_times, **arrays), meta["fleet"]
+
+
+def _cache_key(paths, fmt, options):
+    digest = hashlib.sha1(f"{CACHE_VERSION} {fmt} {sorted(options.items())}".encode())
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{os.path.abspath(path)} {stat.st_size} {stat.st_mtime_ns}".encode())
+    return digest.hexdigest()[:16]
+
+
+def load_instance(path, fmt=None, cache_dir=DEFAULT_CACHE_DIR, **options):
+    """Loads an instance file, going through the binary cache when cache_dir is set.
+
+    The cache entry is keyed by the path, size and modification time of every
+    input file plus the reader options, so editing a file re-parses it. Cached
+    distance and travel time matrices are memory-mapped instead of read.
+    Returns (instance, fleet).
+    """
+    fmt = fmt or detect_format(path)
+    if fmt not in READERS:
+        raise ValueError(f"Unknown format {fmt!r}, expected one of {sorted(READERS)}")
+    if cache_dir is None:
+        return READERS[fmt](path, **options)
+
+    paths = [path] + [value for key, value in sorted(options.items()) if key.endswith("_path") and value]
+    directory = os.path.join(cache_dir, _cache_key(paths, fmt, options))
+    cached = load_cache(directory)
+    if cached is not None:
+        return cached
+    instance, fleet = READERS[fmt](path, **options)
+    save_cache(instance, fleet, directory)
+    return load_cache(directory)
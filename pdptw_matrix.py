@@ -0,0 +1,171 @@
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+from pdptw_profile import profiled
+
+# Matrices built from coordinates are stored here as .npy files named by their key
+DEFAULT_CACHE_DIR = ".matrix_cache"
+EARTH_RADIUS_KM = 6371.0088
+# Elements of one (chunk_rows, n) float64 block (64 MB); a chunk holds 3 such
+# blocks at once for "euclidean" and 5 for "haversine"
+CHUNK_ELEMENTS = 2 ** 23
+
+METRICS = ("euclidean", "haversine")
+
+
+def _chunks(n, chunk_rows, columns):
+    chunk_rows = chunk_rows or max(1, CHUNK_ELEMENTS // max(columns, 1))
+    for start in range(0, n, chunk_rows):
+        yield slice(start, min(start + chunk_rows, n))
+
+
+def _store(out, rows, values):
+    # Integer outputs are rounded up, which keeps the triangle inequality (see euclidean_matrix)
+    if np.issubdtype(out.dtype, np.integer):
+        values = np.ceil(values - 1e-9)
+    out[rows] = values
+
+
+def _euclidean_rows(points, rows):
+    dx = points[rows, 0][:, None] - points[None, :, 0]
+    dy = points[rows, 1][:, None] - points[None, :, 1]
+    return np.hypot(dx, dy)
+
+
+def _haversine_rows(points, rows):
+    # points are (latitude, longitude) in degrees, the result is in km
+    lat, lon = np.radians(points[:, 0]), np.radians(points[:, 1])
+    half_lat = np.sin((lat[rows][:, None] - lat[None, :]) / 2)
+    half_lon = np.sin((lon[rows][:, None] - lon[None, :]) / 2)
+    a = half_lat ** 2 + np.cos(lat[rows])[:, None] * np.cos(lat)[None, :] * half_lon ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+@profiled("matrix")
+def _fill(points, metric, transform, dtype, chunk_rows, out):
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric {metric!r}, expected one of {METRICS}")
+    points = np.asarray(points, dtype=np.float64)
+    n = len(points)
+    if out is None:
+        out = np.empty((n, n), dtype=dtype)
+    rows_of = _euclidean_rows if metric == "euclidean" else _haversine_rows
+    for rows in _chunks(n, chunk_rows, n):
+        _store(out, rows, transform(rows_of(points, rows)))
+    return out
+
+
+def distance_matrix(points, metric="euclidean", scale=1.0, dtype=np.float32, chunk_rows=None, out=None):
+    """Distances between all points, computed a block of rows at a time.
+
+    points is (n, 2): x, y for "euclidean", latitude, longitude in degrees for
+    "haversine" (great circle km). Distances are multiplied by scale; integer
+    dtypes are rounded up. The scratch memory is a few (chunk_rows, n) float64
+    blocks at a time, 3 for "euclidean" and 5 for "haversine" (the
+    coordinate differences, the result and the scaled copy), whatever the
+    size of out, so out may be a memory-mapped array larger than RAM.
+    """
+    return _fill(points, metric, lambda block: block * scale, dtype, chunk_rows, out)
+
+
+def profile_travel_times(distances, speed, departure=0):
+    """Travel time of each distance when leaving at ``departure`` through a speed profile.
+
+    speed is either one number or a sequence of (start, speed) steps sorted by
+    start, each speed holding until the next start (the last one forever),
+    in distance units per time unit. Crossing into the next step changes the
+    speed on the way, so leaving later never means arriving earlier
+    (Ichoua, Gendreau & Potvin). Works on any array shape, one profile step
+    at a time.
+    """
+    distances = np.asarray(distances, dtype=np.float64)
+    if np.isscalar(speed):
+        return distances / speed
+    starts = np.array([start for start, _ in speed], dtype=np.float64)
+    speeds = np.array([value for _, value in speed], dtype=np.float64)
+    step = max(int(np.searchsorted(starts, departure, side="right")) - 1, 0)
+    clock = float(departure)
+    remaining = distances.copy()
+    elapsed = np.zeros_like(distances)
+    for k in range(step, len(starts)):
+        end = starts[k + 1] if k + 1 < len(starts) else np.inf
+        reach = speeds[k] * (end - clock)
+        finish = remaining <= reach
+        elapsed += np.where(finish, remaining / speeds[k], end - clock)
+        remaining = np.where(finish, 0.0, remaining - reach)
+        clock = end
+        if not remaining.any():
+            break
+    return elapsed
+
+
+def travel_time_matrix(points, speed, departure=0, metric="euclidean", scale=1.0, dtype=np.float32, chunk_rows=None,
+                       out=None):
+    """Travel times between all points through ``profile_travel_times``, a block of rows at a time.
+
+    The distances are the exact ``distance_matrix`` distances times scale, not
+    rounded ones.
+    """
+    return _fill(points, metric, lambda block: profile_travel_times(block * scale, speed, departure), dtype,
+                 chunk_rows, out)
+
+
+def matrix_key(points, **parameters):
+    """Hash of the coordinates and every parameter that changes the matrix."""
+    points = np.ascontiguousarray(points, dtype=np.float64)
+    digest = hashlib.sha1(points.tobytes())
+    digest.update(f"{points.shape} {sorted(parameters.items())}".encode())
+    return digest.hexdigest()[:16]
+
+
+def _cached(key, cache_dir, shape, dtype, compute):
+    path = os.path.join(cache_dir, f"{key}.npy")
+    if os.path.exists(path):
+        return np.load(path, mmap_mode="r")
+    os.makedirs(cache_dir, exist_ok=True)
+    # Filled in place on disk, then renamed, so readers never see a partial file
+    handle, staging = tempfile.mkstemp(dir=cache_dir, suffix=".npy")
+    os.close(handle)
+    try:
+        out = np.lib.format.open_memmap(staging, mode="w+", dtype=dtype, shape=shape)
+        compute(out)
+        out.flush()
+        del out
+        os.replace(staging, path)
+    finally:
+        if os.path.exists(staging):
+            os.remove(staging)
+    return np.load(path, mmap_mode="r")
+
+
+def coordinate_matrices(points, metric="euclidean", scale=1.0, speed=None, departure=0, dtype=np.int32,
+                        chunk_rows=None, cache_dir=DEFAULT_CACHE_DIR):
+    """Distance and travel time matrices of points, through the disk cache.
+
+    Without a speed the travel time matrix is None. Both matrices are cached
+    under a key of the coordinates and all parameters, and come back
+    memory-mapped. cache_dir=None computes them in memory.
+    Returns (distances, travel_times).
+    """
+    n = len(points)
+    dtype = np.dtype(dtype)
+
+    def distances(out=None):
+        return distance_matrix(points, metric, scale, dtype, chunk_rows, out)
+
+    def travel_times(out=None):
+        return travel_time_matrix(points, speed, departure, metric, scale, dtype, chunk_rows, out)
+
+    if cache_dir is None:
+        return distances(), None if speed is None else travel_times()
+    key = matrix_key(points, kind="distances", metric=metric, scale=scale, dtype=dtype.str)
+    distances_out = _cached(key, cache_dir, (n, n), dtype, distances)
+    if speed is None:
+        return distances_out, None
+    speed_key = speed if np.isscalar(speed) else tuple(map(tuple, speed))
+    key = matrix_key(points, kind="travel_times", metric=metric, scale=scale, speed=speed_key, departure=departure,
+                     dtype=dtype.str)
+    return distances_out, _cached(key, cache_dir, (n, n), dtype, travel_times)
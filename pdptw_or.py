@@ -1,8 +1,14 @@
 from ortools.constraint_solver import routing_enums_pb2
 from ortools.constraint_solver import pywrapcp
 import numpy as np
+import os
 import random
+import sys
 import time
+from pdptw_construct import construct, ortools_initial_assignment
+from pdptw_instance import PDPTWInstance
+from pdptw_telemetry import Telemetry
+from pdptw_validate import PAD, routes_from_ortools, routes_from_vrpy, validate
 
 # Configuration
 PAIRS = 10  # Number of pickup and delivery pairs
@@ -25,53 +31,45 @@ def create_data_model():
     data['pickups_deliveries'] = [(i + 1, i + PAIRS + 1) for i in range(PAIRS)]
     return data
 
-def solve_vrp():
-    """Solve the VRP with pickup and delivery using OR-Tools."""
+def solve_vrp(evaluators="matrix", num_workers=None):
+    """Solve the VRP with pickup and delivery using OR-Tools.
+
+    evaluators="matrix" registers distances and demands as native OR-Tools
+    matrix/vector evaluators, "callback" uses Python transit callbacks.
+    num_workers runs that many differently configured searches in parallel
+    within the same time limit (see ``pdptw_portfolio.solve_portfolio``).
+    """
     start_time = time.time()
 
     # Create the data model
     data = create_data_model()
 
-    # Create the routing index manager
-    manager = pywrapcp.RoutingIndexManager(len(data['distance_matrix']),
-                                           data['num_vehicles'], data['depot'])
-
-    # Create Routing Model
-    routing = pywrapcp.RoutingModel(manager)
-
-    # Create and register a transit callback (distance function)
-    def distance_callback(from_index, to_index):
-        from_node = manager.IndexToNode(from_index)
-        to_node = manager.IndexToNode(to_index)
-        return data['distance_matrix'][from_node][to_node]
+    # Store the data model as int32 arrays (the original model ignores time windows)
+    instance = PDPTWInstance(data['distance_matrix'], demands=data['demands'], pairs=data['pickups_deliveries'])
 
-    transit_callback_index = routing.RegisterTransitCallback(distance_callback)
+    if num_workers is not None:
+        from pdptw_portfolio import solve_portfolio
 
-    # Set cost function (minimize distance)
-    routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
+        best = solve_portfolio(instance, time_limit=30, load_capacity=VEHICLE_CAPACITY,
+                               num_vehicles=data['num_vehicles'], num_workers=num_workers, solution_limit=500)
+        if best is None:
+            print("No solution found!")
+            return
+        print(f"Solution found in {time.time() - start_time} seconds by {best.solver}.")
+        print_routes(routes_from_vrpy(best.routes, instance), instance, data)
+        return
 
-    # Add Capacity constraint
-    def demand_callback(from_index):
-        from_node = manager.IndexToNode(from_index)
-        return data['demands'][from_node]
-
-    demand_callback_index = routing.RegisterUnaryTransitCallback(demand_callback)
-    routing.AddDimensionWithVehicleCapacity(
-        demand_callback_index,
-        0,  # null capacity slack
-        data['vehicle_capacities'],  # vehicle maximum capacities
-        True,  # start cumul to zero
-        'Capacity')
+    # Create the routing index manager and Routing Model with distance cost,
+    # capacity dimension and pickup and delivery pairs
+    manager, routing = instance.to_ortools(data['num_vehicles'], VEHICLE_CAPACITY, evaluators=evaluators)
 
     # Retrieve the capacity dimension to use its cumul vars
     capacity_dimension = routing.GetDimensionOrDie('Capacity')
 
-    # Define Pickup and Delivery pairs and enforce capacity constraints
+    # Enforce capacity constraints on the pickup and delivery pairs
     for pickup, delivery in data['pickups_deliveries']:
         pickup_index = manager.NodeToIndex(pickup)
         delivery_index = manager.NodeToIndex(delivery)
-        routing.AddPickupAndDelivery(pickup_index, delivery_index)
-        routing.solver().Add(routing.VehicleVar(pickup_index) == routing.VehicleVar(delivery_index))
 
         # Enforce that the capacity (cumulative load) at the pickup point is positive
         capacity_dimension.CumulVar(pickup_index).SetRange(0, VEHICLE_CAPACITY)
@@ -96,38 +94,56 @@ def solve_vrp():
 
     search_parameters.log_search = True  # To get insights into search progress
 
+    # Structured record of every improving solution, for the convergence metrics
+    telemetry = Telemetry()
+    telemetry.watch_ortools(routing)
+
+    # Warm start from regret insertion routes, the search goes on from there
+    routes, unrouted = construct(instance, load_capacity=VEHICLE_CAPACITY, num_vehicles=data['num_vehicles'])
+    initial_solution = None
+    if unrouted:
+        print(f"Construction left pairs {unrouted} unrouted, starting from scratch.")
+    else:
+        initial_solution = ortools_initial_assignment(routes, manager, routing, search_parameters)
+        if initial_solution is None:
+            print("OR-Tools rejected the constructed routes, starting from scratch.")
+
     # Solve the problem.
-    solution = routing.SolveWithParameters(search_parameters)
+    if initial_solution is not None:
+        print(f"Starting from {len(routes)} constructed routes, cost {initial_solution.ObjectiveValue()}.")
+        solution = routing.SolveFromAssignmentWithParameters(initial_solution, search_parameters)
+    else:
+        solution = routing.SolveWithParameters(search_parameters)
 
     # Print solution
     if solution:
         print(f"Solution found in {time.time() - start_time} seconds.")
-        print_solution(manager, routing, solution, data)
+        print_solution(manager, routing, solution, instance, data)
+        print("Convergence:", telemetry.metrics(horizon=search_parameters.time_limit.seconds))
     else:
         print("No solution found! Could not retrieve any partial solution.")
 
-def print_solution(manager, routing, solution, data):
-    """Prints the solution to the console."""
-    total_distance = 0
-    total_load = 0
-    for vehicle_id in range(data['num_vehicles']):
-        index = routing.Start(vehicle_id)
-        plan_output = 'Route for vehicle {}:\n'.format(vehicle_id)
-        route_distance = 0
-        route_load = 0
-        while not routing.IsEnd(index):
-            node_index = manager.IndexToNode(index)
-            route_load += data['demands'][node_index]
-            plan_output += ' {0} Load({1}) -> '.format(node_index, route_load)
-            previous_index = index
-            index = solution.Value(routing.NextVar(index))
-            route_distance += routing.GetArcCostForVehicle(previous_index, index, vehicle_id)
-        plan_output += ' {0} Load({1})\n'.format(manager.IndexToNode(index), route_load)
-        plan_output += 'Distance of the route: {}m\n'.format(route_distance)
-        print(plan_output)
-        total_distance += route_distance
-        total_load += route_load
-    print('Total distance of all routes: {}m'.format(total_distance))
+def print_solution(manager, routing, solution, instance, data):
+    """Validates the solution and prints its routes with loads and distances."""
+    print_routes(routes_from_ortools(manager, routing, solution), instance, data)
+
+def print_routes(routes, instance, data):
+    """Validates routes (lists of nodes) and prints them with loads and distances."""
+    report = validate(instance, routes, load_capacity=VEHICLE_CAPACITY, num_vehicles=data['num_vehicles'])
+    for r in report.route_rows(0):
+        route = report.stops[r][report.stops[r] != PAD]
+        loads = report.load[r][:len(route)]
+        stops = ' -> '.join(f'{node} Load({load})' for node, load in zip(route.tolist(), loads.tolist()))
+        print(f'Route {r}: {DEPOT} Load(0) -> {stops} -> {DEPOT}')
+    print('Total distance of all routes: {}m'.format(int(report.cost[0])))
+    if report.feasible[0]:
+        print("All constraints are satisfied.")
+    else:
+        print(f"Constraint violations: {report.errors(0)}")
 
 if __name__ == '__main__':
-    solve_vrp()
+    # python pdptw_or.py --portfolio runs one search per CPU instead of the single search
+    if '--portfolio' in sys.argv[1:]:
+        solve_vrp(num_workers=os.cpu_count())
+    else:
+        solve_vrp()
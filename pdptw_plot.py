@@ -0,0 +1,122 @@
+import numpy as np
+
+from pdptw_instance import DEPOT
+from pdptw_profile import profiled
+
+# Instances with more nodes are placed by landmark MDS on this many nodes
+LANDMARKS = 1000
+# Node and time window labels are only written on instances up to this size
+MAX_LABELS = 60
+# A legend of vehicles is only drawn up to this many routes
+MAX_LEGEND = 20
+
+
+def _clock(seconds):
+    return f"{seconds // 3600}:{(seconds % 3600) // 60:02d}"
+
+
+def node_positions(instance, landmarks=LANDMARKS):
+    """(n, 2) plotting positions: the instance coordinates, or an MDS embedding of its distances.
+
+    Without coordinates the distance matrix (made symmetric) is embedded by
+    classical multidimensional scaling, so nodes that are close by road are
+    close on the plot. Above ``landmarks`` nodes only an evenly spaced sample
+    (the depot included) is embedded and the rest placed against it (landmark
+    MDS, de Silva and Tenenbaum), which keeps large instances to
+    O(n * landmarks) work.
+    """
+    if instance.coordinates is not None:
+        return instance.coordinates
+    n = instance.num_nodes
+    squared = instance.distances.astype(np.float64)
+    squared = ((squared + squared.T) / 2) ** 2
+    chosen = np.arange(n) if n <= landmarks else np.linspace(DEPOT, n - 1, landmarks).astype(np.int64)
+    sample = squared[np.ix_(chosen, chosen)]
+    # Double centring turns squared distances into inner products
+    mean = sample.mean(axis=0)
+    inner = -0.5 * (sample - mean - sample.mean(axis=1)[:, None] + sample.mean())
+    values, vectors = np.linalg.eigh(inner)
+    top = np.argsort(values)[::-1][:2]
+    values, vectors = np.maximum(values[top], 1e-12), vectors[:, top]
+    # Every node from its squared distances to the landmarks (exact for the landmarks themselves)
+    positions = -0.5 * (squared[:, chosen] - mean) @ (vectors / np.sqrt(values))
+    if positions.shape[1] < 2:
+        positions = np.column_stack([positions, np.zeros(n)])
+    return positions
+
+
+def _route_rows(instance, routes):
+    # Routes are vrpy style: {vehicle: ["Source", label, ..., "Sink"]} or (vehicle, route) pairs
+    row_of = {label: row for row, label in enumerate(instance.node_ids.tolist())}
+    row_of["Source"] = row_of["Sink"] = DEPOT
+    items = routes.items() if isinstance(routes, dict) else routes
+    return [(vehicle, [row_of[label] for label in route]) for vehicle, route in items]
+
+
+@profiled("plot")
+def draw_routes(instance, routes, path, title=None, clock=False, max_labels=MAX_LABELS, figsize=(10, 8), dpi=150,
+                positions=None):
+    """Writes a picture of the routes to path (the format follows its extension, e.g. .png or .svg).
+
+    Only the routes are drawn, one colour per vehicle, over the nodes:
+    pickups as triangles, deliveries as squares, the depot as a star, each
+    coloured by the opening of its time window. Small instances also get a
+    label per node with its window (as H:MM of a day in seconds when clock).
+    matplotlib is imported here and draws without a display, so this works
+    in batch runs and worker processes. positions defaults to
+    ``node_positions(instance)``. Returns path.
+    """
+    from matplotlib import colormaps
+    from matplotlib.collections import LineCollection
+    from matplotlib.figure import Figure
+
+    positions = node_positions(instance) if positions is None else np.asarray(positions, dtype=np.float64)
+    routes = _route_rows(instance, routes or {})
+    figure = Figure(figsize=figsize, dpi=dpi)
+    axes = figure.add_subplot()
+
+    # One collection for all routes, drawing them one line at a time is what makes big plots slow
+    colours = [colormaps["tab20"](k % 20) for k in range(len(routes))]
+    axes.add_collection(LineCollection([positions[rows] for _, rows in routes], colors=colours, linewidths=1.2,
+                                       zorder=1))
+
+    windows = instance.lower if instance.has_time_windows else None
+    marker_size = 40 if instance.num_nodes <= max_labels else max(4.0, 4000 / instance.num_nodes)
+    pickups, deliveries = instance.pairs[:, 0], instance.pairs[:, 1]
+    others = np.setdiff1d(np.arange(1, instance.num_nodes), instance.pairs.ravel())
+    scatter = None
+    for rows, marker in ((pickups, "^"), (deliveries, "s"), (others, "o")):
+        if not len(rows):
+            continue
+        if windows is None:
+            style = {"color": "lightblue"}
+        else:
+            style = {"c": windows[rows], "cmap": "viridis", "vmin": windows[1:].min(), "vmax": windows[1:].max()}
+        scatter = axes.scatter(*positions[rows].T, s=marker_size, marker=marker, zorder=2, edgecolors="none",
+                               **style)
+    axes.scatter(*positions[DEPOT], s=200, marker="*", color="red", zorder=3)
+    if windows is not None and scatter is not None:
+        figure.colorbar(scatter, ax=axes, label="time window opens")
+    if 0 < len(routes) <= MAX_LEGEND:
+        for (vehicle, _), colour in zip(routes, colours):
+            axes.plot([], [], color=colour, label=f"vehicle {vehicle}")
+        axes.legend(loc="best", fontsize=8)
+
+    if instance.num_nodes <= max_labels:
+        labels = instance.node_ids.tolist()
+        fmt = _clock if clock else str
+        for row in range(1, instance.num_nodes):
+            text = str(labels[row])
+            if windows is not None:
+                text += f"\n{fmt(int(instance.lower[row]))}-{fmt(int(instance.upper[row]))}"
+            axes.annotate(text, positions[row], fontsize=7, ha="center", va="top", xytext=(0, -4),
+                          textcoords="offset points")
+
+    axes.autoscale_view()
+    axes.set_aspect("equal", adjustable="datalim")
+    if instance.coordinates is None:
+        axes.set_xticks([])
+        axes.set_yticks([])
+    axes.set_title(title or f"{len(routes)} routes, {instance.num_pairs} pairs")
+    figure.savefig(path, bbox_inches="tight")
+    return path
@@ -0,0 +1,109 @@
+from collections import OrderedDict
+
+from networkx import shortest_path
+
+
+class RoutePool:
+    """Route columns kept across vrpy solves (rolling horizon).
+
+    Every column a solve generated is stored as a ['Source', ..., 'Sink'] node
+    list. The next solve takes the columns that are still feasible for its own
+    requests as ``initial_routes``, so vrpy starts pricing from them instead of
+    regenerating them, without locking anything the way ``preassignments`` does.
+    Once ``max_columns`` is reached the least recently generated or reused
+    columns are dropped.
+    """
+
+    def __init__(self, max_columns=10000):
+        self.max_columns = max_columns
+        self._columns = OrderedDict()
+
+    def __len__(self):
+        return len(self._columns)
+
+    def add(self, route):
+        key = tuple(route)
+        self._columns[key] = None
+        self._columns.move_to_end(key)
+        while len(self._columns) > self.max_columns:
+            self._columns.popitem(last=False)
+
+    def add_problem(self, prob):
+        """Adds every column of a solved VehicleRoutingProblem.
+
+        vrpy has no public accessor for its column set, the columns are read
+        from ``prob._routes`` (one path DiGraph per column).
+        """
+        for column in getattr(prob, "_routes", []):
+            self.add(shortest_path(column, "Source", "Sink"))
+        for route in prob.best_routes.values():
+            self.add(route)
+
+    def columns_for(self, instance, load_capacity=None, num_stops=None, time_windows=False):
+        """Columns that are feasible routes for ``instance`` (typically a subset).
+
+        A column qualifies when all its stops are nodes of the instance, every pair
+        it touches is complete with the pickup first, and it respects load_capacity,
+        num_stops and, with time_windows=True, the time windows.
+        """
+        row_of = {node: row for row, node in enumerate(instance.node_ids.tolist()) if row}
+        partner, deliveries = {}, set()
+        for pickup, delivery in instance.pairs.tolist():
+            partner[pickup] = delivery
+            partner[delivery] = pickup
+            deliveries.add(delivery)
+        demands = instance.demands.tolist()
+
+        feasible = []
+        for key in list(self._columns):
+            stops = key[1:-1]
+            if not stops or (num_stops and len(stops) > num_stops):
+                continue
+            rows = [row_of.get(node) for node in stops]
+            if None in rows or not self._pairs_closed(rows, partner, deliveries):
+                continue
+            if load_capacity is not None and not self._within_capacity(rows, demands, load_capacity):
+                continue
+            if time_windows and instance.has_time_windows and not self._within_time_windows(rows, instance):
+                continue
+            self._columns.move_to_end(key)
+            feasible.append(list(key))
+        return feasible
+
+    @staticmethod
+    def _pairs_closed(rows, partner, deliveries):
+        seen = set()
+        for row in rows:
+            if row not in partner:
+                continue
+            # A delivery needs its pickup earlier, a pickup needs its delivery later
+            if row in deliveries and partner[row] not in seen:
+                return False
+            seen.add(row)
+        return all(partner[row] in seen for row in seen)
+
+    @staticmethod
+    def _within_capacity(rows, demands, load_capacity):
+        load = 0
+        for row in rows:
+            load += demands[row]
+            if load > load_capacity:
+                return False
+        return True
+
+    @staticmethod
+    def _within_time_windows(rows, instance):
+        lower, upper = instance.lower, instance.upper
+        travel_times = instance.travel_times
+        service_times = instance.service_times
+        current, time = 0, int(lower[0])
+        for row in rows:
+            if service_times is not None:
+                time += int(service_times[current])
+            if travel_times is not None:
+                time += int(travel_times[current, row])
+            time = max(time, int(lower[row]))
+            if time > upper[row]:
+                return False
+            current = row
+        return True
@@ -0,0 +1,129 @@
+import collections
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from pdptw_construct import construct, insert_pairs
+from pdptw_solve import Incumbents, solve_ortools, total_distance, without_windows
+from pdptw_validate import validate
+
+# One search of the portfolio: first_solution is a FirstSolutionStrategy name, or
+# "regret" to warm-start from the regret insertion routes (re-inserted around a
+# seeded random share of the pairs when seed > 0), metaheuristic is a
+# LocalSearchMetaheuristic name
+Configuration = collections.namedtuple("Configuration", "first_solution metaheuristic seed")
+
+CONFIGURATIONS = (
+    Configuration("regret", "GUIDED_LOCAL_SEARCH", 0),
+    Configuration("PARALLEL_CHEAPEST_INSERTION", "GUIDED_LOCAL_SEARCH", 0),
+    Configuration("regret", "SIMULATED_ANNEALING", 1),
+    Configuration("SAVINGS", "GUIDED_LOCAL_SEARCH", 0),
+    Configuration("regret", "TABU_SEARCH", 2),
+    Configuration("LOCAL_CHEAPEST_INSERTION", "GUIDED_LOCAL_SEARCH", 0),
+    Configuration("regret", "GUIDED_LOCAL_SEARCH", 3),
+    Configuration("AUTOMATIC", "GENERIC_TABU_SEARCH", 0),
+)
+
+# Best objective of all searches, -1 until one finds a solution (set per worker by _share)
+_best = None
+
+
+def _share(best):
+    global _best
+    _best = best
+
+
+def _start_routes(instance, configuration, load_capacity, num_stops, num_vehicles, reshuffle=0.3):
+    if configuration.first_solution != "regret":
+        return []
+    routes, unrouted = construct(instance, load_capacity, num_stops, num_vehicles)
+    if unrouted or not configuration.seed:
+        return routes
+    # Take a random share of the pairs out and put them back, cheapest first
+    rng = np.random.default_rng(configuration.seed)
+    removed = rng.choice(instance.num_pairs, max(int(reshuffle * instance.num_pairs), 1), replace=False)
+    rows = set(instance.pairs[removed].ravel().tolist())
+    kept = [stops for stops in ([row for row in route if row not in rows] for route in routes) if stops]
+    shuffled, unplaced = insert_pairs(instance, kept, rng.permutation(removed), load_capacity, num_stops,
+                                      num_vehicles, regret=1)
+    return routes if unplaced else shuffled
+
+
+def _search(instance, configuration, deadline, grace, stop_gap, load_capacity, num_stops, num_vehicles,
+            solution_limit):
+    start_time = time.time()
+
+    def publish(incumbent):
+        with _best.get_lock():
+            if _best.value < 0 or incumbent.objective < _best.value:
+                _best.value = incumbent.objective
+
+    incumbents = Incumbents(instance, publish)
+    routes = _start_routes(instance, configuration, load_capacity, num_stops, num_vehicles)
+    # Demands that do not balance within a pair can defeat the construction
+    if routes and not validate(instance, routes, load_capacity=load_capacity, num_stops=num_stops,
+                               num_vehicles=num_vehicles).feasible[0]:
+        routes = []
+    if routes:
+        incumbents.offer(total_distance(instance, routes), routes, "construct")
+
+    def should_stop():
+        # Clearly behind the best search after the grace period
+        best = _best.value
+        if best < 0 or time.time() - start_time < grace:
+            return False
+        return incumbents.best is None or incumbents.best.objective > best * (1 + stop_gap)
+
+    solve_ortools(instance, routes, deadline - time.time(), incumbents, load_capacity, num_stops, num_vehicles,
+                   first_solution="PARALLEL_CHEAPEST_INSERTION" if configuration.first_solution == "regret"
+                   else configuration.first_solution,
+                   metaheuristic=configuration.metaheuristic, should_stop=should_stop, solution_limit=solution_limit)
+    return incumbents.best
+
+
+def solve_portfolio(instance, time_limit=30, load_capacity=None, num_stops=None, num_vehicles=None, time_windows=None,
+                    num_workers=None, configurations=CONFIGURATIONS, stop_gap=0.05, grace=0.25, solution_limit=None,
+                    on_solution=None):
+    """Runs num_workers differently configured OR-Tools searches at once and returns the best ``Incumbent``.
+
+    Search k uses configurations[k % len(configurations)], varying the first
+    solution strategy, the metaheuristic and the seed of the warm start. The
+    searches share the best objective found so far: after grace * time_limit
+    seconds, a search whose best is more than stop_gap above it (or that has
+    none) stops, leaving its core to the others. on_solution(incumbent) is
+    called whenever a finished search beats the ones before it. Each search
+    runs in a spawned process (num_workers=1 runs here), so scripts need an
+    ``if __name__ == '__main__':`` guard.
+    """
+    if time_windows is None:
+        time_windows = instance.has_time_windows
+    if not time_windows and instance.has_time_windows:
+        instance = without_windows(instance)
+    num_workers = num_workers or os.cpu_count() or 1
+    incumbents = Incumbents(instance, on_solution)
+    deadline = time.time() + time_limit
+    context = multiprocessing.get_context("spawn")
+    best = context.Value("q", -1)
+    jobs = {}
+
+    def offer(result, configuration):
+        if result is not None:
+            name = "portfolio/{}/{}/{}".format(*configuration)
+            incumbents.offer(result.objective, result.routes, name)
+
+    options = (grace * time_limit, stop_gap, load_capacity, num_stops, num_vehicles, solution_limit)
+    searches = [configurations[k % len(configurations)] for k in range(num_workers)]
+    if num_workers == 1:
+        _share(best)
+        offer(_search(instance, searches[0], deadline, *options), searches[0])
+        return incumbents.best
+    with ProcessPoolExecutor(max_workers=num_workers, mp_context=context, initializer=_share,
+                             initargs=(best,)) as pool:
+        for configuration in searches:
+            jobs[pool.submit(_search, instance, configuration, deadline, *options)] = configuration
+        for future in as_completed(jobs):
+            offer(future.result(), jobs[future])
+    return incumbents.best
@@ -0,0 +1,226 @@
+import collections
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+# One finished phase: wall-clock start and duration in microseconds, memory
+# change in bytes (resident set, or tracemalloc peak above the start) and the
+# process/thread it ran in
+Event = collections.namedtuple("Event", "name start duration memory pid tid args")
+
+# vrpy internals timed while a profiler runs: (module, class, method, phase name)
+_VRPY_PHASES = (
+    ("vrpy.vrp", "VehicleRoutingProblem", "_pre_solve", "vrpy/preprocessing"),
+    ("vrpy.vrp", "VehicleRoutingProblem", "_initialize", "vrpy/initial solution"),
+    ("vrpy.master_solve_pulp", "_MasterSolvePulp", "solve", "vrpy/master"),
+    ("vrpy.subproblem_lp", "_SubProblemLP", "solve", "vrpy/pricing"),
+    ("vrpy.subproblem_cspy", "_SubProblemCSPY", "solve", "vrpy/pricing"),
+    ("vrpy.vrp", "VehicleRoutingProblem", "_post_process", "vrpy/result extraction"),
+)
+
+_active = None
+
+
+def _rss():
+    # Resident set size in bytes, from /proc on Linux, else the peak from getrusage
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Profiler:
+    """Times phases of the solve pipeline and the memory each one takes.
+
+    ``phase(name)`` (a context manager, or a decorator) records into the
+    profiler that is running, and does nothing when none is. memory="rss"
+    records the change of the resident set over each phase, "tracemalloc"
+    the peak of Python allocations above the start of the phase (several
+    times slower), None nothing. While running, vrpy's preprocessing,
+    initial solution, master problem (LP and MIP), pricing and result
+    extraction are timed as their own phases.
+
+    Use as ``with Profiler() as profiler:`` or start() / stop(), then
+    ``summary()`` and ``export(path)`` (Chrome trace JSON, for
+    chrome://tracing or Perfetto).
+
+    Phases may be opened from several threads (``pdptw_solve.stream`` runs
+    the solve in an executor thread), each thread nests its own. The memory
+    of a phase is measured for the whole process though, so it includes what
+    other threads allocated meanwhile.
+    """
+
+    def __init__(self, memory="rss", vrpy=True):
+        if memory not in ("rss", "tracemalloc", None):
+            raise ValueError(f"Unknown memory mode {memory!r}, expected 'rss', 'tracemalloc' or None")
+        self.memory = memory
+        self.vrpy = vrpy
+        self.events = []
+        self._local = threading.local()
+        self._patched = []
+        self._previous = None
+        self._started_tracemalloc = False
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        global _active
+        self._previous, _active = _active, self
+        if self.memory == "tracemalloc" and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        if self.vrpy:
+            self._patch_vrpy()
+        return self
+
+    def stop(self):
+        global _active
+        for owner, name, original in reversed(self._patched):
+            setattr(owner, name, original)
+        self._patched = []
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        _active = self._previous
+
+    def _patch_vrpy(self):
+        import importlib
+
+        for module_name, class_name, method, name in _VRPY_PHASES:
+            try:
+                owner = getattr(importlib.import_module(module_name), class_name)
+            except (ImportError, AttributeError):
+                continue
+            original = owner.__dict__[method]
+            if name == "vrpy/master":
+                wrapper = self._wrap_master(original)
+            else:
+                wrapper = functools.wraps(original)(self.phase(name)(original))
+            setattr(owner, method, wrapper)
+            self._patched.append((owner, method, original))
+
+    def _wrap_master(self, original):
+        @functools.wraps(original)
+        def solve(master, relax, time_limit):
+            with self.phase("vrpy/master LP" if relax else "vrpy/master MIP"):
+                return original(master, relax, time_limit)
+        return solve
+
+    @property
+    def _stack(self):
+        # Open phases of the calling thread, as [memory at start, peak seen in nested phases]
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _memory(self):
+        if self.memory == "rss":
+            return _rss()
+        if self.memory == "tracemalloc":
+            return tracemalloc.get_traced_memory()[0]
+        return 0
+
+    @contextlib.contextmanager
+    def phase(self, name, **args):
+        stack = self._stack
+        if self.memory == "tracemalloc":
+            # Keep the peak seen so far for the enclosing phase, then measure ours from here
+            if stack:
+                stack[-1][1] = max(stack[-1][1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        frame = [self._memory(), 0]
+        stack.append(frame)
+        start = time.time_ns() // 1000
+        try:
+            yield
+        finally:
+            duration = time.time_ns() // 1000 - start
+            stack.pop()
+            if self.memory == "tracemalloc":
+                peak = max(frame[1], tracemalloc.get_traced_memory()[1])
+                memory = peak - frame[0]
+                if stack:
+                    stack[-1][1] = max(stack[-1][1], peak)
+            else:
+                memory = self._memory() - frame[0]
+            self.events.append(Event(name, start, duration, memory, os.getpid(), threading.get_ident(), args))
+
+    def merge(self, events):
+        """Adds events recorded elsewhere, e.g. by the profiler of a worker process."""
+        self.events.extend(Event(*event) for event in events)
+
+    def totals(self):
+        """{name: (calls, total seconds, longest seconds, largest memory change in bytes)}, slowest first."""
+        totals = {}
+        for event in self.events:
+            calls, total, longest, memory = totals.get(event.name, (0, 0.0, 0.0, 0))
+            seconds = event.duration / 1e6
+            totals[event.name] = (calls + 1, total + seconds, max(longest, seconds), max(memory, event.memory))
+        return dict(sorted(totals.items(), key=lambda item: -item[1][1]))
+
+    def summary(self):
+        """The totals as a text table.
+
+        Nested phases also count in their parent's time, and the phases of
+        parallel workers overlap, so shares can add up to more than 100%.
+        """
+        if not self.events:
+            return "No phases recorded"
+        wall = (max(e.start + e.duration for e in self.events) - min(e.start for e in self.events)) / 1e6
+        width = max(len("phase"), *(len(name) for name in self.totals()))
+        lines = [f"{'phase':<{width}}  {'calls':>6}  {'total s':>9}  {'share':>6}  {'max s':>8}  {'memory MB':>9}"]
+        for name, (calls, total, longest, memory) in self.totals().items():
+            share = total / wall if wall > 0 else 0.0
+            lines.append(f"{name:<{width}}  {calls:>6}  {total:>9.3f}  {share:>6.1%}  {longest:>8.3f}  "
+                         f"{memory / 2 ** 20:>9.1f}")
+        lines.append(f"{'wall clock':<{width}}  {'':>6}  {wall:>9.3f}")
+        return "\n".join(lines)
+
+    def trace(self):
+        """The events in Chrome trace format (complete "X" events, times from the first event)."""
+        origin = min((event.start for event in self.events), default=0)
+        return {"traceEvents": [
+            {"name": event.name, "cat": event.name.split("/")[0], "ph": "X", "ts": event.start - origin,
+             "dur": event.duration, "pid": event.pid, "tid": event.tid,
+             "args": dict(event.args, memory_mb=round(event.memory / 2 ** 20, 3))}
+            for event in sorted(self.events, key=lambda event: event.start)
+        ], "displayTimeUnit": "ms"}
+
+    def export(self, path):
+        """Writes ``trace()`` as JSON to path."""
+        with open(path, "w") as f:
+            json.dump(self.trace(), f)
+
+
+def current_profiler():
+    """The running Profiler, or None."""
+    return _active
+
+
+def phase(name, **args):
+    """Times the enclosed code as ``name`` in the running Profiler (no-op without one)."""
+    if _active is None:
+        return contextlib.nullcontext()
+    return _active.phase(name, **args)
+
+
+def profiled(name):
+    """Decorator form of ``phase``, looked up at call time."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,192 @@
+import time
+
+import numpy as np
+
+from pdptw_instance import DEPOT
+from pdptw_profile import profiled
+
+
+def feasible_arc_mask(instance, load_capacity=None):
+    """Boolean (n, n) mask of the arcs that can appear in a feasible route.
+
+    Row 0 holds the Source arcs and column 0 the Sink arcs. An arc i -> j is dead
+    when
+      - the time windows cannot be met: lower[i] + service[i] + time[i, j] > upper[j]
+      - it breaks a pair's precedence: delivery -> own pickup, Source -> delivery,
+        pickup -> Sink
+      - the load carried around it exceeds load_capacity: |q_i| + |q_j| is on board
+        at once unless i is a delivery followed by a pickup, or i -> j is one pair
+    """
+    n = instance.num_nodes
+    mask = np.ones((n, n), dtype=bool)
+    np.fill_diagonal(mask, False)
+
+    if instance.has_time_windows:
+        lower = instance.lower.astype(np.int64)
+        upper = instance.upper.astype(np.int64)
+        arrival = lower[:, None]
+        if instance.service_times is not None:
+            arrival = arrival + instance.service_times[:, None]
+        if instance.travel_times is not None:
+            arrival = arrival + instance.travel_times
+        dead = arrival > upper[None, :]
+        # vrpy stretches a Sink upper bound of 0 to cover every route
+        if upper[DEPOT] == 0:
+            dead[:, DEPOT] = False
+        mask &= ~dead
+
+    pickups, deliveries = instance.pairs[:, 0], instance.pairs[:, 1]
+    if instance.num_pairs:
+        mask[deliveries, pickups] = False
+        mask[DEPOT, deliveries] = False
+        mask[pickups, DEPOT] = False
+
+    if load_capacity is not None:
+        load = np.abs(instance.demands.astype(np.int64))
+        load[DEPOT] = 0
+        over = (load[:, None] + load[None, :]) > load_capacity
+        is_delivery = instance.demands < 0
+        is_pickup = instance.demands > 0
+        over &= ~(is_delivery[:, None] & is_pickup[None, :])
+        over[pickups, deliveries] = False
+        mask &= ~over
+    return mask
+
+
+@profiled("preprocessing/prune arcs")
+def prune_arcs(G, instance, load_capacity=None):
+    """Removes the dead arcs of ``feasible_arc_mask`` from a vrpy graph.
+
+    G must have been built by ``instance.to_vrpy_graph()``. Source and Sink arcs
+    are kept: vrpy requires a round trip to every node and would re-add them
+    with cost 1e10. Returns the number of arcs removed.
+    """
+    mask = feasible_arc_mask(instance, load_capacity)
+    mask[DEPOT, :] = True
+    mask[:, DEPOT] = True
+    tails, heads = np.nonzero(~mask)
+    label = instance.node_ids
+    dead = [arc for arc in zip(label[tails].tolist(), label[heads].tolist()) if G.has_edge(*arc)]
+    G.remove_edges_from(dead)
+    return len(dead)
+
+
+@profiled("preprocessing/candidate arcs")
+def candidate_arc_mask(instance, k=10, load_capacity=None):
+    """Sparse (n, n) mask of the arcs worth giving to the pricing problem.
+
+    Out of the arcs ``feasible_arc_mask`` keeps, every customer keeps its k
+    nearest successors and its k nearest predecessors (by distance), every
+    pickup keeps the arc to its own delivery, and all Source and Sink arcs
+    stay. Arcs left out can be put back with ``add_arcs``.
+    """
+    feasible = feasible_arc_mask(instance, load_capacity)
+    n = instance.num_nodes
+    mask = np.zeros((n, n), dtype=bool)
+    mask[DEPOT, :] = feasible[DEPOT, :]
+    mask[:, DEPOT] = feasible[:, DEPOT]
+    if n > 1 and k > 0:
+        # Infeasible arcs sort last and are dropped again by the final & feasible
+        distances = np.where(feasible, instance.distances, np.iinfo(np.int32).max)[1:, 1:]
+        k = min(k, n - 1)
+        rows = np.arange(1, n)[:, None]
+        successors = np.argpartition(distances, k - 1, axis=1)[:, :k] + 1
+        predecessors = np.argpartition(distances, k - 1, axis=0)[:k, :] + 1
+        mask[rows, successors] = True
+        mask[predecessors, rows.T] = True
+    mask[instance.pairs[:, 0], instance.pairs[:, 1]] = True
+    return mask & feasible
+
+
+def arc_reduced_costs(instance, duals):
+    """Reduced cost of every arc for the duals of vrpy's covering constraints.
+
+    Each node's dual is split evenly between its incoming and outgoing arc, so
+    a route's reduced cost is still the sum over its arcs, but an arc is judged
+    by both its ends.
+    """
+    row_of = {node: row for row, node in enumerate(instance.node_ids.tolist())}
+    price = np.zeros(instance.num_nodes)
+    for node, value in duals.items():
+        if node in row_of and value is not None:
+            price[row_of[node]] = value
+    return instance.distances - (price[:, None] + price[None, :]) / 2
+
+
+def add_arcs(G, instance, mask):
+    """Adds the customer arcs of mask that G lacks, with their cost and time. Returns how many."""
+    label = instance.node_ids
+    customers = mask.copy()
+    customers[DEPOT, :] = False
+    customers[:, DEPOT] = False
+    tails, heads = np.nonzero(customers)
+    new = [(int(i), int(j)) for i, j in zip(tails.tolist(), heads.tolist())
+           if not G.has_edge(label[i].item(), label[j].item())]
+    for i, j in new:
+        edge = {"cost": int(instance.distances[i, j])}
+        if instance.travel_times is not None:
+            edge["time"] = int(instance.travel_times[i, j])
+        G.add_edge(label[i].item(), label[j].item(), **edge)
+    return len(new)
+
+
+def priced_arc_mask(G, instance, duals, k=10, load_capacity=None):
+    """Feasible arcs missing from G that would rank among the k best reduced cost successors of their tail."""
+    feasible = feasible_arc_mask(instance, load_capacity)
+    feasible[DEPOT, :] = False
+    feasible[:, DEPOT] = False
+    reduced = np.where(feasible, arc_reduced_costs(instance, duals), np.inf)
+    n = instance.num_nodes
+    present = np.zeros((n, n), dtype=bool)
+    row_of = {node: row for row, node in enumerate(instance.node_ids.tolist())}
+    for tail, head in G.edges():
+        if tail in row_of and head in row_of:
+            present[row_of[tail], row_of[head]] = True
+    k = min(k, n - 1)
+    kth = np.partition(reduced, k - 1, axis=1)[:, k - 1:k] if k > 0 else np.full((n, 1), -np.inf)
+    return feasible & ~present & (reduced <= kth)
+
+
+def solve_candidate_graph(instance, k=10, load_capacity=None, num_stops=None, num_vehicles=None, time_windows=None,
+                          max_rounds=5, initial_routes=None, time_limit=None):
+    """Solves with vrpy on the sparse ``candidate_arc_mask`` graph, adding arcs back as pricing needs them.
+
+    After each solve the LP duals of the final column set are read (vrpy keeps
+    its master problem in ``prob.masterproblem``) and the missing arcs that
+    now rank among the k best reduced cost successors of their tail are added.
+    The next round starts from the routes found so far. Stops when no arc is
+    added, after max_rounds, or when time_limit seconds (shared by all
+    rounds, each round gets what is left) have run out. vrpy itself gives
+    its final integer solve at least 5 s, so the last round can end that
+    much late. Returns (prob, arcs added per round).
+    """
+    from vrpy import VehicleRoutingProblem
+
+    if time_windows is None:
+        time_windows = instance.has_time_windows
+    G = instance.to_vrpy_graph(arcs=candidate_arc_mask(instance, k, load_capacity))
+    added = []
+    deadline = None if time_limit is None else time.perf_counter() + time_limit
+    for _ in range(max_rounds):
+        remaining = None if deadline is None else deadline - time.perf_counter()
+        # The first round always runs, later ones only while time is left
+        # (vrpy would read a time_limit of 0 as no limit)
+        if added and remaining is not None and remaining <= 0:
+            break
+        prob = VehicleRoutingProblem(G, load_capacity=load_capacity, num_stops=num_stops, num_vehicles=num_vehicles,
+                                     pickup_delivery=True)
+        prob.time_windows = time_windows
+        prob.solve(cspy=False, initial_routes=initial_routes, time_limit=remaining)
+        try:
+            duals, _ = prob.masterproblem.solve(relax=True, time_limit=None)
+        except TypeError:
+            # CBC now and then leaves a route without a value, which vrpy's
+            # check of the selected routes cannot compare; no duals to price with
+            break
+        count = add_arcs(G, instance, priced_arc_mask(G, instance, duals, k, load_capacity))
+        added.append(count)
+        if not count:
+            break
+        initial_routes = list(prob.best_routes.values()) + [
+            ["Source", pickup, delivery, "Sink"] for pickup, delivery in instance.node_ids[instance.pairs].tolist()]
+    return prob, added
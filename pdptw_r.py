@@ -1,51 +1,40 @@
 import time
-import random
-from networkx import DiGraph, relabel_nodes, set_node_attributes
-from numpy import array
-import networkx as nx
+import numpy as np
 from vrpy import VehicleRoutingProblem
-import random
-
-# PAIRS設定：假設要處理10對pickup-delivery任務
-PAIRS = 40
-
-# 生成隨機的距離矩陣，並確保對稱性
-DISTANCES = [[0 if i == j else random.randint(10, 1000) for j in range(PAIRS + 2)] for i in range(PAIRS + 2)]
-for i in range(len(DISTANCES)):
-    for j in range(i, len(DISTANCES)):
-        DISTANCES[j][i] = DISTANCES[i][j]  # 確保矩陣對稱
-
-# 將距離矩陣轉換為DiGraph
-A = array(DISTANCES, dtype=[("cost", int)])
-G = nx.from_numpy_array(A, create_using=nx.DiGraph())
-
-# 重命名depot為Source和Sink
-G = relabel_nodes(G, {0: "Source", PAIRS + 1: "Sink"})
-
-
-
-# 隨機設定pickup-delivery對應的工作負荷
-pickups_deliveries = {(2 * i + 1, 2 * i + 2): random.randint(1, 4) for i in range(PAIRS//2)}
-
-# 載荷需求 pickup 隨機1-4, 對應的 delivery 是對應的負數
-DEMAND = {}
-for pickup, delivery in pickups_deliveries:
-    DEMAND[pickup] = pickups_deliveries[(pickup, delivery)]  # 正數代表取走的載荷
-    DEMAND[delivery] = -pickups_deliveries[(pickup, delivery)]  # 負數代表交付的載荷
-
-# 生成時間窗口必須符合 (pickup, delivery)，pickup < delivery
-TIME_WINDOWS_LOWER = {}
-TIME_WINDOWS_UPPER = {}
-
-for pickup, delivery in pickups_deliveries:
-    # 隨機生成時間窗口下限，pickup 必須先於 delivery
-    pickup_lower = random.randint(0, 10)
-    delivery_lower = pickup_lower + random.randint(1, 5)  # 保證 delivery 晚於 pickup
-
-    TIME_WINDOWS_LOWER[pickup] = pickup_lower
-    TIME_WINDOWS_UPPER[pickup] = pickup_lower + random.randint(5, 10)  # 設定pickup的上限
-    TIME_WINDOWS_LOWER[delivery] = delivery_lower
-    TIME_WINDOWS_UPPER[delivery] = delivery_lower + random.randint(5, 10)  # 設定delivery的上限
+from pdptw_instance import PDPTWInstance
+from pdptw_prune import prune_arcs
+from pdptw_construct import construct, to_vrpy_routes
+from pdptw_generate import paired_windows, random_matrix
+from pdptw_profile import Profiler, phase
+
+# Every phase below is timed, see the table at the end
+profiler = Profiler().start()
+
+with phase("instance generation"):
+    # PAIRS設定：假設要處理10對pickup-delivery任務
+    PAIRS = 40
+    # 固定亂數種子，方便重現同一組資料
+    SEED = 0
+    rng = np.random.default_rng(SEED)
+
+    # 生成隨機的距離矩陣，並確保對稱性（取上三角再鏡射，不用雙重迴圈）
+    DISTANCES = random_matrix(rng, PAIRS + 2, 10, 1000, symmetric=True)
+
+    # 隨機設定pickup-delivery對應的工作負荷
+    QUANTITIES = rng.integers(1, 5, size=PAIRS // 2)
+    pickups_deliveries = {(2 * i + 1, 2 * i + 2): int(q) for i, q in enumerate(QUANTITIES)}
+
+    # 載荷需求 pickup 隨機1-4, 對應的 delivery 是對應的負數
+    DEMAND = {}
+    for pickup, delivery in pickups_deliveries:
+        DEMAND[pickup] = pickups_deliveries[(pickup, delivery)]  # 正數代表取走的載荷
+        DEMAND[delivery] = -pickups_deliveries[(pickup, delivery)]  # 負數代表交付的載荷
+
+    # 生成時間窗口必須符合 (pickup, delivery)，pickup < delivery
+    # pickup 下限 0-10，delivery 下限晚 1-5，上限各自再加 5-10
+    lower, upper = paired_windows(rng, PAIRS // 2, start=(0, 10), delay=(1, 5), width=(5, 10))
+    TIME_WINDOWS_LOWER = dict(enumerate(lower.tolist(), start=1))
+    TIME_WINDOWS_UPPER = dict(enumerate(upper.tolist(), start=1))
 
 # 檢查結果
 print("Pickups and Deliveries:", pickups_deliveries)
@@ -54,30 +43,16 @@ print("Time Windows Lower Bound:", TIME_WINDOWS_LOWER)
 print("Time Windows Upper Bound:", TIME_WINDOWS_UPPER)
 
 
-# 設定節點的屬性（載荷和時間窗口）
-set_node_attributes(G, values=DEMAND, name="demand")
-set_node_attributes(G, values=TIME_WINDOWS_LOWER, name="lower")
-set_node_attributes(G, values=TIME_WINDOWS_UPPER, name="upper")
-
+# 距離矩陣、載荷、時間窗口與 pickup-delivery 對應存成 int32 陣列
+instance = PDPTWInstance.from_source_sink(
+    DISTANCES, demands=DEMAND, lower=TIME_WINDOWS_LOWER, upper=TIME_WINDOWS_UPPER, pairs=pickups_deliveries)
 
+# 轉換為DiGraph，depot 拆成 Source（只有 outgoing edges）和 Sink（只有 incoming edges）
+G = instance.to_vrpy_graph()
 
-
-# print(f"pickups_deliveries: {pickups_deliveries}")
-# print(f"TIME_WINDOWS_LOWER: {TIME_WINDOWS_LOWER}")
-# print(f"TIME_WINDOWS_UPPER: {TIME_WINDOWS_UPPER}")
-# print(f"DEMAND: {DEMAND}")
-
-for (u, v) in pickups_deliveries:
-    G.nodes[u]["request"] = v
-    G.nodes[u]["demand"] = pickups_deliveries[(u, v)]
-    G.nodes[v]["demand"] = -pickups_deliveries[(u, v)]
-
-# 確保Source節點沒有incoming edges，Sink節點沒有outgoing edges
-for u in list(G.predecessors("Source")):
-    G.remove_edge(u, "Source")
-
-for v in list(G.successors("Sink")):
-    G.remove_edge("Sink", v)
+# 移除不可能使用的 arcs（時間窗口、先後順序、載荷）
+pruned = prune_arcs(G, instance, load_capacity=5)
+print(f"Pruned arcs: {pruned}, remaining: {G.number_of_edges()}")
 
 # 設定時間窗口限制的檢查
 for (u, v) in pickups_deliveries:
@@ -88,7 +63,9 @@ start_time = time.time()
 # 設置VRP問題
 prob = VehicleRoutingProblem(G, load_capacity=5, num_stops=6, pickup_delivery=True)
 prob.time_windows = True
-prob.solve(cspy=False)  # 設定 time_limit 等其他參數
+# 用 regret insertion 建立初始路線，讓 column generation 從可行解開始
+routes, unrouted = construct(instance, load_capacity=5, num_stops=6)
+prob.solve(cspy=False, initial_routes=to_vrpy_routes(routes, instance, unrouted))  # 設定 time_limit 等其他參數
 
 # 計算完成時間
 end_time = time.time()
@@ -116,4 +93,10 @@ time_str += f"{seconds} sec"
 # 顯示結果
 print(f"Time taken: {time_str}")
 
+# Time per phase (graph building, pruning, vrpy master LP / pricing, ...), and
+# the same as a timeline for chrome://tracing
+profiler.stop()
+print(profiler.summary())
+profiler.export("pdptw_r.trace.json")
+
 
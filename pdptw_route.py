@@ -0,0 +1,272 @@
+import numpy as np
+
+from pdptw_instance import DEPOT
+
+INF = np.iinfo(np.int64).max // 4
+
+# Pieces of a route being checked by Route._feasible
+_NODE, _SEGMENT, _SUFFIX = range(3)
+
+
+def take(array, *index):
+    """array[index] as int64 (gathered from the int32 arrays first, then only that is widened)."""
+    return array[index].astype(np.int64)
+
+
+def service_durations(instance, nodes):
+    """Service time at each of nodes, zeros when the instance has none."""
+    if instance.service_times is None:
+        return np.zeros(np.shape(nodes), dtype=np.int64)
+    return take(instance.service_times, nodes)
+
+
+def travel_durations(instance, i, j):
+    """Travel time from each i to each j (broadcast), zeros when the instance has none."""
+    if instance.travel_times is None:
+        return np.zeros(np.broadcast_shapes(np.shape(i), np.shape(j)), dtype=np.int64)
+    return take(instance.travel_times, i, j)
+
+
+def _depot_upper(instance):
+    # vrpy treats an upper bound of 0 on the depot as "no limit"
+    upper = int(instance.upper[DEPOT])
+    return upper if upper > 0 else INF
+
+
+def schedule_bounds(nodes, instance):
+    """Earliest service start at each position and the latest start that keeps the rest feasible."""
+    travel = travel_durations(instance, nodes[:-1], nodes[1:])
+    service = service_durations(instance, nodes)
+    lower, upper = instance.lower[nodes].tolist(), instance.upper[nodes].tolist()
+    m = len(nodes)
+    earliest = np.empty(m, dtype=np.int64)
+    latest = np.empty(m, dtype=np.int64)
+    leg = (service[:-1] + travel).tolist()  # from position k to k + 1
+    earliest[0] = lower[0]
+    for k in range(1, m):
+        arrival = earliest[k - 1] + leg[k - 1]
+        earliest[k] = arrival if k == m - 1 else max(arrival, lower[k])
+    latest[-1] = _depot_upper(instance)
+    for k in range(m - 2, -1, -1):
+        bound = upper[k] if k else INF
+        latest[k] = min(bound, latest[k + 1] - leg[k])
+    return earliest, latest
+
+
+class _RangeQuery:
+    """Sparse table: min or max over any [a, b] in O(1) after O(m log m) preparation."""
+
+    def __init__(self, values, op):
+        self.pick = max if op is np.maximum else min
+        self.levels = [values.tolist()]
+        width, size = 1, len(values)
+        while 2 * width <= size:
+            values = op(values[:-width], values[width:])
+            self.levels.append(values.tolist())
+            width *= 2
+
+    def __call__(self, a, b):
+        k = (b - a + 1).bit_length() - 1
+        level = self.levels[k]
+        return self.pick(level[a], level[b - (1 << k) + 1])
+
+
+class Route:
+    """One route as [depot, stops..., depot] with the arrays that make move checks O(1).
+
+    Positions count from the leading depot. Per position k:
+      load[k]      load on board when leaving k
+      open[k]      pairs picked up but not yet delivered when leaving k
+      earliest[k]  earliest service start
+      latest[k]    latest service start that keeps the rest of the route feasible
+      wait[k]      waiting time before service at k (prefix sums in waited)
+    and a range minimum over the forward time slack, so a delay pushed into
+    any stretch of the route is checked in O(1) (Savelsbergh). Every check
+    splices at most a prefix, two new nodes, one untouched stretch and a
+    suffix. A stretch that ends up starting earlier than before is judged on
+    its original, later times, so a check can only err towards rejecting;
+    insertions under the triangle inequality never start anything earlier
+    and are exact.
+    Without time windows (time_windows=False) only loads and sizes count.
+    """
+
+    def __init__(self, stops, instance, time_windows=None):
+        if time_windows is None:
+            time_windows = instance.has_time_windows
+        self.instance = instance
+        self.stops = list(stops)
+        nodes = np.array([DEPOT] + self.stops + [DEPOT], dtype=np.int64)
+        self.nodes = nodes
+        demands = take(instance.demands, nodes)
+        self.load = np.cumsum(demands) - demands[0]
+        self.earliest = self.latest = None
+        if time_windows and instance.has_time_windows:
+            self.earliest, self.latest = schedule_bounds(nodes, instance)
+        self._prepared = False
+
+    def _prepare(self):
+        # The move check arrays, built on the first check only: insertion
+        # scans build many routes that are never checked move by move
+        instance, nodes = self.instance, self.nodes
+        self.open = np.cumsum(np.sign(take(instance.demands, nodes)))
+        self._max_load = _RangeQuery(self.load, np.maximum)
+        self._min_load = _RangeQuery(self.load, np.minimum)
+        if self.earliest is not None:
+            arrival = np.r_[self.earliest[0], self.earliest[:-1] + service_durations(instance, nodes[:-1])
+                            + travel_durations(instance, nodes[:-1], nodes[1:])]
+            self.wait = self.earliest - arrival
+            self.waited = np.cumsum(self.wait)
+            upper = take(instance.upper, nodes)
+            upper[0], upper[-1] = INF, _depot_upper(instance)
+            # Delay d at position b fits through c when d <= min(slack[b..c]) - waited[b]
+            self._min_slack = _RangeQuery(self.waited + upper - self.earliest, np.minimum)
+            self._lower = instance.lower.tolist()
+            self._upper = instance.upper.tolist()
+            self._service_times = None if instance.service_times is None else instance.service_times.tolist()
+            self._earliest = self.earliest.tolist()
+            self._latest = self.latest.tolist()
+            self._waited = self.waited.tolist()
+        self._nodes = nodes.tolist()
+        self._open = self.open.tolist()
+        self._prepared = True
+
+    def __len__(self):
+        return len(self.stops)
+
+    def cost(self):
+        return int(take(self.instance.distances, self.nodes[:-1], self.nodes[1:]).sum())
+
+    # Time checks
+
+    def _leave(self, start, row):
+        service = 0 if self._service_times is None else self._service_times[row]
+        return start + service
+
+    def _arrive(self, start, row, to):
+        travel = self.instance.travel_times
+        return self._leave(start, row) + (0 if travel is None else int(travel[row, to]))
+
+    def _feasible(self, prefix_end, pieces, tail=None):
+        """Checks the route prefix [0..prefix_end] followed by pieces.
+
+        A piece is (_NODE, row) for a new stop, (_SEGMENT, b, c) for the
+        original positions b..c, or (_SUFFIX, e) for the original positions e
+        up to the closing depot, of tail when given (2-opt*).
+        """
+        if self.earliest is None:
+            return True
+        tail = tail or self
+        start, row = self._earliest[prefix_end], self._nodes[prefix_end]
+        for piece in pieces:
+            if piece[0] == _NODE:
+                new = piece[1]
+                start = max(self._arrive(start, row, new), self._lower[new])
+                if start > self._upper[new]:
+                    return False
+                row = new
+            elif piece[0] == _SEGMENT:
+                b, c = piece[1], piece[2]
+                nodes = self._nodes
+                arrival = self._arrive(start, row, nodes[b])
+                delay = max(arrival, self._lower[nodes[b]]) - self._earliest[b]
+                if delay > 0:
+                    if delay > self._min_slack(b, c) - self._waited[b]:
+                        return False
+                    delay = max(delay - (self._waited[c] - self._waited[b]), 0)
+                start, row = self._earliest[c] + max(delay, 0), nodes[c]
+            else:
+                e = piece[1]
+                arrival = self._arrive(start, row, tail._nodes[e])
+                start = arrival if e == len(tail._nodes) - 1 else max(arrival, self._lower[tail._nodes[e]])
+                return start <= tail._latest[e]
+        return True
+
+    # Load checks
+
+    def _load_fits(self, spans, load_capacity, loads=()):
+        # Whether the original loads with add on each (first, last, add) span of
+        # positions, and the new stop loads, all stay in [0, load_capacity]
+        low, high = min(loads, default=0), max(loads, default=0)
+        for first, last, add in spans:
+            if add and first <= last:
+                low = min(low, self._min_load(first, last) + add)
+                high = max(high, self._max_load(first, last) + add)
+        return low >= 0 and (load_capacity is None or high <= load_capacity)
+
+    # Moves
+
+    def can_insert(self, pickup, delivery, i, j, load_capacity=None, num_stops=None):
+        """Whether the pickup can go after position i and the delivery after position j >= i."""
+        self._prepared or self._prepare()
+        if num_stops is not None and len(self.stops) + 2 > num_stops:
+            return False
+        # The pickup demand rides over positions i..j, the pair's net demand
+        # from the delivery to the end
+        demands = self.instance.demands
+        quantity = int(demands[pickup])
+        net = quantity + int(demands[delivery])
+        last = len(self._nodes) - 2
+        if not self._load_fits([(i, j, quantity), (j + 1, last, net)], load_capacity, [int(self.load[j]) + net]):
+            return False
+        if i == j:
+            return self._feasible(i, [(_NODE, pickup), (_NODE, delivery), (_SUFFIX, i + 1)])
+        return self._feasible(i, [(_NODE, pickup), (_SEGMENT, i + 1, j), (_NODE, delivery), (_SUFFIX, j + 1)])
+
+    def insert_cost(self, pickup, delivery, i, j):
+        """Distance added by ``can_insert``'s move."""
+        self._prepared or self._prepare()
+        dist = self.instance.distances
+        a, b = self._nodes[i], self._nodes[i + 1]
+        if i == j:
+            return int(dist[a, pickup]) + int(dist[pickup, delivery]) + int(dist[delivery, b]) - int(dist[a, b])
+        c, e = self._nodes[j], self._nodes[j + 1]
+        return (int(dist[a, pickup]) + int(dist[pickup, b]) - int(dist[a, b])
+                + int(dist[c, delivery]) + int(dist[delivery, e]) - int(dist[c, e]))
+
+    def can_remove(self, p, d):
+        """Whether the stops at positions p < d (one pair) can be taken out."""
+        self._prepared or self._prepare()
+        if d == p + 1:
+            return self._feasible(p - 1, [(_SUFFIX, d + 1)])
+        return self._feasible(p - 1, [(_SEGMENT, p + 1, d - 1), (_SUFFIX, d + 1)])
+
+    def can_replace(self, p, d, pickup, delivery, load_capacity=None):
+        """Whether the pair at positions p < d can be swapped for another pair in the same positions."""
+        self._prepared or self._prepare()
+        # The pickup change rides over positions p..d-1, the change in the pair's
+        # net demand from the delivery to the end
+        demands = self.instance.demands
+        change = int(demands[pickup]) - int(demands[self._nodes[p]])
+        net = change + int(demands[delivery]) - int(demands[self._nodes[d]])
+        if not self._load_fits([(p, d - 1, change), (d, len(self._nodes) - 2, net)], load_capacity):
+            return False
+        if d == p + 1:
+            return self._feasible(p - 1, [(_NODE, pickup), (_NODE, delivery), (_SUFFIX, d + 1)])
+        return self._feasible(p - 1, [(_NODE, pickup), (_SEGMENT, p + 1, d - 1), (_NODE, delivery), (_SUFFIX, d + 1)])
+
+
+def can_relocate(source, p, d, target, i, j, load_capacity=None, num_stops=None):
+    """Whether the pair at positions p < d of source can move to target, after positions i and j there."""
+    pickup, delivery = int(source.nodes[p]), int(source.nodes[d])
+    return source.can_remove(p, d) and target.can_insert(pickup, delivery, i, j, load_capacity, num_stops)
+
+
+def can_exchange(first, p, d, second, q, e, load_capacity=None):
+    """Whether pair (p, d) of first and pair (q, e) of second can trade places."""
+    return (first.can_replace(p, d, int(second.nodes[q]), int(second.nodes[e]), load_capacity)
+            and second.can_replace(q, e, int(first.nodes[p]), int(first.nodes[d]), load_capacity))
+
+
+def can_two_opt_star(first, i, second, j, num_stops=None):
+    """Whether first[..i] + second[j+1..] and second[..j] + first[i+1..] are both feasible.
+
+    Only cuts with no pair open on either side keep pairs on one route, so
+    loads after the cut are unchanged and only time and sizes need checking.
+    """
+    first._prepared or first._prepare()
+    second._prepared or second._prepare()
+    if first._open[i] or second._open[j]:
+        return False
+    if num_stops is not None and (i + len(second) - j > num_stops or j + len(first) - i > num_stops):
+        return False
+    return first._feasible(i, [(_SUFFIX, j + 1)], second) and second._feasible(j, [(_SUFFIX, i + 1)], first)
@@ -0,0 +1,284 @@
+import asyncio
+import collections
+import functools
+import multiprocessing
+import time
+
+import numpy as np
+
+from pdptw_construct import construct, ortools_initial_assignment, route_feasible, to_vrpy_routes
+from pdptw_instance import DEPOT, PDPTWInstance
+from pdptw_profile import phase
+
+SOLVERS = ("ortools", "vrpy", "alns")
+
+# One improving solution: total distance, routes as {vehicle: ['Source', ..., 'Sink']}
+# (vrpy ``best_routes``), seconds since solve() was called and who found it
+Incumbent = collections.namedtuple("Incumbent", "objective routes elapsed solver")
+
+
+class Incumbents:
+    """Keeps the best solution so far and reports every strict improvement."""
+
+    def __init__(self, instance, on_solution):
+        self.instance = instance
+        self.on_solution = on_solution
+        self.start_time = time.perf_counter()
+        self.best = None
+
+    def elapsed(self):
+        return time.perf_counter() - self.start_time
+
+    def offer(self, objective, routes, solver):
+        """routes are lists of instance rows or vrpy ``best_routes``."""
+        if self.best is not None and objective >= self.best.objective:
+            return False
+        if not isinstance(routes, dict):
+            routes = dict(enumerate(to_vrpy_routes(routes, self.instance, singles=False), start=1))
+        self.best = Incumbent(int(objective), routes, self.elapsed(), solver)
+        if self.on_solution is not None:
+            self.on_solution(self.best)
+        return True
+
+
+def without_windows(instance):
+    """The same instance with its time windows dropped."""
+    return PDPTWInstance(instance.distances, instance.travel_times, instance.demands, pairs=instance.pairs,
+                         node_ids=instance.node_ids, service_times=instance.service_times,
+                         coordinates=instance.coordinates)
+
+
+def total_distance(instance, routes):
+    """Distance of routes given as lists of instance rows, depot to depot."""
+    return sum(int(instance.distances[[DEPOT] + route, route + [DEPOT]].sum()) for route in routes if route)
+
+
+def feasible_routes(instance, routes, unrouted, load_capacity=None, num_stops=None):
+    """Keeps the routes that pass ``route_feasible`` and the stop limit, the pairs of the others join unrouted."""
+    pair_of = {pickup: (pickup, delivery) for pickup, delivery in instance.pairs.tolist()}
+    kept, unrouted = [], list(unrouted)
+    for route in routes:
+        if route_feasible(route, instance, load_capacity) and (num_stops is None or len(route) <= num_stops):
+            kept.append(route)
+        else:
+            unrouted += [pair_of[row] for row in route if row in pair_of]
+    return kept, unrouted
+
+
+def solve_ortools(instance, routes, remaining, incumbents, load_capacity, num_stops, num_vehicles,
+                  first_solution="PARALLEL_CHEAPEST_INSERTION", metaheuristic="GUIDED_LOCAL_SEARCH", should_stop=None,
+                  solution_limit=None):
+    """Runs one OR-Tools search for remaining seconds, offering every solution to incumbents.
+
+    Starts from routes (lists of instance rows) when given, else from
+    first_solution, a FirstSolutionStrategy name. should_stop() is polled by
+    the search and ends it when it returns True. Building the model counts
+    against remaining.
+    """
+    from ortools.constraint_solver import pywrapcp, routing_enums_pb2
+
+    start_time = time.perf_counter()
+
+    if num_vehicles is None:
+        num_vehicles = max(instance.num_pairs, len(routes), 1)
+    if load_capacity is None:
+        load_capacity = int(instance.demands.clip(min=0).sum())
+    manager, routing = instance.to_ortools(num_vehicles, load_capacity)
+    if num_stops is not None:
+        visits = np.ones(instance.num_nodes, dtype=np.int64)
+        visits[DEPOT] = 0
+        stops_index = routing.RegisterUnaryTransitVector(visits.tolist())
+        routing.AddDimension(stops_index, 0, num_stops, True, "Stops")
+
+    def report():
+        solution = []
+        for vehicle_id in range(routing.vehicles()):
+            index = routing.NextVar(routing.Start(vehicle_id)).Value()
+            route = []
+            while not routing.IsEnd(index):
+                route.append(manager.IndexToNode(index))
+                index = routing.NextVar(index).Value()
+            if route:
+                solution.append(route)
+        incumbents.offer(routing.CostVar().Max(), solution, "ortools")
+
+    routing.AddAtSolutionCallback(report)
+    if should_stop is not None:
+        routing.AddSearchMonitor(routing.solver().CustomLimit(should_stop))
+    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
+    search_parameters.first_solution_strategy = getattr(routing_enums_pb2.FirstSolutionStrategy, first_solution)
+    search_parameters.local_search_metaheuristic = getattr(routing_enums_pb2.LocalSearchMetaheuristic, metaheuristic)
+    search_parameters.time_limit.FromMilliseconds(max(int(remaining * 1000), 1))
+    if solution_limit is not None:
+        search_parameters.solution_limit = solution_limit
+
+    initial_solution = None
+    if routes and len(routes) <= num_vehicles:
+        initial_solution = ortools_initial_assignment(routes, manager, routing, search_parameters)
+    # What is left once the model and the start are built
+    remaining -= time.perf_counter() - start_time
+    search_parameters.time_limit.FromMilliseconds(max(int(remaining * 1000), 1))
+    if initial_solution is not None:
+        routing.SolveFromAssignmentWithParameters(initial_solution, search_parameters)
+    else:
+        routing.SolveWithParameters(search_parameters)
+
+
+def _vrpy_child(conn, instance, routes, unrouted, load_capacity, num_stops, num_vehicles, first_iterations,
+                iterations=False):
+    from vrpy import VehicleRoutingProblem
+    from pdptw_prune import prune_arcs
+    from pdptw_telemetry import watch_vrpy
+    from pdptw_validate import routes_from_vrpy
+
+    # Column generation cut short by vrpy's own time_limit can fail inside the
+    # pricing problem ("Source is not in G"), so the child runs rounds with a
+    # doubling max_iter instead, each warm-started from the last answer, and
+    # sends every answer. It is killed when the deadline passes.
+    max_iter = first_iterations
+    try:
+        while True:
+            G = instance.to_vrpy_graph()
+            prune_arcs(G, instance, load_capacity=load_capacity)
+            prob = VehicleRoutingProblem(G, load_capacity=load_capacity, num_stops=num_stops,
+                                         num_vehicles=num_vehicles, pickup_delivery=True)
+            prob.time_windows = instance.has_time_windows
+            if iterations:
+                watch_vrpy(prob, conn.send)
+            prob.solve(cspy=False, initial_routes=to_vrpy_routes(routes, instance, unrouted), max_iter=max_iter)
+            conn.send((prob.best_value, prob.best_routes))
+            if prob._iteration < max_iter:
+                break  # no more columns, this was the column generation optimum
+            routes, unrouted = routes_from_vrpy(prob.best_routes, instance), ()
+            max_iter *= 2
+    except Exception as e:
+        # vrpy reports a master problem with no feasible plan as a bare Exception,
+        # that is no answer rather than a failure
+        if str(e) != "problem Infeasible":
+            conn.send(e)
+    conn.send(None)
+    conn.close()
+
+
+def _solve_vrpy(instance, routes, unrouted, remaining, incumbents, load_capacity, num_stops, num_vehicles,
+                first_iterations=10, on_iteration=None):
+    from pdptw_telemetry import Iteration
+
+    context = multiprocessing.get_context("spawn")
+    parent_conn, child_conn = context.Pipe(duplex=False)
+    process = context.Process(target=_vrpy_child, args=(
+        child_conn, instance, routes, unrouted, load_capacity, num_stops, num_vehicles, first_iterations,
+        on_iteration is not None))
+    deadline = time.perf_counter() + remaining
+    process.start()
+    child_conn.close()
+    error = None
+    try:
+        while parent_conn.poll(max(deadline - time.perf_counter(), 0)):
+            result = parent_conn.recv()
+            if isinstance(result, Exception):
+                error = result
+                break
+            if result is None:
+                break
+            if isinstance(result, Iteration):
+                # Timed here, on the same clock as the incumbents
+                on_iteration(result._replace(elapsed=incumbents.elapsed()))
+            elif result[0] is not None:
+                incumbents.offer(result[0], result[1], "vrpy")
+    except EOFError:
+        pass  # the child died without an answer
+    finally:
+        process.kill()
+        process.join()
+    if error is not None:
+        # A failure in vrpy, pruning or the graph must not pass for "nothing better found"
+        raise error
+
+
+def _solve_alns(instance, routes, remaining, incumbents, load_capacity, num_stops, num_vehicles, seed):
+    from pdptw_alns import ALNS
+
+    start_time = time.perf_counter()
+    prob = ALNS(instance, load_capacity=load_capacity, num_stops=num_stops, num_vehicles=num_vehicles,
+                time_windows=instance.has_time_windows, seed=seed)
+    prob.solve(time_limit=remaining - (time.perf_counter() - start_time), initial_routes=routes,
+               on_improvement=lambda value, best_routes: incumbents.offer(value, best_routes, "alns"))
+
+
+def solve(instance, solver="ortools", time_limit=60, load_capacity=None, num_stops=None, num_vehicles=None,
+          time_windows=None, on_solution=None, seed=None, on_iteration=None):
+    """Solves within time_limit seconds and returns the best ``Incumbent`` (None if nothing was found).
+
+    A regret insertion construction goes first and is the first incumbent
+    (when it places every pair on feasible routes), then ``solver`` searches
+    from it for the rest of the time. on_solution(incumbent) is called with
+    every strictly improving solution as soon as it is found: each OR-Tools
+    solution, each new ALNS best, and the answer of each vrpy round (vrpy
+    runs column generation with a doubling iteration cap, warm-started from
+    the last round). on_iteration(iteration) is called with a
+    ``pdptw_telemetry.Iteration`` after every vrpy column generation
+    iteration. time_windows=False solves without the instance's windows.
+    vrpy runs in a spawned process, so scripts calling it need an
+    ``if __name__ == '__main__':`` guard. An error inside that process is
+    raised here.
+
+    time_limit is a deadline for the whole call: construction, model
+    building and process start-up count against it. A construction cut short
+    by the deadline leaves nothing to return (on large instances it takes
+    seconds at 1000 pairs and about a minute at 2000).
+    """
+    if solver not in SOLVERS:
+        raise ValueError(f"Unknown solver {solver!r}, expected one of {SOLVERS}")
+    if time_windows is None:
+        time_windows = instance.has_time_windows
+    if not time_windows and instance.has_time_windows:
+        instance = without_windows(instance)
+    incumbents = Incumbents(instance, on_solution)
+
+    routes, unrouted = construct(instance, load_capacity, num_stops, num_vehicles,
+                                 deadline=incumbents.start_time + time_limit)
+    # Only a feasible construction may be an incumbent or a starting point: an
+    # infeasible but cheaper one would shut out every feasible solver answer
+    routes, unrouted = feasible_routes(instance, routes, unrouted, load_capacity, num_stops)
+    if not unrouted:
+        incumbents.offer(total_distance(instance, routes), routes, "construct")
+    remaining = time_limit - incumbents.elapsed()
+    if remaining <= 0:
+        return incumbents.best
+
+    with phase(f"{solver}/search"):
+        if solver == "ortools":
+            solve_ortools(instance, routes, remaining, incumbents, load_capacity, num_stops, num_vehicles)
+        elif solver == "vrpy":
+            _solve_vrpy(instance, routes, unrouted, remaining, incumbents, load_capacity, num_stops, num_vehicles,
+                        on_iteration=on_iteration)
+        else:
+            _solve_alns(instance, routes, remaining, incumbents, load_capacity, num_stops, num_vehicles, seed)
+    return incumbents.best
+
+
+async def stream(instance, solver="ortools", time_limit=60, **options):
+    """``solve`` as an async iterator of improving incumbents.
+
+    The solve runs in the default executor, so the event loop stays free while
+    it searches. Leaving the loop early does not stop the search before its
+    deadline.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    finished = object()
+
+    def publish(incumbent):
+        loop.call_soon_threadsafe(queue.put_nowait, incumbent)
+
+    future = loop.run_in_executor(
+        None, functools.partial(solve, instance, solver, time_limit, on_solution=publish, **options))
+    # Runs on the loop after every publish() of the solve thread, so it comes last
+    future.add_done_callback(lambda _: queue.put_nowait(finished))
+    while True:
+        incumbent = await queue.get()
+        if incumbent is finished:
+            break
+        yield incumbent
+    await future
@@ -0,0 +1,165 @@
+import collections
+import json
+import time
+
+# One column generation iteration of vrpy: seconds since the telemetry started,
+# iteration number, objective of the restricted master LP, columns in the master
+# after the iteration and seconds spent pricing (the rest went to the master LP)
+Iteration = collections.namedtuple("Iteration", "elapsed iteration master_objective columns pricing_time")
+
+# One improving solution: seconds since the telemetry started, objective and who found it
+Solution = collections.namedtuple("Solution", "elapsed objective solver")
+
+
+def watch_vrpy(prob, on_iteration, clock=time.perf_counter):
+    """Calls on_iteration(Iteration) after every column generation iteration of prob.
+
+    Wraps the methods of this VehicleRoutingProblem object only (vrpy has no
+    callback of its own), so it has to be called before prob.solve(). The
+    elapsed time is clock() at the end of the iteration.
+    """
+    find_columns = prob._find_columns
+    master_time = [0.0]
+    watched = [None]
+
+    def timed_master(solve):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return solve(*args, **kwargs)
+            finally:
+                master_time[0] += time.perf_counter() - start
+        return wrapper
+
+    def wrapper():
+        # The master problem only exists once vrpy has initialised, and is new every solve
+        if watched[0] is not prob.masterproblem:
+            watched[0] = prob.masterproblem
+            prob.masterproblem.solve = timed_master(prob.masterproblem.solve)
+        start, master_time[0] = time.perf_counter(), 0.0
+        find_columns()
+        pricing_time = time.perf_counter() - start - master_time[0]
+        master_objective = prob._lower_bound[-1] if prob._lower_bound else None
+        on_iteration(Iteration(clock(), prob._iteration, master_objective, len(prob._routes), pricing_time))
+
+    prob._find_columns = wrapper
+
+
+def solution_curve(records):
+    """The improving (elapsed, objective) steps of Solution or Iteration records, in time order."""
+    curve = []
+    for record in sorted(records, key=lambda record: record.elapsed):
+        objective = record.objective if isinstance(record, Solution) else record.master_objective
+        if objective is not None and (not curve or objective < curve[-1][1]):
+            curve.append((record.elapsed, objective))
+    return curve
+
+
+def _gap(objective, reference):
+    # Primal gap in [0, 1] (Berthold): 0 at the reference, 1 with no solution or opposite signs
+    if objective is None:
+        return 1.0
+    if objective == reference:
+        return 0.0
+    if objective * reference < 0:
+        return 1.0
+    return abs(objective - reference) / max(abs(objective), abs(reference))
+
+
+def primal_integral(curve, horizon, reference=None):
+    """Integral of the primal gap over [0, horizon] seconds, for an (elapsed, objective) curve.
+
+    The gap is 1 until the first solution, so finding good solutions early
+    scores low. reference defaults to the best objective of the curve; pass a
+    best known value to compare runs. Divide by horizon for the average gap.
+    """
+    if reference is None:
+        reference = min((objective for _, objective in curve), default=None)
+    total, previous_time, objective = 0.0, 0.0, None
+    for elapsed, value in curve:
+        if elapsed >= horizon:
+            break
+        total += _gap(objective, reference) * (elapsed - previous_time)
+        previous_time, objective = elapsed, value
+    return total + _gap(objective, reference) * max(horizon - previous_time, 0.0)
+
+
+def time_to_within(curve, fraction, reference=None):
+    """First elapsed time at which the curve is within fraction (0.01 = 1%) of reference, or None."""
+    if reference is None:
+        reference = min((objective for _, objective in curve), default=None)
+    for elapsed, objective in curve:
+        if objective <= reference + fraction * abs(reference):
+            return elapsed
+    return None
+
+
+class Telemetry:
+    """Structured convergence records of a run, and the metrics derived from them.
+
+    ``on_solution`` takes the ``Incumbent`` of ``pdptw_solve.solve``
+    (or anything with objective and solver), ``on_iteration`` the vrpy
+    ``Iteration`` records of ``solve(..., on_iteration=...)`` or
+    ``watch_vrpy``, and ``watch_ortools`` records the improving solutions of a
+    RoutingModel solved directly. Times are seconds since the Telemetry was
+    created.
+    """
+
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.solutions = []
+        self.iterations = []
+
+    def elapsed(self):
+        return time.perf_counter() - self.start_time
+
+    def on_solution(self, incumbent):
+        self.solutions.append(Solution(self.elapsed(), incumbent.objective, incumbent.solver))
+
+    def on_iteration(self, iteration):
+        self.iterations.append(iteration._replace(elapsed=self.elapsed()))
+
+    def watch_vrpy(self, prob):
+        watch_vrpy(prob, self.iterations.append, clock=self.elapsed)
+
+    def watch_ortools(self, routing, solver="ortools"):
+        """Records every improving solution of the RoutingModel (call before solving)."""
+        def record():
+            objective = routing.CostVar().Max()
+            if not self.solutions or objective < self.solutions[-1].objective:
+                self.solutions.append(Solution(self.elapsed(), objective, solver))
+        routing.AddAtSolutionCallback(record)
+
+    def metrics(self, horizon=None, reference=None, within=(0.01, 0.05, 0.10)):
+        """Primal integral and time to within each fraction of reference, for the solutions and the master LP.
+
+        horizon defaults to the time of the last record. Returns a dict with
+        "solutions" and "master" entries (the latter only with iterations).
+        """
+        if horizon is None:
+            horizon = max((record.elapsed for record in self.solutions + self.iterations), default=0.0)
+        out = {}
+        for name, records in (("solutions", self.solutions), ("master", self.iterations)):
+            curve = solution_curve(records)
+            if not curve:
+                continue
+            best = reference if reference is not None and name == "solutions" else min(v for _, v in curve)
+            out[name] = {
+                "final": curve[-1][1],
+                "primal_integral": primal_integral(curve, horizon, best),
+                "average_gap": primal_integral(curve, horizon, best) / horizon if horizon > 0 else 0.0,
+                "time_to_within": {f"{fraction:.0%}": time_to_within(curve, fraction, best) for fraction in within},
+            }
+        return out
+
+    def records(self):
+        """All records as dicts, in time order, each with a "kind" of "solution" or "iteration"."""
+        rows = [dict(record._asdict(), kind="solution") for record in self.solutions]
+        rows += [dict(record._asdict(), kind="iteration") for record in self.iterations]
+        return sorted(rows, key=lambda row: row["elapsed"])
+
+    def export(self, path):
+        """Writes ``records()`` as JSON lines to path."""
+        with open(path, "w") as f:
+            for row in self.records():
+                f.write(json.dumps(row) + "\n")
@@ -0,0 +1,173 @@
+import numpy as np
+
+from pdptw_instance import DEPOT
+
+PAD = -1
+
+
+def routes_from_vrpy(best_routes, instance):
+    """vrpy ``best_routes`` ({vehicle: ['Source', ..., 'Sink']}) as lists of instance rows."""
+    row_of = {node: row for row, node in enumerate(instance.node_ids.tolist())}
+    return [[row_of[node] for node in route[1:-1]] for route in best_routes.values()]
+
+
+def routes_from_ortools(manager, routing, solution):
+    """The routes of an OR-Tools assignment as lists of nodes, one per vehicle (empty ones skipped)."""
+    routes = []
+    for vehicle_id in range(routing.vehicles()):
+        index = solution.Value(routing.NextVar(routing.Start(vehicle_id)))
+        route = []
+        while not routing.IsEnd(index):
+            route.append(manager.IndexToNode(index))
+            index = solution.Value(routing.NextVar(index))
+        if route:
+            routes.append(route)
+    return routes
+
+
+def pack(solutions):
+    """Packs solutions (each a list of routes of rows) into padded arrays.
+
+    Returns (stops, owner): stops is (R, L) with PAD after the end of each
+    route and owner[r] is the solution route r belongs to.
+    """
+    routes = [route for solution in solutions for route in solution]
+    owner = np.repeat(np.arange(len(solutions)), [len(solution) for solution in solutions])
+    length = max((len(route) for route in routes), default=0)
+    stops = np.full((len(routes), length), PAD, dtype=np.int64)
+    for r, route in enumerate(routes):
+        stops[r, :len(route)] = route
+    return stops, owner
+
+
+class Validation:
+    """Result of ``validate_batch``, one entry per solution unless noted.
+
+    cost:        total distance, depot to depot
+    feasible:    True when no constraint is violated
+    missing, repeated, split_pairs, precedence, overloaded, late, too_long, too_many:
+                 number of violations of each kind
+    Per route (R, L) arrays, aligned with ``stops``: load after each stop and
+    service start time at each stop (-1 on padding).
+    """
+
+    CHECKS = ("missing", "repeated", "split_pairs", "precedence", "overloaded", "late", "too_long", "too_many")
+
+    def __init__(self, stops, owner, **fields):
+        self.stops = stops
+        self.owner = owner
+        for name, value in fields.items():
+            setattr(self, name, value)
+        self.feasible = ~np.any([getattr(self, name) > 0 for name in self.CHECKS], axis=0)
+
+    def __len__(self):
+        return len(self.cost)
+
+    def errors(self, k):
+        """Violation counts of solution k as readable strings."""
+        return [f"{name.replace('_', ' ')}: {int(getattr(self, name)[k])}"
+                for name in self.CHECKS if getattr(self, name)[k]]
+
+    def route_rows(self, k):
+        """Indices into ``stops`` of the routes of solution k."""
+        return np.flatnonzero(self.owner == k)
+
+
+def validate_batch(instance, solutions, load_capacity=None, num_stops=None, num_vehicles=None, time_windows=None):
+    """Checks many solutions of one instance at once.
+
+    solutions is a list of solutions, each a list of routes given as instance
+    rows without the depot (see ``routes_from_vrpy`` / ``routes_from_ortools``).
+    Every customer has to be visited exactly once, each pair on one route with
+    the pickup first, the load has to stay within [0, load_capacity], every
+    stop has to start service before its upper time window (waiting is
+    allowed), and routes / fleet must respect num_stops / num_vehicles.
+    time_windows defaults to whether the instance has them.
+
+    Everything is computed over padded (routes, stops) arrays; the schedule is
+    the only part that runs stop position by stop position, for all routes at
+    once.
+    """
+    stops, owner = pack(solutions)
+    count, n = len(solutions), instance.num_nodes
+    valid = stops != PAD
+    at = np.where(valid, stops, DEPOT)
+    lengths = valid.sum(axis=1)
+
+    # Cost: depot -> first stop, stop -> stop, last stop -> depot (padding acts as the depot)
+    previous = np.concatenate((np.full((len(stops), 1), DEPOT), at), axis=1)
+    following = np.concatenate((at, np.full((len(stops), 1), DEPOT)), axis=1)
+    arc_cost = instance.distances[previous, following]
+    arc_cost[(np.arange(stops.shape[1] + 1)[None, :] > lengths[:, None]) | (lengths[:, None] == 0)] = 0
+    cost = np.bincount(owner, weights=arc_cost.sum(axis=1), minlength=count)
+
+    # Coverage: visits per (solution, node)
+    visits = np.zeros((count, n), dtype=np.int64)
+    np.add.at(visits, (np.broadcast_to(owner[:, None], stops.shape)[valid], stops[valid]), 1)
+    customers = visits[:, 1:]
+    missing = (customers == 0).sum(axis=1)
+    repeated = (customers > 1).sum(axis=1) + visits[:, DEPOT]
+
+    # Pairs: route and position of every node in its solution
+    route_of = np.full((count, n), PAD, dtype=np.int64)
+    position = np.full((count, n), PAD, dtype=np.int64)
+    route_index = np.broadcast_to(np.arange(len(stops))[:, None], stops.shape)
+    column = np.broadcast_to(np.arange(stops.shape[1])[None, :], stops.shape)
+    solution_index = np.broadcast_to(owner[:, None], stops.shape)
+    route_of[solution_index[valid], stops[valid]] = route_index[valid]
+    position[solution_index[valid], stops[valid]] = column[valid]
+    pickups, deliveries = instance.pairs[:, 0], instance.pairs[:, 1]
+    served = (route_of[:, pickups] != PAD) & (route_of[:, deliveries] != PAD)
+    split_pairs = (served & (route_of[:, pickups] != route_of[:, deliveries])).sum(axis=1)
+    precedence = (served & (route_of[:, pickups] == route_of[:, deliveries])
+                  & (position[:, pickups] > position[:, deliveries])).sum(axis=1)
+
+    # Load profile
+    load = np.cumsum(np.where(valid, instance.demands[at], 0), axis=1)
+    bad_load = valid & (load < 0)
+    if load_capacity is not None:
+        bad_load |= valid & (load > load_capacity)
+    overloaded = np.bincount(owner, weights=bad_load.any(axis=1), minlength=count).astype(np.int64)
+
+    # Schedule: service start times, stop position by stop position
+    if time_windows is None:
+        time_windows = instance.has_time_windows
+    start = np.full(stops.shape, PAD, dtype=np.int64)
+    late = np.zeros(count, dtype=np.int64)
+    if time_windows:
+        travel = instance.travel_times if instance.travel_times is not None else np.zeros_like(instance.distances)
+        service = instance.service_times if instance.service_times is not None else np.zeros(n, dtype=np.int32)
+        lower, upper = instance.lower.astype(np.int64), instance.upper.astype(np.int64)
+        clock = np.full(len(stops), lower[DEPOT], dtype=np.int64)
+        here = np.full(len(stops), DEPOT, dtype=np.int64)
+        late_stop = np.zeros(stops.shape, dtype=bool)
+        for k in range(stops.shape[1]):
+            active = valid[:, k]
+            arrival = clock + service[here] + travel[here, at[:, k]]
+            begin = np.maximum(arrival, lower[at[:, k]])
+            start[:, k] = np.where(active, begin, PAD)
+            late_stop[:, k] = active & (begin > upper[at[:, k]])
+            clock = np.where(active, begin, clock)
+            here = np.where(active, at[:, k], here)
+        back = clock + service[here] + travel[here, DEPOT]
+        # vrpy treats an upper bound of 0 on the depot as "no limit"
+        late_back = (back > upper[DEPOT]) if upper[DEPOT] > 0 else np.zeros(len(stops), dtype=bool)
+        late = np.bincount(owner, weights=late_stop.sum(axis=1) + late_back, minlength=count).astype(np.int64)
+
+    too_long = np.zeros(count, dtype=np.int64)
+    if num_stops is not None:
+        too_long = np.bincount(owner, weights=lengths > num_stops, minlength=count).astype(np.int64)
+    routes_used = np.bincount(owner, weights=lengths > 0, minlength=count).astype(np.int64)
+    too_many = np.zeros(count, dtype=np.int64)
+    if num_vehicles is not None:
+        too_many = np.maximum(routes_used - num_vehicles, 0)
+
+    return Validation(
+        stops, owner, cost=cost.astype(np.int64), missing=missing, repeated=repeated, split_pairs=split_pairs,
+        precedence=precedence, overloaded=overloaded, late=late, too_long=too_long, too_many=too_many,
+        routes_used=routes_used, load=np.where(valid, load, PAD), start=start)
+
+
+def validate(instance, routes, **kwargs):
+    """``validate_batch`` for a single solution (a list of routes)."""
+    return validate_batch(instance, [routes], **kwargs)
@@ -1,9 +1,14 @@
 import time
 import random
-import networkx as nx
-from numpy import array
+import functools
+from concurrent.futures import ProcessPoolExecutor
 from vrpy import VehicleRoutingProblem
-import matplotlib.pyplot as plt
+from pdptw_cache import SolutionCache, solution_key
+from pdptw_instance import PDPTWInstance
+from pdptw_interval import PairIntervalIndex
+from pdptw_plot import draw_routes
+from pdptw_pool import RoutePool
+from pdptw_profile import Profiler, current_profiler, phase
 
 # Number of pairs (pickup and delivery)
 PAIRS = 10
@@ -14,43 +19,8 @@ DISTANCES = [[0 if i == j else random.randint(10, 1000) for j in range(PAIRS + 2
 # Randomly generate demands (pickup positive, delivery negative)
 DEMAND = {i: random.randint(1, 5) if i % 2 == 1 else -random.randint(1, 5) for i in range(1, PAIRS + 1)}
 
-# Create the graph G from the distance matrix
-A = array(DISTANCES, dtype=[("cost", int)])
-G = nx.from_numpy_array(A, create_using=nx.DiGraph())
-
-# Relabel Source and Sink
-G = nx.relabel_nodes(G, {0: "Source", PAIRS + 1: "Sink"})
-
-# Set node attributes (demands)
-nx.set_node_attributes(G, values=DEMAND, name="demand")
-
-def draw_graph_with_time_windows(G):
-    pos = nx.spring_layout(G)  # Use spring layout for better node placement
-    plt.figure(figsize=(10, 8))
-    
-    # Draw nodes and labels
-    nx.draw_networkx_nodes(G, pos, node_size=600, node_color='lightblue')
-    nx.draw_networkx_labels(G, pos, labels={i: f"{i}" for i in G.nodes})
-    
-    # Draw edges
-    nx.draw_networkx_edges(G, pos, edgelist=G.edges(), arrowstyle='->', arrowsize=20, edge_color='gray')
-    
-    # Annotate time windows on nodes
-    for node, (x, y) in pos.items():
-        lower = G.nodes[node].get("lower")
-        upper = G.nodes[node].get("upper")
-        if lower and upper:
-            lower_time = f"{lower // 3600}:{(lower % 3600) // 60:02d}"  # Convert from seconds to HH:MM
-            upper_time = f"{upper // 3600}:{(upper % 3600) // 60:02d}"
-            plt.text(x, y - 0.1, f"{lower_time}-{upper_time}", fontsize=8, ha='center')
-    
-    plt.title("Graph with Time Windows (8:00 AM to 6:00 PM)")
-    plt.grid(True)
-    plt.show()
-
-
 # Function to assign time windows divided into hourly intervals
-def assign_time_windows(G, pairs):
+def assign_time_windows(pairs):
     start_of_day = 8 * 60 * 60  # 8:00 AM in seconds
     end_of_day = 18 * 60 * 60   # 6:00 PM in seconds
 
@@ -64,197 +34,217 @@ def assign_time_windows(G, pairs):
         time_windows_lower[i] = lower_bound
         time_windows_upper[i] = upper_bound
 
-    # Set time window attributes to the graph
-    nx.set_node_attributes(G, time_windows_lower, "lower")
-    nx.set_node_attributes(G, time_windows_upper, "upper")
+    return time_windows_lower, time_windows_upper
 
 # Assign time windows
-assign_time_windows(G, PAIRS)
+TIME_WINDOWS_LOWER, TIME_WINDOWS_UPPER = assign_time_windows(PAIRS)
 
 # Set pickup and delivery requests using old code
 pickups_deliveries = {(2*i+1, 2*i+2): DEMAND[2*i+1] for i in range(PAIRS // 2)}
 
-# Assign pickup and delivery attributes
-for (u, v) in pickups_deliveries:
-    G.nodes[u]["request"] = v
-    G.nodes[u]["demand"] = pickups_deliveries[(u, v)]
-    G.nodes[v]["demand"] = -pickups_deliveries[(u, v)]
+# Distances, demands, time windows and pairs are stored as int32 arrays
+instance = PDPTWInstance.from_source_sink(
+    DISTANCES, demands=DEMAND, lower=TIME_WINDOWS_LOWER, upper=TIME_WINDOWS_UPPER, pairs=pickups_deliveries)
 
-# Ensure the source node has no incoming edges
-for u in list(G.predecessors("Source")):
-    G.remove_edge(u, "Source")
+START_OF_DAY = 8 * 60 * 60  # 8:00 AM in seconds
+HOUR_DURATION = 3600  # 1 hour in seconds
+LOAD_CAPACITY = 5  # Adjust this based on your vehicle's capacity
+NUM_STOPS = 6
 
-# Ensure the sink node has no outgoing edges
-for v in list(G.successors("Sink")):
-    G.remove_edge("Sink", v)
 
-# Define hourly zones and solve VRP for each hour sequentially
-# Define hourly zones and solve VRP for each hour sequentially
-def solve_hour_zones(G, num_hours=10):
-    start_of_day = 8 * 60 * 60  # 8:00 AM in seconds
-    hour_duration = 3600  # 1 hour in seconds
-    total_elapsed_time = 0
-
-    preassigned_routes = []  # Holds the routes from previous hour
-    hour_results = []  # Store results for each hour
+def select_hour_requests(instance, num_hours=10):
+    """Returns {hour: [(pickup, delivery), ...]} for every hour that has something to solve."""
+    # Index the pickup-delivery pairs by time window once for all hours
+    request_index = PairIntervalIndex.from_instance(instance)
+    demands = instance.demands
 
+    hour_requests = {}
     for hour in range(num_hours):
-        print(f"\nSolving for Hour {hour + 1} ({start_of_day // 3600 + hour}:00 to {start_of_day // 3600 + hour + 1}:00)")
-
         # Define time window for this hour
-        lower_bound = start_of_day + hour * hour_duration
-        upper_bound = start_of_day + (hour + 1) * hour_duration
-
-        # Initialize lists for pickups and deliveries
-        pickups = []
-        deliveries = []
-
-        # Separate pickups and deliveries based on nodes in the graph
-        for n in G.nodes:
-            demand = G.nodes[n].get("demand", 0)
-            if demand > 0:
-                pickups.append(n)  # If demand is positive, it's a pickup
-            elif demand < 0:
-                deliveries.append(n)  # If demand is negative, it's a delivery
-
-        # Print all pickup and delivery nodes
-        print(f"Pickup nodes: {pickups}")
-        print(f"Delivery nodes: {deliveries}")
-
-        # Generate valid requests based on pickups and deliveries in the current hour
-        valid_requests = []
-        
-        # Collect all pairs of pickups and deliveries
-        for pickup in pickups:
-            if (G.nodes[pickup]["lower"] <= upper_bound and G.nodes[pickup]["upper"] >= lower_bound):
-                for delivery in deliveries:
-                    if (G.nodes[delivery]["lower"] <= upper_bound and G.nodes[delivery]["upper"] >= lower_bound):
-                        valid_requests.append((pickup, delivery))
-        
-        # Print all generated valid pairs before filtering
-        print(f"All potential pickup-delivery pairs for Hour {hour + 1}: {valid_requests}")
+        lower_bound = START_OF_DAY + hour * HOUR_DURATION
+        upper_bound = START_OF_DAY + (hour + 1) * HOUR_DURATION
+
+        # Pickup-delivery pairs whose pickup and delivery windows both overlap this hour
+        valid_requests = request_index.query(lower_bound, upper_bound)
+        print(f"Pickup-delivery pairs for Hour {hour + 1}: {valid_requests}")
 
         # Check for valid requests in this hour
         if not valid_requests:
             print(f"Skipping Hour {hour + 1}: No valid pickup-delivery pairs.")
-            hour_results.append((hour + 1, [], []))  # Store empty results
             continue
 
-        # Create subgraph for the nodes in this hour using only the valid requests
-        # Use copy() to create a mutable subgraph
-
-        # Create subgraph for the nodes in this hour using only the valid requests
-        subG = G.subgraph({"Source", "Sink"}).copy()  # Start with Source and Sink only
-
-        for pickup, delivery in valid_requests:
-            subG.add_node(pickup)
-            subG.add_node(delivery)
-
-            # Add edges between Source and pickups, and deliveries and Sink with a default weight
-            subG.add_edge("Source", pickup, weight=G["Source"][pickup].get("weight", 1))  # Specify cost attribute with default
-            subG.add_edge(delivery, "Sink", weight=G[delivery]["Sink"].get("weight", 1))  # Specify cost attribute with default
-
-            # You can also add edges between pickups and deliveries if necessary
-            subG.add_node(delivery)
-
-            # Copy node attributes (demand, request, etc.) from original graph to subgraph
-            for attr in ["demand", "request", "lower", "upper"]:
-                if attr in G.nodes[pickup]:
-                    subG.nodes[pickup][attr] = G.nodes[pickup][attr]
-                if attr in G.nodes[delivery]:
-                    subG.nodes[delivery][attr] = G.nodes[delivery][attr]
-
-
-
-            # Ensure Source has no incoming edges and Sink has no outgoing edges
-            for u in list(subG.predecessors("Source")):
-                subG.remove_edge(u, "Source")
-            for v in list(subG.successors("Sink")):
-                subG.remove_edge("Sink", v)
-
-            # Ensure all edges have a 'cost' attribute
-            for u, v in subG.edges():
-                if 'cost' not in subG[u][v]:
-                    subG[u][v]['cost'] = 1 # DISTANCES[u][v]  # Assign a default cost if none exists
-
-            # You can also add edges between pickups and deliveries if necessary
+        # vrpy can split an hour over several vehicles, only a pair that alone
+        # overloads one vehicle can never be served
+        too_large = [(pickup, delivery) for pickup, delivery in valid_requests if demands[pickup] > LOAD_CAPACITY]
+        if too_large:
+            print(f"Hour {hour + 1}: pairs {too_large} exceed vehicle capacity, left out.")
+            valid_requests = [request for request in valid_requests if request not in too_large]
+            if not valid_requests:
+                continue
 
-            subG.add_node(delivery)
+        hour_requests[hour] = valid_requests
+    return hour_requests
 
-            # Add edges between Source and pickups, and deliveries and Sink
-            subG.add_edge("Source", pickup)
-            subG.add_edge(delivery, "Sink")
-            # You can also add edges between pickups and deliveries if necessary
 
-        # Ensure Source has no incoming edges and Sink has no outgoing edges
-        for u in list(subG.predecessors("Source")):
-            subG.remove_edge(u, "Source")
-        for v in list(subG.successors("Sink")):
-            subG.remove_edge("Sink", v)
+def hour_chains(hour_requests):
+    """Groups the hours that have to be solved one after the other.
 
-        # Print the current subgraph's nodes and edges for debugging
-        print(f"Nodes in subgraph for Hour {hour + 1}: {subG.nodes()}")
-        print(f"Edges in subgraph for Hour {hour + 1}: {subG.edges()}")
+    An hour is seeded with the route columns of the hours before it, and a column
+    can only be reused if all its requests are in the new hour. Hours that share
+    no request pair with their predecessor start a new, independent chain.
+    """
+    chains = []
+    previous = None
+    for hour in sorted(hour_requests):
+        if previous is not None and set(hour_requests[previous]) & set(hour_requests[hour]):
+            chains[-1].append(hour)
+        else:
+            chains.append([hour])
+        previous = hour
+    return chains
+
+
+def solve_hour_chain(chain, cache_dir=None):
+    """Solves a chain of (hour, sub_instance) in order, reusing route columns from hour to hour.
+
+    With a cache_dir, an hour whose request set was solved before (by any
+    chain or run) takes the stored plan instead of solving again.
+    Returns (hour, best_value, routes, elapsed seconds, error) for every hour.
+    """
+    pool = RoutePool()  # Holds the columns generated in the previous hours
+    cache = None if cache_dir is None else SolutionCache(cache_dir)
+    results = []
+    for hour, sub_instance in chain:
+        with phase(f"zones/hour {hour + 1}", pairs=sub_instance.num_pairs):
+            results.append(_solve_hour(hour, sub_instance, pool, cache))
+    return results
+
+
+def _solve_hour(hour, sub_instance, pool, cache):
+    if cache is not None:
+        key = solution_key(sub_instance, solver="vrpy", load_capacity=LOAD_CAPACITY, num_stops=NUM_STOPS)
+        start_time = time.time()
+        stored = cache.get(key)
+        if stored is not None:
+            routes = [(int(vehicle), route) for vehicle, route in stored["routes"]]
+            for _, route in routes:
+                pool.add(route)
+            print(f"Hour {hour + 1}: cached plan")
+            return hour, stored["best_value"], routes, time.time() - start_time, None
+    subG = sub_instance.to_vrpy_graph()
+    start_time = time.time()
+
+    prob = VehicleRoutingProblem(subG, load_capacity=LOAD_CAPACITY, num_stops=NUM_STOPS, pickup_delivery=True)
+
+    # Seed the solve with the pooled columns that are still feasible for this
+    # hour, plus the Source-pickup-delivery-Sink routes vrpy would start from
+    # so that every request is covered
+    initial_routes = pool.columns_for(sub_instance, load_capacity=LOAD_CAPACITY, num_stops=NUM_STOPS)
+    reused_columns = len(initial_routes)
+    for pickup, delivery in sub_instance.node_ids[sub_instance.pairs].tolist():
+        route = ["Source", pickup, delivery, "Sink"]
+        if route not in initial_routes:
+            initial_routes.append(route)
+    try:
+        prob.solve(cspy=False, initial_routes=initial_routes)
+    except Exception as e:
+        return hour, None, [], time.time() - start_time, str(e)
+    pool.add_problem(prob)
+
+    routes = list(prob.best_routes.items())
+    if cache is not None:
+        cache.put(key, {"best_value": prob.best_value, "routes": routes})
+    print(f"Hour {hour + 1}: reused {reused_columns} columns, pool holds {len(pool)}")
+    return hour, prob.best_value, routes, time.time() - start_time, None
+
+
+def _profiled_chain(chain, cache_dir=None, memory=False):
+    # Worker side of solve_hour_zones: profiles the chain when the caller is
+    # profiling (memory is then its memory mode) and hands the events back
+    if memory is False:
+        return solve_hour_chain(chain, cache_dir), []
+    with Profiler(memory) as profiler:
+        results = solve_hour_chain(chain, cache_dir)
+    return results, profiler.events
+
+
+# Define hourly zones and solve the independent ones in parallel
+def solve_hour_zones(instance, num_hours=10, max_workers=None, cache_dir=None):
+    """Solves every hour, running independent chains of hours in a process pool.
+
+    max_workers=1 solves all chains in this process, in hour order.
+    Under a running ``pdptw_profile.Profiler`` every hour is a phase, the
+    workers' phases included. With a cache_dir (such as
+    ``pdptw_cache.DEFAULT_CACHE_DIR``) hour plans go through the solution
+    cache there, by default nothing is cached.
+    """
+    wall_start = time.time()
+
+    with phase("zones/select requests"):
+        hour_requests = select_hour_requests(instance, num_hours)
+        chains = hour_chains(hour_requests)
+    print(f"\nIndependent chains of hours: {[[hour + 1 for hour in chain] for chain in chains]}")
+
+    # Slice each hour's sub-instance here so the workers only receive their own data
+    with phase("zones/subsets"):
+        jobs = [[(hour, instance.subset(hour_requests[hour])) for hour in chain] for chain in chains]
+
+    solved = {}
+    if max_workers == 1 or len(jobs) <= 1:
+        for job in jobs:
+            for result in solve_hour_chain(job, cache_dir):
+                solved[result[0]] = result
+    else:
+        # Longest chains first so they do not end up last on a busy pool
+        jobs.sort(key=len, reverse=True)
+        profiler = current_profiler()
+        memory = False if profiler is None else profiler.memory
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            for chain_results, events in pool.map(
+                    functools.partial(_profiled_chain, cache_dir=cache_dir, memory=memory), jobs):
+                if profiler is not None:
+                    profiler.merge(events)
+                for result in chain_results:
+                    solved[result[0]] = result
 
-        # Check and ensure demand does not exceed capacity
-        total_demand = sum(G.nodes[u]["demand"] for u in pickups + deliveries if u in subG)
-        if total_demand > 5:  # Adjust this based on your vehicle's capacity
-            print(f"Skipping Hour {hour + 1}: Total demand {total_demand} exceeds vehicle capacity.")
+    total_elapsed_time = 0
+    hour_results = []  # Store results for each hour
+    for hour in range(num_hours):
+        if hour not in solved:
             hour_results.append((hour + 1, [], []))  # Store empty results
             continue
-
-        start_time = time.time()
-
-        # Use preassigned routes if there are any from the previous hour
-        prob = VehicleRoutingProblem(subG, load_capacity=5, num_stops=6, pickup_delivery=True)
-
-        # Use previous routes as preassignments for this hour
-        if hour > 0 and preassigned_routes:
-            prob.solve(cspy=False, preassignments=preassigned_routes)
-        else:
-            try:
-                prob.solve(cspy=False)
-            except Exception as e:
-                print(f"Error solving for Hour {hour + 1}: {e}")
-                hour_results.append((hour + 1, [], []))  # Store empty results
-                continue
-            
-        end_time = time.time()
-        total_elapsed_time += (end_time - start_time)
-
-        # Output results for this hour
-        print(f"Hour {hour + 1} solution:")
-        print(f"Best objective value: {prob.best_value}")
-        print(f"Best routes: {prob.best_routes}")
-        print(f"Node loads: {prob.node_load}")
-
-        # Append dispatching results for the current hour
-        current_hour_results = []
-        for vehicle_id, route in prob.best_routes.items():
-            current_hour_results.append((vehicle_id, route))
-        hour_results.append((hour + 1, prob.best_value, current_hour_results))
-
-        # Update preassigned routes for the next hour
-        preassigned_routes = []
-        if prob.best_routes:
-            for route in prob.best_routes.values():
-                if len(route) > 1:  # Only keep routes with more than one stop
-                    preassigned_routes.append(route)  # Keep this route for next hour
+        _, best_value, routes, elapsed, error = solved[hour]
+        total_elapsed_time += elapsed
+        if error is not None:
+            print(f"Error solving for Hour {hour + 1}: {error}")
+            hour_results.append((hour + 1, [], []))
+            continue
+        hour_results.append((hour + 1, best_value, routes))
 
     # Output the total time taken
-    print(f"\nTotal time taken for all hours: {total_elapsed_time} seconds")
+    print(f"\nTotal solve time for all hours: {total_elapsed_time} seconds")
+    print(f"Wall-clock time: {time.time() - wall_start} seconds")
 
     # Print final dispatching results for all hours
     print("\nDispatching Results for Each Hour:")
     for hour_num, best_value, routes in hour_results:
-        print(f"Hour {hour_num}:")
+        print(f"Hour {hour_num} ({START_OF_DAY // 3600 + hour_num - 1}:00 to {START_OF_DAY // 3600 + hour_num}:00):")
         if not routes:
             print("  No valid routes found.")
         else:
             print(f"  Best objective value: {best_value}")
             for vehicle_id, route in routes:
                 print(f"  Vehicle {vehicle_id}: {route}")
-
-# Solve VRP for each hourly zone
-solve_hour_zones(G, num_hours=10)
-
+    return hour_results
+
+
+if __name__ == "__main__":
+    # Solve VRP for each hourly zone, timing every hour and solver phase
+    with Profiler() as profiler:
+        hour_results = solve_hour_zones(instance, num_hours=10)
+        # The whole day's plan in one picture, the vehicles of each hour in their own colour
+        routes = [(f"{hour_num}/{vehicle_id}", route) for hour_num, _, hour_routes in hour_results
+                  for vehicle_id, route in hour_routes]
+        draw_routes(instance, routes, "pdptw_zone.routes.png", title="Hour zone routes", clock=True)
+    print(profiler.summary())
+    profiler.export("pdptw_zone.trace.json")
@@ -0,0 +1,37 @@
+import numpy as np
+
+from pdptw_construct import construct, insertion_costs, route_feasible, _insert
+from pdptw_instance import PDPTWInstance
+from pdptw_route import INF, Route
+from pdptw_validate import validate
+
+
+def unbalanced_instance(seed=0):
+    # Pickups load more than their deliveries unload, as in pdptw_or.py
+    rng = np.random.default_rng(seed)
+    demands = np.r_[0, rng.integers(1, 5, 4), -rng.integers(1, 5, 4)]
+    return PDPTWInstance(rng.integers(10, 100, size=(9, 9)), demands=demands,
+                         pairs=[(i + 1, i + 5) for i in range(4)])
+
+
+def test_insertion_checks_match_route_feasible():
+    instance = unbalanced_instance()
+    stops = [1, 5, 3, 7]
+    route = Route(stops, instance, False)
+    pickups, deliveries = np.array([2, 4]), np.array([6, 8])
+    costs = insertion_costs(route, pickups, deliveries, instance, load_capacity=4)
+    m = len(route.nodes) - 1
+    for k in range(len(pickups)):
+        for i in range(m):
+            for j in range(i, m):
+                feasible = route_feasible(_insert(stops, pickups[k], deliveries[k], i, j), instance, 4, False)
+                assert (costs[k, i, j] < INF) == feasible
+                assert route.can_insert(pickups[k], deliveries[k], i, j, load_capacity=4) == feasible
+
+
+def test_construct_passes_validation_on_unbalanced_pairs():
+    instance = unbalanced_instance()
+    routes, unrouted = construct(instance, load_capacity=4, num_vehicles=4)
+    assert unrouted == []
+    report = validate(instance, routes, load_capacity=4, num_vehicles=4)
+    assert report.feasible[0], report.errors(0)
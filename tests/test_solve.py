@@ -0,0 +1,30 @@
+import numpy as np
+
+from pdptw_instance import PDPTWInstance
+from pdptw_solve import feasible_routes, solve
+from pdptw_validate import routes_from_vrpy, validate
+
+
+def unbalanced_instance(seed=0, num_pairs=10):
+    # Deliveries unload less than their pickup loaded, the rest stays on board
+    rng = np.random.default_rng(seed)
+    n = 2 * num_pairs + 1
+    quantities = rng.integers(1, 5, num_pairs)
+    demands = np.r_[0, quantities, -rng.integers(1, quantities + 1)]
+    pairs = [(i + 1, i + num_pairs + 1) for i in range(num_pairs)]
+    return PDPTWInstance(rng.integers(100, 1000, size=(n, n)), demands=demands, pairs=pairs)
+
+
+def test_infeasible_routes_move_to_unrouted():
+    instance = unbalanced_instance()
+    everything = [list(range(1, 21))]
+    routes, unrouted = feasible_routes(instance, everything, [], load_capacity=4)
+    assert routes == [] and unrouted == [tuple(pair) for pair in instance.pairs.tolist()]
+
+
+def test_alns_solve_on_unbalanced_pairs():
+    instance = unbalanced_instance()
+    best = solve(instance, "alns", 1, load_capacity=4, num_vehicles=6, seed=0)
+    assert best is not None
+    report = validate(instance, routes_from_vrpy(best.routes, instance), load_capacity=4, num_vehicles=6)
+    assert report.feasible[0], report.errors(0)
@@ -1,6 +1,7 @@
-from networkx import DiGraph, compose, relabel_nodes, set_node_attributes #from_numpy_matrix
-from numpy import array
-import networkx  as nx
+import sys
+from pdptw_instance import PDPTWInstance
+from pdptw_io import load_instance
+from pdptw_prune import prune_arcs
 
 # Distance matrix
 DISTANCES = [
@@ -49,28 +50,28 @@ TRAVEL_TIMES = [
 TIME_WINDOWS_LOWER = {0: 0, 1: 7, 2: 10, 3: 16, 4: 10, 5: 0, 6: 5, 7: 0, 8: 5, 9: 0, 10: 10, 11: 10, 12: 0, 13: 5, 14: 7, 15: 10, 16: 11,}
 TIME_WINDOWS_UPPER = {1: 12, 2: 15, 3: 18, 4: 13, 5: 5, 6: 10, 7: 4, 8: 10, 9: 3, 10: 16, 11: 15, 12: 5, 13: 10, 14: 8, 15: 15, 16: 15,}
 
-# Transform distance matrix into DiGraph
-A = array(DISTANCES, dtype=[("cost", int)])
-G_d = nx.from_numpy_array(A, create_using=DiGraph())
+# Distance matrix, time matrix and time windows are stored as int32 arrays
+instance = PDPTWInstance.from_source_sink(
+    DISTANCES, TRAVEL_TIMES, lower=TIME_WINDOWS_LOWER, upper=TIME_WINDOWS_UPPER)
+LOAD_CAPACITY = None
 
-# Transform time matrix into DiGraph
-A = array(TRAVEL_TIMES, dtype=[("time", int)])
-G_t = nx.from_numpy_array(A, create_using=DiGraph())
+# Or read a Solomon / Li & Lim / CSV file given on the command line
+if len(sys.argv) > 1:
+    instance, fleet = load_instance(sys.argv[1])
+    LOAD_CAPACITY = fleet.get("capacity")
 
-# Merge
-G = compose(G_d, G_t)
+# The instance is transformed into a DiGraph with "cost" and "time" on every arc,
+# the depot is split into Source and Sink
+G = instance.to_vrpy_graph()
 
-# The depot is relabeled as Source and Sink
-G = relabel_nodes(G, {0: "Source", 17: "Sink"})
-
-# Set time windows
-set_node_attributes(G, values=TIME_WINDOWS_LOWER, name="lower")
-set_node_attributes(G, values=TIME_WINDOWS_UPPER, name="upper")
+# Remove arcs that can never be used (time windows)
+pruned = prune_arcs(G, instance, load_capacity=LOAD_CAPACITY)
+print(f"Pruned arcs: {pruned}, remaining: {G.number_of_edges()}")
 
 # The VRP is defined and solved
 from vrpy import VehicleRoutingProblem
 
-prob = VehicleRoutingProblem(G, time_windows=True)
+prob = VehicleRoutingProblem(G, time_windows=True, load_capacity=LOAD_CAPACITY)
 prob.solve()
 print(prob.best_value)
 print(prob.best_routes)